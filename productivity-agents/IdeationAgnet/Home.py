@@ -1,14 +1,19 @@
 import streamlit as st
 import os
 import sys
-from PIL import Image
-import base64
+import time
+import uuid
 
 # Add the project root directory to the Python path
 sys.path.insert(0, os.path.dirname(__file__))
 
 # Import logging utilities
 from utils.logging_utils import setup_logger, log_user_action
+from utils.profiling import start_rerun_profile, finish_rerun_profile
+from utils.checkpoint_utils import list_checkpoints, restore_session, JOB_ID_KEYS
+from utils.job_utils import cancel_job, POLL_INTERVAL_SECONDS
+from utils.blob_store import add_ref, release_ref, session_holder
+from utils.image_utils import poll_file_thumbnail
 
 # Set up logging
 logger = setup_logger(__name__)
@@ -22,6 +27,8 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 logger.debug("Streamlit page configuration set")
+profiler = start_rerun_profile(st, "Home")
+profiler.mark("intro")
 
 # Initialize session state variables if they don't exist
 if "model_type" not in st.session_state:
@@ -32,16 +39,24 @@ if "api_key" not in st.session_state:
     st.session_state.api_key = None
 if "idea_description" not in st.session_state:
     st.session_state.idea_description = ""
-if "uploaded_image" not in st.session_state:
-    st.session_state.uploaded_image = None
+if "image_hash" not in st.session_state:
+    st.session_state.image_hash = None
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 if "plan_type" not in st.session_state:
     st.session_state.plan_type = None
 if "brainstorm_context" not in st.session_state:
     st.session_state.brainstorm_context = []
+if "brainstorm_facts" not in st.session_state:
+    st.session_state.brainstorm_facts = []
 if "generated_plan" not in st.session_state:
     st.session_state.generated_plan = ""
 if "feedback_history" not in st.session_state:
     st.session_state.feedback_history = []
+if "stage_models" not in st.session_state:
+    st.session_state.stage_models = {}
+if "artifact_models" not in st.session_state:
+    st.session_state.artifact_models = []
 if "current_step" not in st.session_state:
     st.session_state.current_step = "home"
 
@@ -73,11 +88,15 @@ with col1:
         logger.info("Navigating to Configuration page")
         st.switch_page("pages/1_Configuration.py")
 
+illustration_pending = False
 with col2:
-    # Display an example image or icon
-    st.image("https://via.placeholder.com/400x300.png?text=Idea+to+Plan+Generator", 
-             caption="Transform your ideas into actionable plans",
-             use_column_width=True)
+    # Display the bundled illustration, downscaled once (in the CPU process pool) instead of
+    # sending the full-size PNG; the page polls until it is ready
+    illustration = poll_file_thumbnail(os.path.join(os.path.dirname(__file__), "assets", "HomeIllustration.png"), 800)
+    if illustration is None:
+        illustration_pending = True
+    else:
+        st.image(illustration, caption="Transform your ideas into actionable plans", use_column_width=True)
     
     st.subheader("Benefits")
     st.markdown("""
@@ -87,6 +106,47 @@ with col2:
     - **Flexible Domains** - Works for software, content, business, research and more
     """)
 
+# Offer to resume in-progress ideas saved by the checkpoint subsystem
+profiler.mark("resume_sessions")
+saved_sessions = [
+    session for session in list_checkpoints()
+    if session["session_id"] != st.session_state.session_id
+]
+if saved_sessions:
+    st.markdown("---")
+    st.subheader("Resume a Previous Session")
+    st.markdown("Pick up an idea where you left off. Completed steps are restored without calling the AI again.")
+    selected_session_idx = st.selectbox(
+        "Choose an in-progress idea:",
+        range(len(saved_sessions)),
+        format_func=lambda i: f"{saved_sessions[i]['updated']:%Y-%m-%d %H:%M} - {saved_sessions[i]['idea_description'][:50]}... ({saved_sessions[i]['last_stage']})"
+    )
+    
+    if st.button("Resume Session"):
+        session_id = saved_sessions[selected_session_idx]["session_id"]
+        log_user_action(logger, "resume_session", {"session_id": session_id})
+        # The session being replaced no longer needs its image or its background jobs
+        release_ref(st.session_state.image_hash, session_holder(st.session_state.session_id))
+        for key in JOB_ID_KEYS:
+            cancel_job(st.session_state.get(key))
+        next_page = restore_session(st.session_state, session_id)
+        st.session_state.brainstorm_error = None
+        if st.session_state.image_hash:
+            add_ref(st.session_state.image_hash, session_holder(session_id))
+        
+        # API keys are never checkpointed, so cloud sessions need the key re-entered first
+        if st.session_state.model_type == "cloud" and not st.session_state.api_key:
+            logger.info("Resumed cloud session needs API key, navigating to Configuration page")
+            next_page = "pages/1_Configuration.py"
+        st.switch_page(next_page)
+
 # Add a footer
 st.markdown("---")
 st.markdown("© 2025 Idea-to-Plan Generator | Powered by AI")
+
+finish_rerun_profile(st, profiler)
+
+# Poll the illustration while it is being rendered
+if illustration_pending:
+    time.sleep(POLL_INTERVAL_SECONDS)
+    st.rerun()
@@ -0,0 +1,415 @@
+"""
+Multi-session load test for the Idea-to-Plan Generator
+
+Simulates N concurrent users walking the five pages (configuration, idea input,
+brainstorming, plan generation, history) with randomised think times. Each user
+goes through the same code the pages run: utils/model_utils.py calls, the shared
+background job pool, the blob store, checkpoints and the plan store. The LLM
+backend is mock_llm_server.py in its own process, standing in for one Ollama server.
+
+The test steps through increasing user counts and reports, per level:
+- p50/p95/p99 latency of every stage, as the user waits for it (including job polling)
+- queueing delay in the background job pool
+- error rate
+- throughput (completed sessions per minute)
+- CPU and RSS of this app process and of the mock server
+
+and flags the level at which throughput saturates.
+
+Usage:
+    python benchmarks/load_test.py --users 1,2,4,8,16 [--think-scale 0.1] [--output load.json] [--report load.md]
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARK_DIR)
+from pipeline_benchmark import IDEA, PLAN_TYPE, ANSWERS, make_png
+
+STAGES = ["configuration", "idea_input", "brainstorm_first_turn", "brainstorm_round", "plan", "history"]
+# Seconds a user spends on each page before acting, as (min, max) at think scale 1
+THINK_TIMES = {
+    "configuration": (2, 5),
+    "idea_input": (10, 30),
+    "brainstorm_round": (10, 40),
+    "plan": (5, 15),
+    "history": (2, 6)
+}
+# Throughput must grow by at least this fraction per level, otherwise the app has saturated
+SATURATION_GAIN = 0.1
+# ...or p95 session time must not more than double from one level to the next
+SATURATION_LATENCY_FACTOR = 2.0
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def process_cpu_seconds(pid):
+    """User+system CPU seconds of a process from /proc (Linux), or None elsewhere"""
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def process_rss_mb(pid):
+    """Current resident set size of a process in MB from /proc (Linux), or None elsewhere"""
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+class ResourceSampler(threading.Thread):
+    """Samples CPU and RSS of the app process and the mock server while a level runs"""
+
+    def __init__(self, pids, interval=0.5):
+        super().__init__(daemon=True)
+        self.pids = pids
+        self.interval = interval
+        self.peak_rss = {name: 0.0 for name in pids}
+        self._stop_event = threading.Event()
+        self._start_cpu = {name: process_cpu_seconds(pid) for name, pid in pids.items()}
+        self._start_time = time.time()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            for name, pid in self.pids.items():
+                rss = process_rss_mb(pid)
+                if rss is not None:
+                    self.peak_rss[name] = max(self.peak_rss[name], rss)
+            self._stop_event.wait(self.interval)
+
+    def finish(self):
+        """Stop sampling and return CPU utilisation (% of one core) and peak RSS per process"""
+        self._stop_event.set()
+        self.join()
+        elapsed = time.time() - self._start_time
+        summary = {}
+        for name, pid in self.pids.items():
+            start_cpu, end_cpu = self._start_cpu[name], process_cpu_seconds(pid)
+            cpu_percent = None
+            if start_cpu is not None and end_cpu is not None and elapsed > 0:
+                cpu_percent = round(100.0 * (end_cpu - start_cpu) / elapsed, 1)
+            summary[name] = {"cpu_percent": cpu_percent, "peak_rss_mb": round(self.peak_rss[name], 1)}
+        if summary.get("app", {}).get("peak_rss_mb") == 0.0:
+            # No /proc: fall back to the peak RSS the kernel reports for this process
+            summary["app"]["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+        return summary
+
+
+def is_error(result):
+    """Backend failures come back from model_utils as GenerationFailure strings"""
+    from utils.model_utils import GenerationFailure
+    return isinstance(result, GenerationFailure)
+
+
+def simulate_user(user_index, backend, model, think_scale, seed, record):
+    """Walk one user through the five pages, recording each stage with record(stage, seconds, error)"""
+    from utils import model_utils
+    from utils.blob_store import put_blob, session_holder
+    from utils.image_utils import get_vision_image_base64
+    from utils.brainstorm_engine import run_turn, run_first_turn_with_image
+    from utils.checkpoint_utils import append_checkpoint
+    from utils.job_utils import submit_job, get_job, collect_job, POLL_INTERVAL_SECONDS
+    from utils.plan_store import save_plan, iter_plans
+    from utils.prompt_templates import build_plan_prompt, to_messages
+
+    rng = random.Random(seed + user_index)
+    session_id = uuid.uuid4().hex
+    api_key = "mock-key" if backend == "cloud" else None
+
+    def think(page):
+        low, high = THINK_TIMES[page]
+        time.sleep(rng.uniform(low, high) * think_scale)
+
+    def timed(stage, fn):
+        start = time.perf_counter()
+        try:
+            result = fn()
+            error = is_error(result)
+        except Exception:
+            result, error = None, True
+        record(stage, time.perf_counter() - start, error)
+        return result
+
+    def run_as_job(kind, fn, kwargs):
+        """Submit like a page does, then poll at the page's interval until the job is collected"""
+        job_id = submit_job(kind, fn, kwargs=kwargs, session_id=session_id)
+        while True:
+            job = get_job(job_id)
+            if job is None:
+                raise RuntimeError("job disappeared")
+            if job.done:
+                collect_job(job_id)
+                if job.status == "error":
+                    raise RuntimeError(job.error)
+                return job.result
+            time.sleep(POLL_INTERVAL_SECONDS)
+
+    # Configuration: list models (local) as the Configuration page does
+    if backend == "local":
+        timed("configuration", model_utils.get_available_ollama_models)
+    else:
+        timed("configuration", lambda: None)
+    think("configuration")
+
+    # Idea input: store the sketch and checkpoint the details
+    def idea_input():
+        image_hash = put_blob(make_png(320, 240), holder=session_holder(session_id))
+        append_checkpoint(session_id, "idea_input", updates={
+            "model_type": backend, "selected_model": model,
+            "idea_description": IDEA, "image_hash": image_hash, "plan_type": PLAN_TYPE
+        })
+        return image_hash
+    image_hash = timed("idea_input", idea_input)
+    think("idea_input")
+
+    # Brainstorming: first turn, then answer until the engine says it is complete
+    if backend == "cloud":
+        first_turn = lambda: run_first_turn_with_image(
+            model, api_key, IDEA, PLAN_TYPE, get_vision_image_base64(image_hash))
+        image_analysis = None
+    else:
+        image_analysis = "Image analysis not available with the selected local model."
+        first_turn = lambda: run_turn(backend, model, api_key, IDEA, PLAN_TYPE, image_analysis, [])
+    result = timed("brainstorm_first_turn", lambda: run_as_job("brainstorm_initial", first_turn, {}))
+    if result and result.get("image_analysis"):
+        image_analysis = result["image_analysis"]
+
+    context, facts = [], (result or {}).get("facts", [])
+    for answer in ANSWERS:
+        if not result or result.get("complete") or not result.get("question"):
+            break
+        think("brainstorm_round")
+        context = context + [{"role": "assistant", "content": result["question"]}, {"role": "user", "content": answer}]
+        result = timed("brainstorm_round", lambda: run_as_job("brainstorm_follow_up", run_turn, {
+            "model_type": backend, "selected_model": model, "api_key": api_key,
+            "idea_description": IDEA, "plan_type": PLAN_TYPE, "image_analysis": image_analysis,
+            "brainstorm_context": context, "known_facts": facts
+        }))
+        facts = (result or {}).get("facts", facts)
+
+    # Plan generation through the job pool, like the Plan Generator page
+    system_prompt, user_prompt = build_plan_prompt(IDEA, PLAN_TYPE, image_analysis, context, [], facts)
+    if backend == "local":
+        generate = lambda: model_utils.generate_with_ollama(
+            model, user_prompt, system_prompt=system_prompt, stream_callback=lambda piece: None)
+    else:
+        generate = lambda: model_utils.generate_with_openai(
+            model, to_messages(system_prompt, user_prompt), api_key, stream_callback=lambda piece: None)
+    plan = timed("plan", lambda: run_as_job("plan", generate, {}))
+    think("plan")
+
+    # History: save the plan and list saved plans
+    def history():
+        save_plan({"timestamp": time.strftime("%Y-%m-%d %H:%M:%S"), "idea": IDEA, "plan_type": PLAN_TYPE,
+                   "plan": plan or "", "iteration": 1}, image_hash=image_hash)
+        return sum(1 for _ in iter_plans())
+    timed("history", history)
+    think("history")
+
+
+def run_level(users, backend, model, think_scale, seed, pids, sessions_per_user=1):
+    """Run one load level with the given number of concurrent users, each walking the pages in a loop"""
+    from utils import metrics
+
+    metrics.reset()
+    lock = threading.Lock()
+    errors = {stage: 0 for stage in STAGES}
+    counts = {stage: 0 for stage in STAGES}
+
+    def record(stage, seconds, error):
+        metrics.observe(f"load.{stage}", seconds)
+        with lock:
+            counts[stage] += 1
+            errors[stage] += int(error)
+
+    session_seconds = []
+
+    def user(index):
+        for session in range(sessions_per_user):
+            start = time.perf_counter()
+            simulate_user(index * sessions_per_user + session, backend, model, think_scale, seed, record)
+            with lock:
+                session_seconds.append(time.perf_counter() - start)
+
+    sampler = ResourceSampler(pids)
+    sampler.start()
+    start = time.perf_counter()
+    threads = [threading.Thread(target=user, args=(index,), daemon=True) for index in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    resources = sampler.finish()
+
+    stages = {}
+    for stage in STAGES:
+        if counts[stage]:
+            stages[stage] = {
+                "count": counts[stage],
+                "errors": errors[stage],
+                **{f"p{q}": round(metrics.percentile(f"load.{stage}", q), 3) for q in (50, 95, 99)}
+            }
+    queue_samples = [value for kind in ("brainstorm_initial", "brainstorm_follow_up", "plan")
+                     for value in metrics.get_samples(f"job_queue_seconds.{kind}")]
+    for value in queue_samples:
+        metrics.observe("load.queue", value)
+
+    total_stages = sum(counts.values())
+    session_seconds.sort()
+    return {
+        "users": users,
+        "elapsed_seconds": round(elapsed, 2),
+        "sessions_per_minute": round(60.0 * len(session_seconds) / elapsed, 2) if elapsed else 0.0,
+        "session_p95_seconds": round(session_seconds[int(0.95 * (len(session_seconds) - 1))], 2) if session_seconds else None,
+        "error_rate": round(sum(errors.values()) / total_stages, 4) if total_stages else 0.0,
+        "queue_seconds": {f"p{q}": round(metrics.percentile("load.queue", q) or 0.0, 3) for q in (50, 95, 99)},
+        "stages": stages,
+        "resources": resources
+    }
+
+
+def find_saturation(levels):
+    """Return the first user count at which throughput stops growing or latency collapses"""
+    for previous, current in zip(levels, levels[1:]):
+        gain = (current["sessions_per_minute"] - previous["sessions_per_minute"]) / max(previous["sessions_per_minute"], 1e-9)
+        latency_factor = (current["session_p95_seconds"] or 0) / max(previous["session_p95_seconds"] or 0, 1e-9)
+        if gain < SATURATION_GAIN or latency_factor > SATURATION_LATENCY_FACTOR:
+            return current["users"]
+    return None
+
+
+def format_report(results):
+    """Render the load test results as a Markdown report"""
+    config = results["config"]
+    lines = [
+        "# Load Test Report",
+        "",
+        f"Backend: {config['backend']} ({config['model']}), job workers: {config['job_workers']}, "
+        f"mock TTFT {config['ttft']}s at {config['tokens_per_sec']} tokens/s, think scale {config['think_scale']}",
+        "",
+        "| Users | Sessions/min | Session p95 (s) | Queue p95 (s) | Error rate | App CPU % | App RSS (MB) | Mock CPU % |",
+        "|---|---|---|---|---|---|---|---|"
+    ]
+    for level in results["levels"]:
+        app, mock = level["resources"]["app"], level["resources"]["mock"]
+        lines.append(
+            f"| {level['users']} | {level['sessions_per_minute']} | {level['session_p95_seconds']} | "
+            f"{level['queue_seconds']['p95']} | {level['error_rate']:.1%} | {app['cpu_percent']} | "
+            f"{app['peak_rss_mb']} | {mock['cpu_percent']} |"
+        )
+    lines += ["", "## Stage latency (p50 / p95 / p99 seconds)", "",
+              "| Users | " + " | ".join(STAGES) + " |", "|---" * (len(STAGES) + 1) + "|"]
+    for level in results["levels"]:
+        cells = []
+        for stage in STAGES:
+            data = level["stages"].get(stage)
+            cells.append(f"{data['p50']} / {data['p95']} / {data['p99']}" if data else "-")
+        lines.append(f"| {level['users']} | " + " | ".join(cells) + " |")
+    lines.append("")
+    if results["saturates_at_users"]:
+        lines.append(f"**Throughput saturates at {results['saturates_at_users']} concurrent users.**")
+    else:
+        lines.append("Throughput did not saturate at the tested user counts.")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the concurrency limits of the app against a mock LLM backend")
+    parser.add_argument("--users", default="1,2,4,8,16", help="Comma-separated concurrent user counts")
+    parser.add_argument("--backend", choices=["local", "cloud"], default="local")
+    parser.add_argument("--model", help="Model name (defaults to a mock model for the backend)")
+    parser.add_argument("--sessions-per-user", type=int, default=2, help="Sessions each user walks per level")
+    parser.add_argument("--think-scale", type=float, default=0.1, help="Multiplier for think times (1 = realistic)")
+    parser.add_argument("--ttft", type=float, default=0.3, help="Mock time to first token in seconds")
+    parser.add_argument("--tokens-per-sec", type=float, default=40.0, help="Mock generation speed")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of mock generations that fail")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--report", help="Write a Markdown report to this path")
+    args = parser.parse_args()
+    model = args.model or ("gpt-4o" if args.backend == "cloud" else "mock-llama:latest")
+    levels_to_run = [int(users) for users in args.users.split(",")]
+    output_path = os.path.abspath(args.output) if args.output else None
+    report_path = os.path.abspath(args.report) if args.report else None
+
+    # The mock server gets its own process so its CPU use is measured separately, like a real Ollama
+    port = free_port()
+    mock = subprocess.Popen(
+        [sys.executable, os.path.join(BENCHMARK_DIR, "mock_llm_server.py"), "--port", str(port),
+         "--ttft", str(args.ttft), "--tokens-per-sec", str(args.tokens_per_sec),
+         "--error-rate", str(args.error_rate), "--seed", str(args.seed)],
+        stdout=subprocess.DEVNULL
+    )
+    try:
+        for _ in range(50):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+
+        workdir = tempfile.mkdtemp(prefix="ideation-load-")
+        os.environ["OLLAMA_BASE_URL"] = f"http://127.0.0.1:{port}"
+        os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+        os.environ["IDEATION_BLOB_DIR"] = os.path.join(workdir, "blobs")
+        os.environ["IDEATION_CHECKPOINT_DIR"] = os.path.join(workdir, "checkpoints")
+        os.chdir(workdir)
+        sys.path.insert(0, APP_DIR)
+        from utils.job_utils import MAX_WORKERS
+
+        pids = {"app": os.getpid(), "mock": mock.pid}
+        levels = []
+        for users in levels_to_run:
+            level = run_level(users, args.backend, model, args.think_scale, args.seed, pids, args.sessions_per_user)
+            levels.append(level)
+            print(f"{users:4} users  {level['sessions_per_minute']:7.2f} sessions/min  "
+                  f"session p95 {level['session_p95_seconds']}s  queue p95 {level['queue_seconds']['p95']}s  "
+                  f"errors {level['error_rate']:.1%}")
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    results = {
+        "config": {"backend": args.backend, "model": model, "ttft": args.ttft, "tokens_per_sec": args.tokens_per_sec,
+                   "think_scale": args.think_scale, "sessions_per_user": args.sessions_per_user, "job_workers": MAX_WORKERS, "seed": args.seed},
+        "levels": levels,
+        "saturates_at_users": find_saturation(levels)
+    }
+    report = format_report(results)
+    print()
+    print(report)
+
+    if output_path:
+        with open(output_path, "w") as f:
+            json.dump(results, f, indent=2)
+    if report_path:
+        with open(report_path, "w") as f:
+            f.write(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,450 @@
+"""
+Offline stand-in for the Ollama and OpenAI APIs used by the Idea-to-Plan Generator
+
+Implements the subset of endpoints the app calls:
+- GET  /api/tags                  (Ollama model list)
+- POST /api/generate              (Ollama, streaming NDJSON and non-streaming)
+- POST /api/chat                  (Ollama, streaming NDJSON and non-streaming)
+- POST /v1/chat/completions       (OpenAI, streaming SSE and non-streaming, vision content parts)
+
+Latency is simulated with a configurable time-to-first-token and tokens/second, errors
+can be injected deterministically, and responses can be scripted by prompt substring.
+Everything is seeded, so two runs with the same settings behave identically.
+
+In-process (tests and benchmarks):
+    with MockLLMServer(ttft=0.2, tokens_per_sec=50) as server:
+        os.environ["OLLAMA_BASE_URL"] = server.url
+        os.environ["OPENAI_BASE_URL"] = server.openai_base_url
+
+Standalone (load runs):
+    python benchmarks/mock_llm_server.py --port 11500 --ttft 0.3 --tokens-per-sec 40 --script script.json
+
+A script file is a JSON list of {"match": "<substring of the prompt>", "response": "<text>"}
+rules; the first matching rule wins.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_MODELS = ["mock-llama:latest", "mock-mistral:latest"]
+# Rough characters per token used for the usage numbers the mock reports
+CHARS_PER_TOKEN = 4
+# Prompts remembered for simulating provider-side prefix caching
+PROMPT_HISTORY_SIZE = 32
+
+DEFAULT_PLAN = """# Implementation Plan
+
+## 1. Executive Summary
+A mock plan used for offline benchmarking.
+
+## 2. Project Scope
+- In scope: the core idea
+- Out of scope: everything else
+
+## 3. Key Features and Components
+- Component A
+- Component B
+
+## 4. Implementation Timeline
+- Phase 1 (2 weeks): Prototype
+- Phase 2 (4 weeks): Build
+
+## 5. Required Resources
+- One developer
+
+## 6. Success Metrics
+- Users are happy
+
+## 7. Potential Challenges and Mitigations
+- Scope creep: keep a backlog
+
+## 8. Next Steps
+- Start building
+
+<!-- END OF PLAN -->
+Let me know if you would like more detail on any of these sections.
+"""
+
+_TOKEN_PATTERN = re.compile(r"\S+\s*|\s+")
+
+
+def split_tokens(text):
+    """Split text into word-sized pieces that are streamed as tokens"""
+    return _TOKEN_PATTERN.findall(text) or [""]
+
+
+def limit_output(text, max_tokens=None, stop=None):
+    """
+    Apply a request's stop sequences and output token limit to a canned answer
+    Returns the tokens to send and the finish reason ("stop" or "length")
+    """
+    if isinstance(stop, str):
+        stop = [stop]
+    for sequence in stop or []:
+        if sequence and sequence in text:
+            text = text[:text.index(sequence)]
+    tokens = split_tokens(text)
+    if max_tokens and max_tokens > 0 and len(tokens) > max_tokens:
+        return tokens[:max_tokens], "length"
+    return tokens, "stop"
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def _common_prefix_length(a, b):
+    length = min(len(a), len(b))
+    for index in range(length):
+        if a[index] != b[index]:
+            return index
+    return length
+
+
+class MockLLMServer:
+    """
+    Threaded HTTP server imitating Ollama and OpenAI
+
+    Args:
+        host (str): Interface to bind
+        port (int): Port to bind; 0 picks a free port
+        ttft (float): Seconds before the first token
+        tokens_per_sec (float): Generation speed after the first token; 0 means instant
+        error_rate (float): Fraction of generation requests that fail (seeded, reproducible)
+        error_every (int): Additionally fail every n-th generation request; 0 disables
+        error_status (int): HTTP status returned for injected errors
+        script (list): Scripted responses, [{"match": str, "response": str}, ...]
+        models (list): Model names reported by /api/tags
+        seed (int): Seed for error injection
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, ttft=0.0, tokens_per_sec=0.0, error_rate=0.0,
+                 error_every=0, error_status=500, script=None, models=None, seed=0):
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.error_rate = error_rate
+        self.error_every = error_every
+        self.error_status = error_status
+        self.script = list(script or [])
+        self.models = list(models or DEFAULT_MODELS)
+        self.request_counts = {}
+        self.traffic = {"generations": 0, "prompt_bytes": 0, "completion_bytes": 0}
+        self._random = random.Random(seed)
+        self._generation_count = 0
+        self._prompt_history = []
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        """Base URL for OLLAMA_BASE_URL"""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def openai_base_url(self):
+        """Base URL for OPENAI_BASE_URL"""
+        return f"{self.url}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-llm-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def record_request(self, path):
+        with self._lock:
+            self.request_counts[path] = self.request_counts.get(path, 0) + 1
+
+    def record_traffic(self, prompt, completion):
+        """Count a generation and the bytes of its prompt and completion"""
+        with self._lock:
+            self.traffic["generations"] += 1
+            self.traffic["prompt_bytes"] += len(prompt.encode("utf-8"))
+            self.traffic["completion_bytes"] += len(completion.encode("utf-8"))
+
+    def stats(self):
+        """Return a copy of the request counts and traffic totals"""
+        with self._lock:
+            return {"requests": dict(self.request_counts), **self.traffic}
+
+    def should_fail(self):
+        """Decide whether the next generation request gets an injected error"""
+        with self._lock:
+            self._generation_count += 1
+            if self.error_every and self._generation_count % self.error_every == 0:
+                return True
+            return self.error_rate > 0 and self._random.random() < self.error_rate
+
+    def cached_tokens(self, prompt):
+        """Simulate prefix caching: tokens shared with the longest matching earlier prompt"""
+        with self._lock:
+            best = max((_common_prefix_length(prompt, previous) for previous in self._prompt_history), default=0)
+            self._prompt_history.append(prompt)
+            del self._prompt_history[:-PROMPT_HISTORY_SIZE]
+        return best // CHARS_PER_TOKEN
+
+    def respond(self, prompt, json_mode=False, has_image=False, answered_turns=0):
+        """
+        Pick the response text for a prompt: a scripted match or a deterministic default
+
+        The default JSON (brainstorming) response grows more complete with every answered
+        round, so a session finishes after two rounds with the default threshold.
+        """
+        for rule in self.script:
+            if rule.get("match", "") in prompt:
+                return rule["response"]
+        if json_mode:
+            response = {
+                "questions": ["Who is the target audience?", "What is the budget?"],
+                "completeness": min(0.9, 0.5 + 0.4 * answered_turns),
+                "facts": ["The idea is described in the prompt"]
+            }
+            if has_image:
+                response["image_analysis"] = {
+                    "description": "A mock sketch",
+                    "key_elements": ["box", "arrow"],
+                    "relation_to_idea": "Illustrates the idea"
+                }
+            return json.dumps(response)
+        if "implementation plan" in prompt.lower():
+            return DEFAULT_PLAN
+        return "Mock response."
+
+    def token_delays(self):
+        """Yield the delay before each token"""
+        yield self.ttft
+        interval = 1.0 / self.tokens_per_sec if self.tokens_per_sec else 0.0
+        while True:
+            yield interval
+
+
+def _flatten_content(content):
+    """Return (text, has_image) for an OpenAI message content string or list of parts"""
+    if isinstance(content, str):
+        return content, False
+    texts, has_image = [], False
+    for part in content or []:
+        if part.get("type") == "text":
+            texts.append(part.get("text", ""))
+        elif part.get("type") == "image_url":
+            has_image = True
+    return "\n".join(texts), has_image
+
+
+def _make_handler(server):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            # Keep benchmark output clean
+            pass
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length", 0))
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _start_chunked(self, content_type):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+        def _write_chunk(self, data):
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def _end_chunked(self):
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+        def _injected_error(self, openai_style):
+            message = "Injected error from mock server"
+            payload = {"error": {"message": message, "type": "server_error"}} if openai_style else {"error": message}
+            self._send_json(server.error_status, payload)
+
+        def do_GET(self):
+            server.record_request(self.path)
+            if self.path == "/api/tags":
+                self._send_json(200, {"models": [{"name": name, "model": name} for name in server.models]})
+            elif self.path in ("/v1/models", "/models"):
+                self._send_json(200, {"object": "list", "data": [{"id": name, "object": "model"} for name in server.models]})
+            else:
+                self._send_json(404, {"error": f"unknown path {self.path}"})
+
+        def do_POST(self):
+            server.record_request(self.path)
+            request = self._read_json()
+            if self.path == "/api/generate":
+                prompt = f"{request.get('system', '')}\n{request.get('prompt', '')}"
+                self._ollama(request, prompt, chat=False)
+            elif self.path == "/api/chat":
+                prompt = "\n".join(_flatten_content(msg.get("content"))[0] for msg in request.get("messages", []))
+                self._ollama(request, prompt, chat=True)
+            elif self.path in ("/v1/chat/completions", "/chat/completions"):
+                self._openai(request)
+            else:
+                self._send_json(404, {"error": f"unknown path {self.path}"})
+
+        def _ollama(self, request, prompt, chat):
+            if server.should_fail():
+                self._injected_error(openai_style=False)
+                return
+            model = request.get("model", server.models[0])
+            json_mode = request.get("format") is not None
+            answered_turns = prompt.count("\nUser:") + sum(
+                1 for msg in request.get("messages", [])[1:] if msg.get("role") == "user"
+            )
+            text = server.respond(prompt, json_mode=json_mode, has_image=bool(request.get("images")),
+                                  answered_turns=answered_turns)
+            server.record_traffic(prompt, text)
+            prompt_tokens = estimate_tokens(prompt)
+            prefill_tokens = prompt_tokens - min(prompt_tokens, server.cached_tokens(prompt))
+            options = request.get("options") or {}
+            tokens, done_reason = limit_output(text, options.get("num_predict"), options.get("stop"))
+            started = time.perf_counter()
+
+            def piece(content, done):
+                chunk = {"model": model, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ"), "done": done}
+                if chat:
+                    chunk["message"] = {"role": "assistant", "content": content}
+                else:
+                    chunk["response"] = content
+                if done:
+                    # Durations are in nanoseconds, like Ollama's; the mock spends its whole time on the answer
+                    chunk.update({"done_reason": done_reason, "prompt_eval_count": prefill_tokens,
+                                  "eval_count": len(tokens),
+                                  "prompt_eval_duration": 0,
+                                  "eval_duration": int((time.perf_counter() - started) * 1e9)})
+                    if not chat:
+                        # Stands in for Ollama's encoded conversation, enough to request a continuation
+                        chunk["context"] = [prompt_tokens, len(tokens)]
+                return chunk
+
+            if not request.get("stream", True):
+                for delay, _ in zip(server.token_delays(), tokens):
+                    time.sleep(delay)
+                self._send_json(200, piece("".join(tokens), True))
+                return
+
+            self._start_chunked("application/x-ndjson")
+            for delay, token in zip(server.token_delays(), tokens):
+                time.sleep(delay)
+                self._write_chunk((json.dumps(piece(token, False)) + "\n").encode("utf-8"))
+            self._write_chunk((json.dumps(piece("", True)) + "\n").encode("utf-8"))
+            self._end_chunked()
+
+        def _openai(self, request):
+            if server.should_fail():
+                self._injected_error(openai_style=True)
+                return
+            model = request.get("model", "gpt-mock")
+            parts = [_flatten_content(msg.get("content")) for msg in request.get("messages", [])]
+            prompt = "\n".join(text for text, _ in parts)
+            has_image = any(image for _, image in parts)
+            json_mode = (request.get("response_format") or {}).get("type") in ("json_object", "json_schema")
+            # The first user message carries the idea; later ones are brainstorming answers
+            answered_turns = max(0, sum(1 for msg in request.get("messages", []) if msg.get("role") == "user") - 1)
+            text = server.respond(prompt, json_mode=json_mode, has_image=has_image, answered_turns=answered_turns)
+            server.record_traffic(prompt, text)
+            tokens, finish_reason = limit_output(text, request.get("max_tokens"), request.get("stop"))
+            prompt_tokens = estimate_tokens(prompt)
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(tokens),
+                "total_tokens": prompt_tokens + len(tokens),
+                "prompt_tokens_details": {"cached_tokens": min(prompt_tokens, server.cached_tokens(prompt))}
+            }
+            base = {"id": f"chatcmpl-mock-{int(time.time() * 1000)}", "created": int(time.time()), "model": model}
+
+            if not request.get("stream"):
+                for delay, _ in zip(server.token_delays(), tokens):
+                    time.sleep(delay)
+                self._send_json(200, {
+                    **base,
+                    "object": "chat.completion",
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)},
+                                 "finish_reason": finish_reason}],
+                    "usage": usage
+                })
+                return
+
+            self._start_chunked("text/event-stream")
+            for delay, token in zip(server.token_delays(), tokens):
+                time.sleep(delay)
+                chunk = {**base, "object": "chat.completion.chunk",
+                         "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            final = {**base, "object": "chat.completion.chunk",
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]}
+            if (request.get("stream_options") or {}).get("include_usage"):
+                final["usage"] = usage
+            self._write_chunk(f"data: {json.dumps(final)}\n\n".encode("utf-8"))
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._end_chunked()
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline Ollama/OpenAI-compatible mock server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--ttft", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0, help="Generation speed (0 = instant)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of generations that fail")
+    parser.add_argument("--error-every", type=int, default=0, help="Fail every n-th generation")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--script", help="JSON file with scripted responses")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    script = None
+    if args.script:
+        with open(args.script, "r") as f:
+            script = json.load(f)
+
+    server = MockLLMServer(
+        host=args.host, port=args.port, ttft=args.ttft, tokens_per_sec=args.tokens_per_sec,
+        error_rate=args.error_rate, error_every=args.error_every, error_status=args.error_status,
+        script=script, seed=args.seed
+    )
+    print(f"Mock LLM server listening on {server.url}")
+    print(f"  OLLAMA_BASE_URL={server.url}")
+    print(f"  OPENAI_BASE_URL={server.openai_base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""
+End-to-end pipeline benchmark for the Idea-to-Plan Generator
+
+Drives idea input -> image analysis -> brainstorming -> plan -> save against the
+offline mock backend (mock_llm_server.py), rendering the pages with Streamlit's
+AppTest, then times the model layer on its own with direct calls.
+
+Per stage it reports wall time, LLM calls, prompt/completion bytes, script runs
+(including st.rerun polling) and the peak pickled size of the session state.
+
+Usage:
+    python benchmarks/pipeline_benchmark.py [--backend local|cloud] [--output results.json]
+    python benchmarks/pipeline_benchmark.py --baseline benchmarks/pipeline_baseline.json --check
+
+Create or refresh the baseline with --output benchmarks/pipeline_baseline.json.
+"""
+import argparse
+import json
+import os
+import pickle
+import struct
+import sys
+import tempfile
+import time
+import zlib
+
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from mock_llm_server import MockLLMServer
+
+IDEA = "A mobile app that helps people track their daily water intake with reminders and progress charts"
+PLAN_TYPE = "App Development"
+ANSWERS = [
+    "Office workers aged 25-45 who forget to drink water; budget is about $20k.",
+    "iOS first, with Apple Health sync; launch in three months with two developers."
+]
+GENERATION_PATHS = ("/api/generate", "/api/chat", "/v1/chat/completions")
+# Session state carried from page to page, as Streamlit would within one browser session
+CARRIED_KEYS = [
+    "session_id", "api_key", "model_status", "current_step", "plan_history",
+    "model_type", "selected_model", "idea_description", "image_hash", "plan_type",
+    "image_analysis", "brainstorm_context", "current_question", "brainstorming_complete",
+    "brainstorm_facts", "brainstorm_completeness", "generated_plan", "plan_iteration",
+    "generation_complete", "feedback_history", "stage_models", "artifact_models", "plan_draft_job_id"
+]
+# Default tolerances for --baseline comparisons
+TIME_TOLERANCE = 0.25
+TIME_SLACK_SECONDS = 0.1
+
+
+def make_png(width=64, height=48):
+    """Return a small solid-colour PNG, so the benchmark needs no image files"""
+    row = b"\x00" + b"\x40\x80\xc0" * width
+    raw = row * height
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b"")
+
+
+def session_state_bytes(app):
+    """Approximate memory held in an AppTest session state as the pickled size of its values"""
+    total = 0
+    for key in CARRIED_KEYS:
+        if key in app.session_state:
+            try:
+                total += len(pickle.dumps(app.session_state[key]))
+            except Exception:
+                total += len(repr(app.session_state[key]))
+    return total
+
+
+class StageRecorder:
+    """Collects per-stage measurements from the mock server and the rerun counter"""
+
+    def __init__(self, server):
+        self.server = server
+        self.script_runs = 0
+        self.results = {}
+
+    def count_run(self):
+        self.script_runs += 1
+
+    def measure(self, name, fn, apps=()):
+        """Run fn, recording its wall time, LLM traffic, script runs and session state size"""
+        before = self.server.stats()
+        runs_before = self.script_runs
+        start = time.perf_counter()
+        value = fn()
+        seconds = time.perf_counter() - start
+        after = self.server.stats()
+        self.results[name] = {
+            "seconds": round(seconds, 4),
+            "llm_calls": sum(after["requests"].get(path, 0) - before["requests"].get(path, 0) for path in GENERATION_PATHS),
+            "prompt_bytes": after["prompt_bytes"] - before["prompt_bytes"],
+            "completion_bytes": after["completion_bytes"] - before["completion_bytes"],
+            "script_runs": self.script_runs - runs_before,
+            "session_state_bytes": max([session_state_bytes(app) for app in apps] or [0])
+        }
+        print(f"{name:28} {seconds * 1000:9.1f} ms   llm calls {self.results[name]['llm_calls']:2}"
+              f"   runs {self.results[name]['script_runs']:3}")
+        return value
+
+
+def run_pipeline(recorder, backend, model):
+    """Drive the pages with AppTest; returns the list of exceptions the pages raised"""
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+    from utils.blob_store import put_blob, session_holder
+
+    # Count every st.rerun so polling overhead shows up as script runs
+    original_rerun = st.rerun
+
+    def counting_rerun(*args, **kwargs):
+        recorder.count_run()
+        return original_rerun(*args, **kwargs)
+
+    st.rerun = counting_rerun
+
+    # AppTest runs each page on its own, so switch_page cannot resolve the other pages;
+    # navigating away ends the page run, as it does in the app
+    original_switch_page = st.switch_page
+
+    def ending_switch_page(page):
+        st.stop()
+
+    st.switch_page = ending_switch_page
+    exceptions = []
+    page_names = {}
+    state = {
+        "session_id": "benchmark-session",
+        "model_type": backend,
+        "selected_model": model,
+        "api_key": "mock-key" if backend == "cloud" else None,
+        "model_status": "success"
+    }
+
+    def open_page(page):
+        app = AppTest.from_file(os.path.join(APP_DIR, page), default_timeout=300)
+        page_names[id(app)] = page
+        for key, value in state.items():
+            app.session_state[key] = value
+        return app
+
+    def run(app):
+        recorder.count_run()
+        app.run()
+        exceptions.extend(f"{page_names[id(app)]}: {e.value}" for e in app.exception)
+        for key in CARRIED_KEYS:
+            if key in app.session_state:
+                state[key] = app.session_state[key]
+
+    def click(app, label):
+        next(button for button in app.button if button.label == label).click()
+        run(app)
+
+    try:
+        # AppTest cannot drive a file upload, so the sketch goes into the blob store directly
+        image_hash = put_blob(make_png(), holder=session_holder(state["session_id"]))
+        state["image_hash"] = image_hash
+
+        idea_app = open_page("pages/2_idea_Input.py")
+
+        def idea_input():
+            run(idea_app)
+            idea_app.text_area[0].input(IDEA)
+            idea_app.selectbox[0].select(PLAN_TYPE)
+            click(idea_app, "Save Details")
+        recorder.measure("page.idea_input", idea_input, [idea_app])
+
+        brainstorm_app = open_page("pages/3_Brainstorming.py")
+        # The first run analyzes the image and polls until the opening questions arrive
+        recorder.measure("page.brainstorm_first_turn", lambda: run(brainstorm_app), [brainstorm_app])
+
+        for index, answer in enumerate(ANSWERS, start=1):
+            if state.get("brainstorming_complete") or not state.get("current_question"):
+                break
+
+            def answer_round():
+                brainstorm_app.text_area(key="user_response").input(answer)
+                click(brainstorm_app, "Submit Response")
+            recorder.measure(f"page.brainstorm_round_{index + 1}", answer_round, [brainstorm_app])
+
+        plan_app = open_page("pages/4_Plan_Generator.py")
+
+        def plan():
+            run(plan_app)
+            # A plan drafted when brainstorming completed is picked up without a click
+            if any(button.label == "Generate Implementation Plan" for button in plan_app.button):
+                click(plan_app, "Generate Implementation Plan")
+        recorder.measure("page.plan", plan, [plan_app])
+
+        recorder.measure("page.save", lambda: click(plan_app, "Save to History ▶️"), [plan_app])
+    finally:
+        st.rerun = original_rerun
+        st.switch_page = original_switch_page
+    return exceptions
+
+
+def run_model_layer(recorder, backend, model):
+    """Time the model layer without Streamlit in the way"""
+    from utils.brainstorm_engine import run_turn, run_first_turn_with_image
+    from utils.prompt_templates import build_plan_prompt, to_messages
+    from utils.model_utils import generate_with_ollama, generate_with_openai
+    import base64
+
+    api_key = "mock-key" if backend == "cloud" else None
+    context = [{"role": "assistant", "content": "Who is the target audience?"}, {"role": "user", "content": ANSWERS[0]}]
+
+    if backend == "cloud":
+        image_base64 = base64.b64encode(make_png()).decode("utf-8")
+        recorder.measure("model.first_turn_with_image", lambda: run_first_turn_with_image(
+            model, api_key, IDEA, PLAN_TYPE, image_base64))
+    recorder.measure("model.brainstorm_turn", lambda: run_turn(
+        backend, model, api_key, IDEA, PLAN_TYPE, None, context))
+
+    system_prompt, user_prompt = build_plan_prompt(IDEA, PLAN_TYPE, None, context, [])
+    if backend == "local":
+        recorder.measure("model.plan", lambda: generate_with_ollama(model, user_prompt, system_prompt=system_prompt))
+        recorder.measure("model.plan_streamed", lambda: generate_with_ollama(
+            model, user_prompt, system_prompt=system_prompt, stream_callback=lambda piece: None))
+    else:
+        messages = to_messages(system_prompt, user_prompt)
+        recorder.measure("model.plan", lambda: generate_with_openai(model, messages, api_key))
+        recorder.measure("model.plan_streamed", lambda: generate_with_openai(
+            model, messages, api_key, stream_callback=lambda piece: None))
+
+
+def compare(results, baseline, time_tolerance=TIME_TOLERANCE, time_slack=TIME_SLACK_SECONDS):
+    """
+    Compare stage results with a baseline
+
+    A stage regresses if it makes more LLM calls or script runs than the baseline, or
+    if its wall time exceeds the baseline by more than the tolerance.
+
+    Returns:
+        list: Human-readable regressions
+    """
+    regressions = []
+    for name, base in baseline.get("stages", {}).items():
+        current = results["stages"].get(name)
+        if current is None:
+            regressions.append(f"{name}: stage missing from this run")
+            continue
+        for metric in ("llm_calls", "script_runs"):
+            if current[metric] > base[metric]:
+                regressions.append(f"{name}: {metric} {base[metric]} -> {current[metric]}")
+        limit = base["seconds"] * (1 + time_tolerance) + time_slack
+        if current["seconds"] > limit:
+            regressions.append(f"{name}: {base['seconds']:.3f}s -> {current['seconds']:.3f}s (limit {limit:.3f}s)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the full idea-to-plan pipeline against a mock backend")
+    parser.add_argument("--backend", choices=["local", "cloud"], default="local")
+    parser.add_argument("--model", help="Model name (defaults to a mock model for the backend)")
+    parser.add_argument("--ttft", type=float, default=0.05, help="Mock time to first token in seconds")
+    parser.add_argument("--tokens-per-sec", type=float, default=400.0, help="Mock generation speed")
+    parser.add_argument("--skip-pages", action="store_true", help="Only benchmark the model layer")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--baseline", help="Compare with the results stored in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=TIME_TOLERANCE, help="Allowed relative slowdown")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 on regressions or page errors")
+    args = parser.parse_args()
+    model = args.model or ("gpt-4o" if args.backend == "cloud" else "mock-llama:latest")
+    # The benchmark runs from a scratch directory, so resolve user paths first
+    output_path = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+
+    workdir = tempfile.mkdtemp(prefix="ideation-bench-")
+    with MockLLMServer(ttft=args.ttft, tokens_per_sec=args.tokens_per_sec) as server:
+        # Point the app at the mock and keep all files it writes out of the app directory;
+        # this must happen before the app modules are imported
+        os.environ["OLLAMA_BASE_URL"] = server.url
+        os.environ["OPENAI_BASE_URL"] = server.openai_base_url
+        os.environ["IDEATION_BLOB_DIR"] = os.path.join(workdir, "blobs")
+        os.environ["IDEATION_CHECKPOINT_DIR"] = os.path.join(workdir, "checkpoints")
+        os.chdir(workdir)
+        sys.path.insert(0, APP_DIR)
+
+        recorder = StageRecorder(server)
+        exceptions = [] if args.skip_pages else run_pipeline(recorder, args.backend, model)
+        run_model_layer(recorder, args.backend, model)
+
+    page_stages = [stage for name, stage in recorder.results.items() if name.startswith("page.")]
+    results = {
+        "config": {"backend": args.backend, "model": model, "ttft": args.ttft, "tokens_per_sec": args.tokens_per_sec},
+        "stages": recorder.results,
+        "totals": {
+            "pipeline_seconds": round(sum(stage["seconds"] for stage in page_stages), 4),
+            "pipeline_llm_calls": sum(stage["llm_calls"] for stage in page_stages),
+            "pipeline_script_runs": sum(stage["script_runs"] for stage in page_stages)
+        },
+        "exceptions": exceptions
+    }
+    print(f"{'pipeline total':28} {results['totals']['pipeline_seconds'] * 1000:9.1f} ms"
+          f"   llm calls {results['totals']['pipeline_llm_calls']:2}")
+    for exception in exceptions:
+        print(f"PAGE ERROR: {exception}")
+
+    regressions = []
+    if baseline_path:
+        with open(baseline_path, "r") as f:
+            regressions = compare(results, json.load(f), time_tolerance=args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if not regressions:
+            print("No regressions against the baseline")
+        results["regressions"] = regressions
+
+    if output_path:
+        with open(output_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.check and (regressions or exceptions):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
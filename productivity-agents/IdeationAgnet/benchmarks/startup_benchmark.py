@@ -0,0 +1,149 @@
+"""
+Startup benchmark for the Idea-to-Plan Generator Streamlit app
+
+For every page script this measures, each in a fresh interpreter:
+- the time spent in the page's own module-level imports, on top of importing streamlit
+- which heavy backend modules those imports load (they should be loaded lazily on first use)
+- time to first render with Streamlit's AppTest (skipped if it is unavailable)
+
+Results are compared with the budgets in startup_budgets.json.
+
+Usage:
+    python benchmarks/startup_benchmark.py [--repeat 3] [--output startup.json] [--check]
+"""
+import argparse
+import ast
+import glob
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BUDGETS_PATH = os.path.join(os.path.dirname(__file__), "startup_budgets.json")
+
+IMPORT_PROBE = """
+import json, sys, time
+sys.path.insert(0, {app_dir!r})
+import streamlit
+before = set(sys.modules)
+start = time.perf_counter()
+{imports}
+elapsed = time.perf_counter() - start
+new_modules = {{name.split(".")[0] for name in set(sys.modules) - before}}
+print(json.dumps({{"seconds": elapsed, "new_modules": sorted(new_modules)}}))
+"""
+
+RENDER_PROBE = """
+import json, time
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+app = AppTest.from_file({page_path!r}, default_timeout=60)
+app.run()
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "exceptions": [str(e.value) for e in app.exception]}}))
+"""
+
+
+def list_pages():
+    """Return page scripts relative to the app directory, Home first"""
+    pages = sorted(os.path.relpath(path, APP_DIR) for path in glob.glob(os.path.join(APP_DIR, "pages", "*.py")))
+    return ["Home.py"] + pages
+
+
+def extract_imports(page_path):
+    """Return the module-level import statements of a page as source code"""
+    with open(page_path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    statements = [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    return "\n".join(statements)
+
+
+def run_probe(code, workdir):
+    """Run a probe script in a fresh interpreter and return its JSON output"""
+    completed = subprocess.run(
+        [sys.executable, "-c", code], cwd=workdir, capture_output=True, text=True, timeout=300
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr else "probe failed")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def measure_page(page, repeat, workdir, render):
+    """Measure import time, eagerly loaded heavy modules and first render time for one page"""
+    page_path = os.path.join(APP_DIR, page)
+    import_code = IMPORT_PROBE.format(app_dir=APP_DIR, imports=extract_imports(page_path))
+
+    import_runs = [run_probe(import_code, workdir) for _ in range(repeat)]
+    result = {
+        "import_seconds": statistics.median(run["seconds"] for run in import_runs),
+        "new_modules": import_runs[0]["new_modules"],
+        "first_render_seconds": None,
+        "render_exceptions": []
+    }
+
+    if render:
+        render_runs = [run_probe(RENDER_PROBE.format(page_path=page_path), workdir) for _ in range(repeat)]
+        result["first_render_seconds"] = statistics.median(run["seconds"] for run in render_runs)
+        result["render_exceptions"] = render_runs[0]["exceptions"]
+    return result
+
+
+def check_budgets(results, budgets):
+    """Return a list of human-readable budget violations"""
+    violations = []
+    forbidden = set(budgets.get("forbidden_modules", []))
+    for page, result in results.items():
+        import_budget = budgets["import_seconds"].get(page, budgets["import_seconds"]["default"])
+        if result["import_seconds"] > import_budget:
+            violations.append(f"{page}: imports took {result['import_seconds']:.3f}s (budget {import_budget}s)")
+
+        eager = forbidden.intersection(result["new_modules"])
+        if eager:
+            violations.append(f"{page}: imports load backend modules eagerly: {', '.join(sorted(eager))}")
+
+        render_seconds = result["first_render_seconds"]
+        render_budget = budgets["first_render_seconds"].get(page, budgets["first_render_seconds"]["default"])
+        if render_seconds is not None and render_seconds > render_budget:
+            violations.append(f"{page}: first render took {render_seconds:.3f}s (budget {render_budget}s)")
+        if result["render_exceptions"]:
+            violations.append(f"{page}: first render raised {result['render_exceptions'][0]}")
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure page import and first-render times")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (median is reported)")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--no-render", action="store_true", help="Skip the AppTest first-render measurement")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 if any budget is exceeded")
+    args = parser.parse_args()
+
+    with open(BUDGETS_PATH, "r") as f:
+        budgets = json.load(f)
+
+    results = {}
+    # Run in a scratch directory so logs/, blobs/ etc. created at import don't touch the app directory
+    with tempfile.TemporaryDirectory() as workdir:
+        for page in list_pages():
+            results[page] = measure_page(page, args.repeat, workdir, render=not args.no_render)
+            render = results[page]["first_render_seconds"]
+            print(f"{page:32} imports {results[page]['import_seconds'] * 1000:8.1f} ms"
+                  f"   first render {'-' if render is None else f'{render * 1000:8.1f} ms'}")
+
+    violations = check_budgets(results, budgets)
+    for violation in violations:
+        print(f"BUDGET EXCEEDED: {violation}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"results": results, "violations": violations}, f, indent=2)
+
+    if args.check and violations:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,9 +8,31 @@ from utils.model_utils import (
     get_available_ollama_models, 
     test_ollama_connection, 
     get_available_cloud_models,
-    test_openai_connection
+    test_openai_connection,
+    run_ollama_calibration
 )
+from utils.ollama_options import (
+    STAGES,
+    autotune,
+    get_model_settings,
+    get_ollama_options,
+    save_stage_options
+)
+from utils.hedging import hedge_stats
+from utils.circuit_breaker import breaker_statuses
+from utils.model_router import (
+    FAILOVER_ROUTE,
+    HEDGE_ROUTE,
+    ROUTED_STAGES,
+    STAGE_LABELS,
+    VISION_MODELS,
+    default_routes,
+    make_route,
+    route_label
+)
+from utils.model_benchmark import STAGES as BENCHMARK_STAGES, get_results, recommend_models, run_benchmarks
 from utils.logging_utils import setup_logger, log_user_action
+from utils.profiling import start_rerun_profile, finish_rerun_profile
 
 # Set up logging
 logger = setup_logger(__name__)
@@ -24,6 +46,8 @@ st.set_page_config(
 )
 
 logger.debug("Configuration page loaded")
+profiler = start_rerun_profile(st, "Configuration")
+profiler.mark("model_selection")
 
 # Title and description
 st.title("⚙️ Model Configuration")
@@ -45,6 +69,8 @@ if "model_status" not in st.session_state:
     st.session_state.model_status = None
 if "current_step" not in st.session_state:
     st.session_state.current_step = "configuration"
+if "stage_models" not in st.session_state:
+    st.session_state.stage_models = {}
 
 # Model selection section
 st.header("Model Selection")
@@ -62,6 +88,7 @@ with col1:
         st.session_state.selected_model = None
         st.session_state.api_key = None
         st.session_state.model_status = None
+        st.session_state.stage_models = {}
         st.rerun()
 
 with col2:
@@ -74,6 +101,7 @@ with col2:
         st.session_state.selected_model = None
         st.session_state.api_key = None
         st.session_state.model_status = None
+        st.session_state.stage_models = {}
         st.rerun()
 
 # Display configuration based on selected model type
@@ -128,6 +156,75 @@ if st.session_state.model_type == "local":
                         st.error("❌ Could not connect to the model. Make sure it's properly loaded in Ollama.")
         
         handle_ollama_selection()
+        
+        def show_ollama_options(model):
+            """Per-stage generation options and the auto-tuner for the selected Ollama model"""
+            profiler.mark("ollama_options")
+            with st.expander("⚙️ Generation options"):
+                st.markdown(
+                    "Options sent to Ollama for each stage. Leave a value at 0 (or empty) "
+                    "to use the default, or the auto-tuned value if there is one."
+                )
+                for stage in STAGES:
+                    current = get_ollama_options(model, stage)
+                    baseline = get_ollama_options(model, stage, include_overrides=False)
+                    st.markdown(f"**{stage.capitalize()}**")
+                    columns = st.columns(5)
+                    values = {}
+                    for column, key in zip(columns, ["num_ctx", "num_predict", "num_thread", "num_batch"]):
+                        values[key] = column.number_input(
+                            key, min_value=0, step=1, value=int(current.get(key, 0)), key=f"ollama_{stage}_{key}"
+                        )
+                    values["keep_alive"] = columns[4].text_input(
+                        "keep_alive", value=str(current.get("keep_alive", "")), key=f"ollama_{stage}_keep_alive"
+                    )
+                    # Only store what differs from the defaults, so later auto-tuning still applies
+                    overrides = {
+                        key: value for key, value in values.items()
+                        if value not in (0, "") and value != baseline.get(key)
+                    }
+                    if st.button(f"Save {stage} options", key=f"save_ollama_{stage}"):
+                        log_user_action(logger, "save_ollama_options", {"model": model, "stage": stage})
+                        if save_stage_options(model, stage, overrides):
+                            st.success(f"Saved {stage} options for {model}")
+                        else:
+                            st.error("Could not save the options; see the log for details.")
+                
+                st.markdown("---")
+                tuned = get_model_settings(model).get("tuned")
+                if tuned:
+                    st.caption(
+                        f"Auto-tuned on {tuned['tuned_at']}: num_thread={tuned['num_thread']}, "
+                        f"num_batch={tuned['num_batch']} ({tuned['tokens_per_sec']} tokens/s)"
+                    )
+                st.markdown(
+                    "The auto-tuner runs a short calibration sweep over thread and batch settings "
+                    "on this machine and keeps the fastest one for this model. Context size (num_ctx) "
+                    "stays as set per stage above; it also decides how much of the conversation fits "
+                    "in each prompt."
+                )
+                if st.button("Auto-tune for this machine"):
+                    log_user_action(logger, "autotune_ollama", {"model": model})
+                    progress = st.progress(0.0, text="Calibrating...")
+                    
+                    def update_progress(done, total, options, tokens_per_sec):
+                        progress.progress(done / total, text=f"{options} → {tokens_per_sec:.1f} tokens/s")
+                    
+                    result = autotune(model, run_ollama_calibration, progress_callback=update_progress)
+                    if result:
+                        st.success(
+                            f"Best settings: num_thread={result['num_thread']}, num_batch={result['num_batch']} "
+                            f"({result['tokens_per_sec']} tokens/s)"
+                        )
+                        st.dataframe(
+                            [dict(entry["options"], tokens_per_sec=entry["tokens_per_sec"]) for entry in result["results"]],
+                            use_container_width=True
+                        )
+                    else:
+                        st.error("Calibration failed. Make sure the model is loaded in Ollama.")
+        
+        if st.session_state.selected_model:
+            show_ollama_options(st.session_state.selected_model)
 
 elif st.session_state.model_type == "cloud":
     st.subheader("Cloud Model Configuration")
@@ -166,7 +263,166 @@ elif st.session_state.model_type == "cloud":
     
     handle_cloud_selection()
 
+def show_stage_routing(model_type, selected_model):
+    """Let each pipeline stage use its own backend and model"""
+    local_models = st.session_state.get("available_ollama_models") or []
+    cloud_models = get_available_cloud_models() if st.session_state.api_key else []
+    defaults = default_routes(model_type, selected_model, local_models)
+    
+    with st.expander("🔀 Per-stage models"):
+        st.markdown(
+            "Short clarifying questions do not need the same model as the final plan. "
+            "By default questions use a smaller, faster model and plans use the model selected above."
+        )
+        if not cloud_models:
+            st.caption("Enter an API key to route stages to cloud models.")
+        stage_models = dict(st.session_state.stage_models)
+        for stage in ROUTED_STAGES:
+            if stage == "vision":
+                choices = [make_route("cloud", model) for model in cloud_models if model in VISION_MODELS]
+            else:
+                choices = ([make_route("local", model) for model in local_models]
+                           + [make_route("cloud", model) for model in cloud_models])
+            options = [None] + choices
+            current = stage_models.get(stage)
+            chosen = st.selectbox(
+                STAGE_LABELS[stage],
+                options,
+                index=options.index(current) if current in options else 0,
+                format_func=lambda route, stage=stage: route_label(route) if route else f"Automatic: {route_label(defaults[stage])}",
+                key=f"stage_model_{stage}"
+            )
+            if chosen:
+                stage_models[stage] = chosen
+            else:
+                stage_models.pop(stage, None)
+        
+        # Hedging: a backup for clarifying questions that gets a duplicate request when the
+        # question model is slow to produce its first token
+        brainstorm_choices = ([make_route("local", model) for model in local_models]
+                              + [make_route("cloud", model) for model in cloud_models])
+        hedge_options = [None] + brainstorm_choices
+        current = stage_models.get(HEDGE_ROUTE)
+        hedge_route = st.selectbox(
+            "Backup for slow clarifying questions (hedging)",
+            hedge_options,
+            index=hedge_options.index(current) if current in hedge_options else 0,
+            format_func=lambda route: route_label(route) if route else "Off",
+            help="If the question model has not started answering within its usual time, the same request "
+                 "is sent to this model too and the first answer is used.",
+            key="stage_model_hedge"
+        )
+        if hedge_route:
+            stage_models[HEDGE_ROUTE] = hedge_route
+        else:
+            stage_models.pop(HEDGE_ROUTE, None)
+        stats = hedge_stats()
+        if stats["calls"]:
+            st.caption(
+                f"Hedging so far: {stats['hedged']} of {stats['calls']} requests hedged ({stats['hedge_rate']:.0%}); "
+                f"backup won {stats['secondary_wins']}, primary won {stats['primary_wins']}, "
+                f"{stats['cancelled']} losing requests cancelled"
+            )
+        
+        # Failover: tried in order when a stage's model fails or its circuit breaker is open
+        current = [route for route in stage_models.get(FAILOVER_ROUTE, []) if route in brainstorm_choices]
+        failover_routes = st.multiselect(
+            "Failover models (in order)",
+            brainstorm_choices,
+            default=current,
+            format_func=route_label,
+            help="Leave empty to fall back to the other stage's model and then, with an API key, to a small cloud model.",
+            key="stage_model_failover"
+        )
+        if failover_routes:
+            stage_models[FAILOVER_ROUTE] = failover_routes
+        else:
+            stage_models.pop(FAILOVER_ROUTE, None)
+        statuses = breaker_statuses()
+        if statuses:
+            st.dataframe(
+                [
+                    {"Backend": key, "Circuit": status["state"], "Recent calls": status["recent_calls"],
+                     "Recent failures": status["recent_failures"], "Last error": status["last_error"] or ""}
+                    for key, status in statuses.items()
+                ],
+                use_container_width=True
+            )
+        
+        if stage_models != st.session_state.stage_models:
+            log_user_action(logger, "set_stage_models", {
+                stage: [route_label(item) for item in route] if isinstance(route, list) else route_label(route)
+                for stage, route in stage_models.items()
+            })
+            st.session_state.stage_models = stage_models
+
+
+def show_model_benchmark(model_type):
+    """Benchmark models of the selected backend on standard prompts and recommend one per stage"""
+    if model_type == "local":
+        candidates = st.session_state.get("available_ollama_models") or []
+    else:
+        candidates = get_available_cloud_models()
+    if not candidates:
+        return
+    
+    with st.expander("⏱️ Benchmark models"):
+        st.markdown(
+            "Runs a standard brainstorming prompt and a standard plan prompt against each selected model "
+            "and records time to first token, tokens per second, total latency and output length."
+        )
+        default = [st.session_state.selected_model] if st.session_state.selected_model in candidates else []
+        models = st.multiselect("Models to benchmark:", candidates, default=default)
+        stages = st.multiselect("Stages:", BENCHMARK_STAGES, default=BENCHMARK_STAGES)
+        concurrent = st.checkbox(
+            "Run models concurrently",
+            help="Faster, but the models compete for the same hardware, so latencies are higher"
+        )
+        if model_type == "cloud" and not st.session_state.api_key:
+            st.info("Enter your API key above to benchmark cloud models.")
+        elif st.button("Benchmark models", disabled=not models or not stages):
+            log_user_action(logger, "benchmark_models", {"models": models, "stages": stages, "concurrent": concurrent})
+            progress = st.progress(0.0, text="Benchmarking...")
+            
+            def update_progress(done, total, result):
+                progress.progress(done / total, text=f"{result['model']} ({result['stage']}) done")
+            
+            run_benchmarks(model_type, models, st.session_state.api_key, stages=stages,
+                           concurrent=concurrent, progress_callback=update_progress)
+        
+        results = get_results(model_type)
+        if results:
+            st.dataframe(
+                [
+                    {
+                        "Model": result["model"],
+                        "Stage": result["stage"],
+                        "TTFT (s)": result.get("ttft_seconds"),
+                        "Tokens/s": result.get("tokens_per_sec"),
+                        "Total (s)": result.get("total_seconds"),
+                        "Output chars": result.get("output_chars"),
+                        "Adequate": "✅" if result.get("adequate") else "❌",
+                        "Run at": result["timestamp"],
+                        "Error": result.get("error", "")
+                    }
+                    for result in results
+                ],
+                use_container_width=True
+            )
+            for stage, result in recommend_models(model_type).items():
+                st.success(f"Recommended for {stage}: **{result['model']}**")
+
+
+if st.session_state.model_type is not None and st.session_state.selected_model:
+    profiler.mark("stage_routing")
+    show_stage_routing(st.session_state.model_type, st.session_state.selected_model)
+
+if st.session_state.model_type is not None:
+    profiler.mark("model_benchmark")
+    show_model_benchmark(st.session_state.model_type)
+
 # Navigation buttons
+profiler.mark("navigation")
 st.markdown("---")
 
 # Back button for navigation
@@ -189,3 +445,5 @@ with col3:
 
 if st.session_state.model_type is not None and st.session_state.model_status != "success":
     st.info("Please select and verify a model before continuing.")
+
+finish_rerun_profile(st, profiler)
@@ -1,13 +1,20 @@
 import streamlit as st
 import sys
 import os
-import base64
-from PIL import Image
-import io
+import time
+import uuid
 
 # Add parent directory to path to import from utils
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from utils.logging_utils import setup_logger, log_user_action
+from utils.profiling import start_rerun_profile, finish_rerun_profile
+from utils.blob_store import (
+    put_blob, touch_ref, release_ref, session_holder, collect_garbage, gc_due, get_blob_path, BlobTooLarge,
+    MAX_UPLOAD_BYTES
+)
+from utils.image_utils import poll_thumbnail, is_pdf, pdf_page_count, vision_page_count, prepare_upload_images
+from utils.checkpoint_utils import append_checkpoint
+from utils.job_utils import submit_job, make_idempotency_key, POLL_INTERVAL_SECONDS
 
 # Set up logging
 logger = setup_logger(__name__)
@@ -21,6 +28,8 @@ st.set_page_config(
 )
 
 logger.debug("Idea Input page loaded")
+profiler = start_rerun_profile(st, "Idea Input")
+profiler.mark("form")
 
 # Title and description
 st.title("📝 Describe Your Idea")
@@ -34,18 +43,14 @@ logger.info("User viewing idea input page")
 # Initialize session state if needed
 if "idea_description" not in st.session_state:
     st.session_state.idea_description = ""
-if "uploaded_image" not in st.session_state:
-    st.session_state.uploaded_image = None
+if "image_hash" not in st.session_state:
+    st.session_state.image_hash = None
 if "plan_type" not in st.session_state:
     st.session_state.plan_type = None
 if "current_step" not in st.session_state:
     st.session_state.current_step = "idea_input"
-if "image_base64" not in st.session_state:
-    st.session_state.image_base64 = None
-
-# Function to convert uploaded image to base64
-def get_image_base64(image_bytes):
-    return base64.b64encode(image_bytes).decode("utf-8")
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 # Step 1: Idea Description
 st.header("Step 1: Describe your idea")
@@ -68,7 +73,8 @@ This can be a hand-drawn sketch, a digital mockup, or any image that helps illus
 
 uploaded_file = st.file_uploader(
     "Upload your drawing or sketch (JPG, PNG, or PDF)", 
-    type=["jpg", "jpeg", "png", "pdf"]
+    type=["jpg", "jpeg", "png", "pdf"],
+    help=f"Up to {MAX_UPLOAD_BYTES // (1024 * 1024)} MB. For PDFs only the first pages are used."
 )
     
 # Plan type selection
@@ -92,6 +98,7 @@ plan_type = st.selectbox(
 )
 
 # Save and process form inputs
+profiler.mark("save_details")
 if st.button("Save Details"):
     log_user_action(logger, "save_idea_details")
     logger.info("User saving idea details")
@@ -103,27 +110,68 @@ if st.button("Save Details"):
 
     # Process uploaded image if available
     if uploaded_file is not None:
-        logger.info(f"Processing uploaded image: {uploaded_file.name}")
-        # Store the image in session state
-        image_bytes = uploaded_file.getvalue()
-        st.session_state.uploaded_image = image_bytes
-        st.session_state.image_base64 = get_image_base64(image_bytes)
-        logger.debug(f"Image converted to base64 and saved to session state")
-        
-        st.success("Image uploaded successfully!")
+        logger.info(f"Processing uploaded image: {uploaded_file.name} ({uploaded_file.size} bytes)")
+        try:
+            # Stream the upload into the shared blob store in chunks; the session only keeps its hash
+            holder = session_holder(st.session_state.session_id)
+            image_hash = put_blob(uploaded_file, max_bytes=MAX_UPLOAD_BYTES, holder=holder)
+            if st.session_state.image_hash and st.session_state.image_hash != image_hash:
+                release_ref(st.session_state.image_hash, holder)
+            st.session_state.image_hash = image_hash
+            logger.debug(f"Image stored in blob store as {image_hash[:12]}")
+            # Render the vision image and thumbnail in the background, so neither this page
+            # nor the drawing analysis waits for the decoding later
+            submit_job(
+                "prepare_upload", prepare_upload_images, args=(image_hash, (400,)),
+                session_id=st.session_state.session_id,
+                idempotency_key=make_idempotency_key(st.session_state.session_id, "prepare_upload", {"image_hash": image_hash})
+            )
+            
+            # Reclaim blobs no session or saved plan refers to any more, at most every few minutes
+            # and in the background, so the upload never waits for the walk over the store
+            if gc_due():
+                submit_job("collect_garbage", collect_garbage)
+            
+            st.success("Image uploaded successfully!")
+        except BlobTooLarge as e:
+            logger.warning(f"Rejected upload {uploaded_file.name}: {e}")
+            st.error(f"{e}. Please upload a smaller file.")
 
     # Save plan type
     st.session_state.plan_type = plan_type
     logger.info(f"Plan type selected: {plan_type}")
     
+    append_checkpoint(st.session_state.session_id, "idea_input", updates={
+        "model_type": st.session_state.get("model_type"),
+        "selected_model": st.session_state.get("selected_model"),
+        "stage_models": st.session_state.get("stage_models"),
+        "idea_description": st.session_state.idea_description,
+        "image_hash": st.session_state.image_hash,
+        "plan_type": st.session_state.plan_type
+    })
+    
     st.success("All details saved successfully!")
 
 # Display the image if available
-if st.session_state.uploaded_image is not None:
+profiler.mark("image")
+thumbnail_pending = False
+if st.session_state.image_hash is not None:
+    # Keeps this session's hold on the image alive while the idea is being worked on
+    touch_ref(st.session_state.image_hash, session_holder(st.session_state.session_id))
     try:
         logger.debug("Displaying uploaded image")
-        image = Image.open(io.BytesIO(st.session_state.uploaded_image))
-        st.image(image, caption="Your uploaded image", width=400)
+        caption = "Your uploaded image"
+        if is_pdf(get_blob_path(st.session_state.image_hash)):
+            # Pages are rasterised lazily: the thumbnail needs the first one only
+            caption = (f"First page of your PDF ({pdf_page_count(st.session_state.image_hash)} pages; the first "
+                       f"{vision_page_count(st.session_state.image_hash)} are used for the drawing analysis)")
+        # Rendered in the CPU process pool; the page polls until it is ready
+        thumbnail = poll_thumbnail(st.session_state.image_hash, 400)
+        if thumbnail is None:
+            thumbnail_pending = True
+            st.info("Preparing a preview of your upload...")
+        else:
+            st.image(thumbnail, caption=caption, width=400)
     except Exception as e:
         logger.error(f"Error displaying image: {str(e)}")
         st.error(f"Error displaying image: {str(e)}")
@@ -134,14 +182,17 @@ if st.session_state.uploaded_image is not None:
             "Please specify the plan type:",
             value="" if st.session_state.plan_type == "Other (Please specify)" else st.session_state.plan_type
         )
-        if custom_plan_type:
+        # Checkpointed only when it changes, not on every rerun that shows the field
+        if custom_plan_type and custom_plan_type != st.session_state.plan_type:
             logger.debug(f"Custom plan type specified: {custom_plan_type}")
             st.session_state.plan_type = custom_plan_type
+            append_checkpoint(st.session_state.session_id, "idea_input", updates={"plan_type": custom_plan_type})
 
 # Validate inputs before proceeding
+profiler.mark("navigation")
 can_proceed = (
     st.session_state.idea_description.strip() != "" and
-    st.session_state.uploaded_image is not None and
+    st.session_state.image_hash is not None and
     st.session_state.plan_type is not None and
     st.session_state.plan_type != "Other (Please specify)"
 )
@@ -172,3 +223,10 @@ if not can_proceed:
     2. Uploaded an image
     3. Selected a valid plan type
     """)
+
+finish_rerun_profile(st, profiler)
+
+# Poll the thumbnail while it is being rendered
+if thumbnail_pending:
+    time.sleep(POLL_INTERVAL_SECONDS)
+    st.rerun()
@@ -2,12 +2,28 @@ import streamlit as st
 import sys
 import os
 import time
-from PIL import Image
-import io
 
 # Add parent directory to path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from utils.model_utils import generate_with_ollama, generate_with_openai, analyze_image_with_vision_model
+from utils.model_utils import analyze_image_with_vision_model, is_generation_error
+from utils.image_utils import poll_thumbnail, submit_vision_image, get_vision_image_base64
+from utils.blob_store import touch_ref, session_holder
+from utils.checkpoint_utils import append_checkpoint
+from utils.prompt_templates import TEMPLATE_VERSION, build_image_analysis_prompt
+from utils.brainstorm_engine import (
+    run_turn,
+    run_first_turn_with_image,
+    MAX_ROUNDS,
+    COMPLETENESS_THRESHOLD,
+    FUSED_FIRST_TURN,
+    NO_QUESTIONS_MESSAGE
+)
+from utils.model_router import get_session_routes, route_label, can_read_images, failover_chain, HEDGE_ROUTE
+from utils.circuit_breaker import call_with_breaker
+from utils import metrics
+from utils.plan_generation import SPECULATIVE_PLANS, submit_plan_job, snapshot_plan_state
+from utils.job_utils import submit_job, get_job, collect_job, cancel_job, make_idempotency_key, POLL_INTERVAL_SECONDS
+from utils.profiling import start_rerun_profile, finish_rerun_profile
 from utils.logging_utils import setup_logger, log_user_action
 
 # Set up logging
@@ -22,11 +38,13 @@ st.set_page_config(
 )
 
 logger.debug("Brainstorming page loaded")
+profiler = start_rerun_profile(st, "Brainstorming")
+profiler.mark("session_checks")
 
 # Check if we have the required session state
 required_states = [
     "model_type", "selected_model", "idea_description", 
-    "uploaded_image", "plan_type"
+    "image_hash", "plan_type"
 ]
 
 missing_states = [state for state in required_states if state not in st.session_state or not st.session_state[state]]
@@ -49,6 +67,19 @@ if "brainstorming_complete" not in st.session_state:
     st.session_state.brainstorming_complete = False
 if "image_analysis" not in st.session_state:
     st.session_state.image_analysis = None
+if "brainstorm_facts" not in st.session_state:
+    st.session_state.brainstorm_facts = []
+if "brainstorm_completeness" not in st.session_state:
+    st.session_state.brainstorm_completeness = 0.0
+if "brainstorm_job_id" not in st.session_state:
+    st.session_state.brainstorm_job_id = None
+if "brainstorm_error" not in st.session_state:
+    st.session_state.brainstorm_error = None
+if "artifact_models" not in st.session_state:
+    st.session_state.artifact_models = []
+
+# Each stage may run on its own backend and model (see the Configuration page)
+routes = get_session_routes(st.session_state)
 
 # Title and description
 st.title("💭 Interactive Brainstorming")
@@ -61,109 +92,283 @@ and actionable plan for your specific needs.
 logger.info("User viewing brainstorming page")
 
 # Display idea information summary
+profiler.mark("idea_summary")
 st.subheader("Your Idea Summary")
 col1, col2 = st.columns(2)
 
 with col1:
     st.markdown(f"**Description:** {st.session_state.idea_description}")
     st.markdown(f"**Plan Type:** {st.session_state.plan_type}")
-    st.markdown(f"**Model:** {st.session_state.selected_model} ({st.session_state.model_type})")
+    st.markdown(f"**Questions by:** {route_label(routes['brainstorm'])}")
+    if routes.get(HEDGE_ROUTE):
+        st.markdown(f"**Backup for slow questions:** {route_label(routes[HEDGE_ROUTE])}")
+    if st.session_state.image_hash:
+        st.markdown(f"**Drawing analysis by:** {route_label(routes['vision'])}")
 
+thumbnail_pending = False
 with col2:
-    if st.session_state.uploaded_image:
+    if st.session_state.image_hash:
+        # Keeps this session's hold on the image alive while the idea is being worked on
+        touch_ref(st.session_state.image_hash, session_holder(st.session_state.session_id))
         try:
-            image = Image.open(io.BytesIO(st.session_state.uploaded_image))
-            st.image(image, caption="Your Idea Visualization", width=300)
+            with profiler.section("image"):
+                # Rendered in the CPU process pool; the page polls until it is ready
+                thumbnail = poll_thumbnail(st.session_state.image_hash, 300)
+            if thumbnail is None:
+                thumbnail_pending = True
+                st.caption("Preparing a preview of your drawing...")
+            else:
+                st.image(thumbnail, caption="Your Idea Visualization", width=300)
         except Exception:
             st.error("Unable to display the image")
 
 # Function to analyze the image if not already done
-def analyze_image():
-    if st.session_state.image_analysis is None and st.session_state.uploaded_image:
-        logger.info("Starting image analysis process")
-        with st.spinner("Analyzing your drawing..."):
-            if st.session_state.model_type == "cloud":
-                # For cloud models with vision capability
-                model_to_use = st.session_state.selected_model if "vision" in st.session_state.selected_model else "gpt-4o"
-                logger.info(f"Using vision-capable model for image analysis: {model_to_use}")
-                
-                prompt = f"""
-                Analyze this drawing related to the following idea: {st.session_state.idea_description}
-                Describe what you see in the drawing and how it relates to the idea.
-                Focus on identifying key elements, layout, functionality, and features shown in the drawing.
-                """
-                
-                logger.debug("Sending image to vision model for analysis")
-                analysis = analyze_image_with_vision_model(
-                    st.session_state.api_key,
-                    st.session_state.image_base64,
-                    prompt,
-                    model=model_to_use
-                )
-                st.session_state.image_analysis = analysis
-                logger.info("Image analysis completed successfully")
-            else:
-                # For local models without vision capability
-                logger.info("Skipping image analysis - not available with local model")
-                st.session_state.image_analysis = "Image analysis not available with the selected local model."
-        
-        return st.session_state.image_analysis
-    return st.session_state.image_analysis
+def analyze_image(vision_route, api_key, idea_description, image_hash):
+    """
+    Describe the uploaded drawing with the vision model routed for this session (cloud models only)
 
-# Start the brainstorming if no context exists yet
-if not st.session_state.brainstorm_context:
-    logger.info("Starting new brainstorming session")
+    Returns None if the analysis failed, so a failure never reaches session state or prompts.
+    """
+    logger.info("Starting image analysis process")
+    if vision_route:
+        # For cloud models with vision capability
+        model_to_use = vision_route["model"]
+        logger.info(f"Using vision-capable model for image analysis: {model_to_use}")
+        
+        prompt = build_image_analysis_prompt(idea_description)
+        
+        logger.debug("Sending image to vision model for analysis")
+        # Base64 is produced only for the duration of this request; a vision model with an
+        # open circuit fails fast instead of holding up the first questions
+        analysis = call_with_breaker(vision_route, lambda: analyze_image_with_vision_model(
+            api_key,
+            get_vision_image_base64(image_hash),
+            prompt,
+            model=model_to_use
+        ), "vision")
+        if is_generation_error(analysis):
+            # The questions are asked without an image analysis instead
+            logger.warning(f"Image analysis failed: {analysis}")
+            return None
+        logger.info("Image analysis completed successfully")
+        return analysis
     
-    # First analyze the image
-    logger.debug("Calling image analysis function")
-    image_analysis = analyze_image()
+    # For local models without vision capability
+    logger.info("Skipping image analysis - not available with local model")
+    return "Image analysis not available with the selected local model."
+
+def generate_initial_questions(model_type, selected_model, api_key, idea_description, plan_type,
+                               image_hash, image_analysis, brainstorm_facts, vision_route=None, hedge_route=None,
+                               fallback_routes=None, progress_callback=None):
+    """Analyze the image if needed, then run the first brainstorming round (runs as a job)"""
+    start_time = time.time()
+    if image_analysis is None and vision_route and model_type == "cloud" and FUSED_FIRST_TURN:
+        # One multimodal request returns both the image analysis and the first questions;
+        # the brainstorming model is used for it if it can read images
+        fused_model = selected_model if can_read_images(selected_model) else vision_route["model"]
+        if progress_callback:
+            progress_callback("Looking at your drawing and preparing questions...", 0.2)
+        result = run_first_turn_with_image(
+            fused_model, api_key, idea_description, plan_type,
+            get_vision_image_base64(image_hash), brainstorm_facts
+        )
+        if result is not None:
+            metrics.observe("brainstorm.time_to_first_question", time.time() - start_time)
+            fused_label = route_label(result["route"])
+            return {**result, "model": fused_label, "image_analysis_model": fused_label}
+        logger.info("Falling back to separate image analysis and question requests")
+
+    image_analysis_model = None
+    if image_analysis is None:
+        if progress_callback:
+            progress_callback("Analyzing your drawing...", 0.1)
+        image_analysis = analyze_image(vision_route, api_key, idea_description, image_hash)
+        image_analysis_model = route_label(vision_route) if vision_route and image_analysis is not None else None
     
     # Generate initial question based on idea description and image analysis
     logger.info("Generating initial brainstorming questions")
-    with st.spinner("Preparing initial questions based on your idea..."):
-        if st.session_state.model_type == "local":
-            prompt = f"""
-            You are an AI assistant helping brainstorm and develop an implementation plan for a user's idea.
-            User Idea: {st.session_state.idea_description}
-            Plan Type: {st.session_state.plan_type}
-            
-            Image Description: {image_analysis}
-            
-            Ask 1-3 key clarifying questions to better understand the idea and create a more detailed implementation plan.
-            Focus on understanding the scope, target audience, key features, constraints, or resources available.
-            Format your response as a numbered list of questions, without any preamble or additional text.
-            """
-            response = generate_with_ollama(
-                st.session_state.selected_model, 
-                prompt,
-                system_prompt="You are a helpful assistant that asks clear, specific questions to understand the user's idea for creating an implementation plan."
-            )
-        else:  # Cloud model
-            messages = [
-                {"role": "system", "content": "You are a helpful assistant that asks clear, specific questions to understand the user's idea for creating an implementation plan."},
-                {"role": "user", "content": f"""
-                I need help brainstorming and developing an implementation plan for my idea.
-                
-                Idea Description: {st.session_state.idea_description}
-                Plan Type: {st.session_state.plan_type}
-                
-                Image Description: {image_analysis}
-                
-                Ask 1-3 key clarifying questions to better understand my idea and create a more detailed implementation plan.
-                Focus on understanding the scope, target audience, key features, constraints, or resources available.
-                Format your response as a numbered list of questions, without any preamble or additional text.
-                """}
-            ]
-            response = generate_with_openai(
-                st.session_state.selected_model,
-                messages,
-                st.session_state.api_key
-            )
-        
-        st.session_state.current_question = response
-        st.session_state.brainstorm_context.append({"role": "assistant", "content": response})
+    if progress_callback:
+        progress_callback("Preparing initial questions based on your idea...", 0.5)
+    result = run_turn(
+        model_type, selected_model, api_key, idea_description, plan_type,
+        image_analysis, [], brainstorm_facts, hedge_route=hedge_route, fallback_routes=fallback_routes
+    )
+    metrics.observe("brainstorm.time_to_first_question", time.time() - start_time)
+    return {**result, "image_analysis": image_analysis, "model": route_label(result["route"]),
+            "image_analysis_model": image_analysis_model}
+
+def generate_follow_up(model_type, selected_model, api_key, idea_description, plan_type,
+                       image_analysis, brainstorm_context, brainstorm_facts, hedge_route=None, fallback_routes=None):
+    """Run the next brainstorming round from the conversation so far (runs as a job)"""
+    result = run_turn(
+        model_type, selected_model, api_key, idea_description, plan_type,
+        image_analysis, brainstorm_context, brainstorm_facts, hedge_route=hedge_route,
+        fallback_routes=fallback_routes
+    )
+    return {**result, "model": route_label(result["route"])}
+
+def artifact_records(result):
+    """Which model produced the artifacts of a brainstorming result"""
+    records = []
+    if result.get("image_analysis_model"):
+        records.append({"artifact": "image_analysis", "model": result["image_analysis_model"]})
+    records.append({"artifact": "questions", "round": result["round"], "model": result["model"]})
+    return records
+
+def context_messages(result):
+    """Messages a brainstorming result adds to the conversation"""
+    if not result["complete"]:
+        return [{"role": "assistant", "content": result["question"]}]
+    if result["round"] == 1:
+        # A first round that needs no questions is still recorded, so the conversation
+        # shows it and the page does not start the brainstorming again
+        return [{"role": "assistant", "content": NO_QUESTIONS_MESSAGE}]
+    return []
+
+def checkpoint_brainstorm_result(session_id, result):
+    """Persist a finished brainstorming job, even if the user has left the page"""
+    append_checkpoint(session_id, "artifact_models", appends={"artifact_models": artifact_records(result)})
+    if result.get("image_analysis") is not None:
+        append_checkpoint(session_id, "image_analysis", updates={"image_analysis": result["image_analysis"]})
+    facts = {"brainstorm_facts": result["facts"], "brainstorm_completeness": result["completeness"]}
+    if result["complete"]:
+        append_checkpoint(session_id, "brainstorm_complete", updates={**facts, "brainstorming_complete": True},
+                          appends={"brainstorm_context": context_messages(result)})
+    else:
+        append_checkpoint(
+            session_id, "brainstorm_question",
+            updates={**facts, "current_question": result["question"]},
+            appends={"brainstorm_context": context_messages(result)}
+        )
+
+def on_brainstorm_complete(session_id, plan_state, result):
+    """
+    Checkpoint a finished brainstorming job and, if brainstorming is now complete, draft the plan
+
+    Runs in the worker thread, so the draft starts whichever page the user is on.
+    plan_state is a snapshot_plan_state copy taken when the job was submitted (None
+    for no draft); the round's result is applied to it the same way the page applies
+    it on collection, so the page later finds the draft by its key.
+    """
+    checkpoint_brainstorm_result(session_id, result)
+    if plan_state is not None and result["complete"]:
+        draft_state = {
+            **plan_state,
+            "brainstorm_facts": result["facts"],
+            "brainstorm_context": plan_state.get("brainstorm_context", []) + context_messages(result)
+        }
+        if "image_analysis" in result:
+            draft_state["image_analysis"] = result["image_analysis"]
+        submit_plan_job(draft_state, speculative=True)
+
+# Collect a finished brainstorming job (it may have completed while the user was on another page)
+profiler.mark("collect_and_submit_jobs")
+if st.session_state.brainstorm_job_id:
+    job = get_job(st.session_state.brainstorm_job_id)
+    if job is None:
+        logger.warning("Brainstorming job is no longer available, it will be resubmitted")
+        st.session_state.brainstorm_job_id = None
+    elif job.done:
+        collect_job(job.job_id)
+        st.session_state.brainstorm_job_id = None
+        if job.status == "error":
+            # Kept until the user retries, so a failing backend is not called again on every poll
+            st.session_state.brainstorm_error = job.error
+        else:
+            result = job.result
+            st.session_state.artifact_models.extend(artifact_records(result))
+            if "image_analysis" in result:
+                st.session_state.image_analysis = result["image_analysis"]
+            st.session_state.brainstorm_facts = result["facts"]
+            st.session_state.brainstorm_completeness = result["completeness"]
+            st.session_state.brainstorm_context.extend(context_messages(result))
+            if result["complete"]:
+                st.session_state.brainstorming_complete = True
+                if SPECULATIVE_PLANS and not st.session_state.get("generated_plan"):
+                    # The job started the draft when it completed; with unchanged inputs this returns
+                    # that draft by its key, otherwise it starts one. The Plan Generator uses it if
+                    # nothing changes in between
+                    previous_draft = st.session_state.get("plan_draft_job_id")
+                    st.session_state.plan_draft_job_id = submit_plan_job(st.session_state, speculative=True)
+                    if previous_draft and previous_draft != st.session_state.plan_draft_job_id:
+                        cancel_job(previous_draft)
+            else:
+                st.session_state.current_question = result["question"]
+
+if st.session_state.brainstorm_error:
+    st.error(f"Question generation failed: {st.session_state.brainstorm_error}")
+    if st.button("Retry"):
+        log_user_action(logger, "retry_brainstorming")
+        st.session_state.brainstorm_error = None
+        st.rerun()
+
+session_id = st.session_state.session_id
+job_inputs = {
+    "model_type": routes["brainstorm"]["model_type"],
+    "selected_model": routes["brainstorm"]["model"],
+    "api_key": st.session_state.api_key,
+    "idea_description": st.session_state.idea_description,
+    "plan_type": st.session_state.plan_type,
+    "image_analysis": st.session_state.image_analysis,
+    "brainstorm_facts": list(st.session_state.brainstorm_facts),
+    "hedge_route": routes.get(HEDGE_ROUTE),
+    "fallback_routes": failover_chain("brainstorm", routes, bool(st.session_state.api_key))[1:]
+}
+
+# Copy of what a plan draft is built from, for the job to start one when brainstorming completes
+draft_plan_state = (snapshot_plan_state(st.session_state)
+                    if SPECULATIVE_PLANS and not st.session_state.get("generated_plan") else None)
+
+def stage_key(stage, inputs):
+    """Idempotency key for a brainstorming stage, so identical requests share one backend call"""
+    key_inputs = {k: v for k, v in inputs.items() if k != "api_key"}
+    return make_idempotency_key(session_id, stage, {
+        **key_inputs,
+        "template_version": TEMPLATE_VERSION,
+        "max_rounds": MAX_ROUNDS,
+        "threshold": COMPLETENESS_THRESHOLD
+    })
+
+# The first round sends the drawing to a vision model; it is rendered in the CPU process
+# pool first and polled, so the job does not sit waiting for it in a worker thread
+needs_first_round = (not st.session_state.brainstorm_context and not st.session_state.brainstorming_complete
+                     and not st.session_state.brainstorm_job_id and not st.session_state.brainstorm_error)
+vision_pending = False
+if needs_first_round and st.session_state.image_hash and st.session_state.image_analysis is None and routes["vision"]:
+    # A failed render is not retried here: the job renders it again and reports the error
+    vision_pending = not submit_vision_image(st.session_state.image_hash).done()
+
+# Start the brainstorming if no context exists yet
+if needs_first_round and not vision_pending:
+    logger.info("Starting new brainstorming session")
+    initial_inputs = {**job_inputs, "image_hash": st.session_state.image_hash, "vision_route": routes["vision"]}
+    st.session_state.brainstorm_job_id = submit_job(
+        "brainstorm_initial",
+        generate_initial_questions,
+        kwargs=initial_inputs,
+        session_id=session_id,
+        on_complete=lambda result: on_brainstorm_complete(session_id, draft_plan_state, result),
+        report_progress=True,
+        idempotency_key=stage_key("brainstorm_initial", initial_inputs)
+    )
+
+# If there's no current question but we have context, the user has answered and we need the next questions
+if (not st.session_state.current_question and st.session_state.brainstorm_context
+        and not st.session_state.brainstorming_complete and not st.session_state.brainstorm_job_id
+        and not st.session_state.brainstorm_error):
+    logger.info("Generating follow-up brainstorming questions")
+    follow_up_inputs = {**job_inputs, "brainstorm_context": list(st.session_state.brainstorm_context)}
+    st.session_state.brainstorm_job_id = submit_job(
+        "brainstorm_follow_up",
+        generate_follow_up,
+        kwargs=follow_up_inputs,
+        session_id=session_id,
+        on_complete=lambda result: on_brainstorm_complete(session_id, draft_plan_state, result),
+        idempotency_key=stage_key("brainstorm_follow_up", follow_up_inputs)
+    )
 
 # Display the conversation history
+profiler.mark("conversation")
 if st.session_state.brainstorm_context:
     st.subheader("Brainstorming Session")
     for i, message in enumerate(st.session_state.brainstorm_context):
@@ -174,64 +379,36 @@ if st.session_state.brainstorm_context:
             with st.chat_message("user"):
                 st.markdown(message["content"])
 
-# If there's no current question but we have context, we're waiting for user input
-if not st.session_state.current_question and st.session_state.brainstorm_context:
-    # Generate next questions based on conversation history
-    with st.spinner("Analyzing your responses..."):
-        if st.session_state.model_type == "local":
-            # Combine context into a prompt
-            context = "\n".join([
-                f"{'AI' if msg['role'] == 'assistant' else 'User'}: {msg['content']}"
-                for msg in st.session_state.brainstorm_context
-            ])
-            prompt = f"""
-            Based on our conversation so far about the user's idea:
-            
-            User Idea: {st.session_state.idea_description}
-            Plan Type: {st.session_state.plan_type}
-            Image Analysis: {st.session_state.image_analysis}
-            
-            Conversation History:
-            {context}
-            
-            Ask 1-2 more questions to deepen understanding of the idea, or say "BRAINSTORMING_COMPLETE" 
-            if you have enough information to generate an implementation plan.
-            
-            If asking questions, format as a numbered list without preamble. If complete, just return the exact word "BRAINSTORMING_COMPLETE".
-            """
-            response = generate_with_ollama(st.session_state.selected_model, prompt)
-        else:  # Cloud model
-            messages = [
-                {"role": "system", "content": "You are a helpful assistant gathering information to create an implementation plan for the user's idea."},
-                {"role": "user", "content": f"My idea: {st.session_state.idea_description}\nPlan Type: {st.session_state.plan_type}\nImage Analysis: {st.session_state.image_analysis}"}
-            ]
-            # Add the conversation history
-            for msg in st.session_state.brainstorm_context:
-                messages.append(msg)
-            
-            messages.append({
-                "role": "user", 
-                "content": "Based on our conversation so far, ask 1-2 more questions to deepen understanding of my idea, or say 'BRAINSTORMING_COMPLETE' if you have enough information to generate an implementation plan."
-            })
-            
-            response = generate_with_openai(
-                st.session_state.selected_model,
-                messages,
-                st.session_state.api_key
-            )
-        
-        if "BRAINSTORMING_COMPLETE" in response:
-            st.session_state.brainstorming_complete = True
-        else:
-            st.session_state.current_question = response
-            st.session_state.brainstorm_context.append({"role": "assistant", "content": response})
-            st.rerun()
+# Show how far brainstorming has got and what has been learned so far
+if st.session_state.brainstorm_context:
+    rounds = sum(1 for msg in st.session_state.brainstorm_context if msg["role"] == "assistant")
+    st.progress(
+        st.session_state.brainstorm_completeness,
+        text=f"Understanding of your idea: {st.session_state.brainstorm_completeness:.0%} "
+             f"(round {rounds} of at most {MAX_ROUNDS})"
+    )
+if st.session_state.brainstorm_facts:
+    with st.expander(f"What the AI knows so far ({len(st.session_state.brainstorm_facts)} facts)"):
+        for fact in st.session_state.brainstorm_facts:
+            st.markdown(f"- {fact}")
+
+# Show progress of a running job; the page re-runs to poll it at the end of the script
+running_job = get_job(st.session_state.brainstorm_job_id)
+if running_job is not None:
+    message = running_job.message if running_job.kind == "brainstorm_initial" else "Analyzing your responses..."
+    st.info(f"⏳ {message} You can keep using the app while this runs.")
+elif vision_pending:
+    st.info("⏳ Preparing your drawing for analysis...")
 
 # Input area for user response
+profiler.mark("response_input")
 if st.session_state.current_question:
     # Display current question
     st.markdown("### AI Assistant Question")
     st.info(st.session_state.current_question)
+    question_records = [record for record in st.session_state.artifact_models if record["artifact"] == "questions"]
+    if question_records:
+        st.caption(f"Asked by {question_records[-1]['model']}")
     logger.debug(f"Displaying question to user: {st.session_state.current_question[:50]}...")
     
     # Response input
@@ -249,6 +426,11 @@ if st.session_state.current_question:
         if user_response:
             st.session_state.brainstorm_context.append({"role": "user", "content": user_response})
             st.session_state.current_question = None
+            append_checkpoint(
+                st.session_state.session_id, "brainstorm_answer",
+                updates={"current_question": None},
+                appends={"brainstorm_context": [{"role": "user", "content": user_response}]}
+            )
             st.rerun()
         else:
             st.error("Please enter a response before submitting.")
@@ -261,6 +443,7 @@ if st.session_state.brainstorming_complete:
         st.switch_page("pages/4_Plan_Generator.py")
 
 # Navigation buttons at the bottom
+profiler.mark("navigation")
 st.markdown("---")
 col1, col2, col3 = st.columns([1, 2, 1])
 
@@ -277,3 +460,10 @@ with col3:
         logger.info("User proceeding to plan generation page")
         st.session_state.current_step = "plan_generation"
         st.switch_page("pages/4_Plan_Generator.py")
+
+finish_rerun_profile(st, profiler)
+
+# Keep polling while a brainstorming job or a render runs; any click interrupts the wait and re-runs immediately
+if running_job is not None or vision_pending or thumbnail_pending:
+    time.sleep(POLL_INTERVAL_SECONDS)
+    st.rerun()
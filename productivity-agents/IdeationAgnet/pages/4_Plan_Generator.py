@@ -3,14 +3,25 @@ import sys
 import os
 import time
 import base64
-import json
 from datetime import datetime
-from PIL import Image
-import io
 
 # Add parent directory to path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from utils.model_utils import generate_with_ollama, generate_with_openai
+from utils.model_router import get_session_routes, route_label
+from utils.plan_generation import (
+    DRAFT_JOB_KIND,
+    adopt_plan_draft,
+    checkpoint_plan_result,
+    plan_artifact_record,
+    submit_plan_job
+)
+from utils.plan_document import render_plan
+from utils.plan_store import save_plan
+from utils.image_utils import poll_thumbnail
+from utils.blob_store import touch_ref, session_holder
+from utils.checkpoint_utils import append_checkpoint
+from utils.job_utils import get_job, collect_job, cancel_job, POLL_INTERVAL_SECONDS
+from utils.profiling import start_rerun_profile, finish_rerun_profile
 from utils.logging_utils import setup_logger, log_user_action
 
 # Set up logging
@@ -25,11 +36,13 @@ st.set_page_config(
 )
 
 logger.debug("Plan Generator page loaded")
+profiler = start_rerun_profile(st, "Plan Generator")
+profiler.mark("session_checks")
 
 # Check for required session state
 required_states = [
     "model_type", "selected_model", "idea_description", 
-    "uploaded_image", "plan_type"
+    "image_hash", "plan_type"
 ]
 
 missing_states = [state for state in required_states if state not in st.session_state or not st.session_state[state]]
@@ -56,6 +69,10 @@ if "image_analysis" not in st.session_state:
     st.session_state.image_analysis = None
 if "generation_complete" not in st.session_state:
     st.session_state.generation_complete = False
+if "plan_job_id" not in st.session_state:
+    st.session_state.plan_job_id = None
+if "plan_draft_job_id" not in st.session_state:
+    st.session_state.plan_draft_job_id = None
 
 # Title and description
 st.title("📋 Implementation Plan Generator")
@@ -85,125 +102,45 @@ def get_download_link(plan_text, filename="implementation_plan.md"):
     """
     return js + href
 
-# Function to generate the implementation plan
-def generate_plan():
-    logger.info(f"Starting plan generation (iteration {st.session_state.plan_iteration + 1})")
-    with st.spinner("Generating your implementation plan... This may take a minute."):
-        # Prepare conversation context from brainstorming if available
-        context = ""
-        if "brainstorm_context" in st.session_state and st.session_state.brainstorm_context:
-            logger.debug(f"Including {len(st.session_state.brainstorm_context)} brainstorming exchanges in context")
-            context = "\n".join([
-                f"{'AI' if msg['role'] == 'assistant' else 'User'}: {msg['content']}"
-                for msg in st.session_state.brainstorm_context
-            ])
-        
-        # Get image analysis if available
-        image_analysis = st.session_state.image_analysis if st.session_state.image_analysis else "No image analysis available."
-        
-        # Feedback context if this is not the first iteration
-        feedback_context = ""
-        if st.session_state.feedback_history:
-            feedback_context = "\nPrevious feedback:\n" + "\n".join([
-                f"- {feedback}" for feedback in st.session_state.feedback_history
-            ])
-        
-        # Generate plan based on the model type
-        logger.info(f"Generating plan using {st.session_state.model_type} model: {st.session_state.selected_model}")
-        if st.session_state.model_type == "local":
-            # For local Ollama models
-            prompt = f"""
-            Create a detailed implementation plan for the following idea:
-            
-            IDEA DESCRIPTION: {st.session_state.idea_description}
-            
-            PLAN TYPE: {st.session_state.plan_type}
-            
-            IMAGE ANALYSIS: {image_analysis}
-            
-            ADDITIONAL CONTEXT FROM BRAINSTORMING:
-            {context}
-            {feedback_context}
-            
-            Generate a comprehensive implementation plan with the following sections:
-            1. Executive Summary - A brief overview of the idea and implementation approach
-            2. Project Scope - Define what's included and not included
-            3. Key Features and Components - Detailed breakdown of all major components
-            4. Implementation Timeline - Phases of development with estimated timeframes
-            5. Required Resources - People, technologies, tools, and costs
-            6. Success Metrics - How to measure the implementation's success
-            7. Potential Challenges and Mitigations - Identify risks and how to address them
-            8. Next Steps - Immediate actions to get started
-            
-            Format the plan in Markdown with clear headers, bullet points, and sections. Be specific, actionable, and thorough.
-            """
-            
-            system_prompt = """
-            You are an expert implementation planner specializing in turning ideas into actionable plans.
-            Your plans are comprehensive, well-structured, and tailored to the specific type of project.
-            Provide detailed, practical guidance that someone could follow to implement the idea.
-            Format your response in clean Markdown with clear sections and bullet points.
-            """
-            
-            plan = generate_with_ollama(
-                st.session_state.selected_model, 
-                prompt,
-                system_prompt=system_prompt
-            )
+# Attach to the plan drafted in the background when brainstorming completed, if it still
+# matches what would be requested now; otherwise it is cancelled
+profiler.mark("collect_job")
+if st.session_state.plan_draft_job_id:
+    draft_job_id = st.session_state.plan_draft_job_id
+    st.session_state.plan_draft_job_id = None
+    if not st.session_state.generated_plan and not st.session_state.plan_job_id:
+        st.session_state.plan_job_id = adopt_plan_draft(st.session_state, draft_job_id)
+    elif draft_job_id != st.session_state.plan_job_id:
+        # A plan already exists or is being generated
+        cancel_job(draft_job_id)
+
+# Collect a finished plan job (it may have completed while the user was on another page)
+if st.session_state.plan_job_id:
+    job = get_job(st.session_state.plan_job_id)
+    if job is None:
+        logger.warning("Plan generation job is no longer available")
+        st.session_state.plan_job_id = None
+    elif job.done:
+        collect_job(job.job_id)
+        st.session_state.plan_job_id = None
+        if job.status == "error":
+            st.error(f"Plan generation failed: {job.error}")
         else:
-            # For cloud-based models (OpenAI)
-            messages = [
-                {
-                    "role": "system", 
-                    "content": "You are an expert implementation planner specializing in turning ideas into actionable plans. Your plans are comprehensive, well-structured, and tailored to the specific type of project. Provide detailed, practical guidance that someone could follow to implement the idea. Format your response in clean Markdown with clear sections and bullet points."
-                },
-                {
-                    "role": "user", 
-                    "content": f"""
-                    Create a detailed implementation plan for the following idea:
-                    
-                    IDEA DESCRIPTION: {st.session_state.idea_description}
-                    
-                    PLAN TYPE: {st.session_state.plan_type}
-                    
-                    IMAGE ANALYSIS: {image_analysis}
-                    
-                    ADDITIONAL CONTEXT FROM BRAINSTORMING:
-                    {context}
-                    {feedback_context}
-                    
-                    Generate a comprehensive implementation plan with the following sections:
-                    1. Executive Summary - A brief overview of the idea and implementation approach
-                    2. Project Scope - Define what's included and not included
-                    3. Key Features and Components - Detailed breakdown of all major components
-                    4. Implementation Timeline - Phases of development with estimated timeframes
-                    5. Required Resources - People, technologies, tools, and costs
-                    6. Success Metrics - How to measure the implementation's success
-                    7. Potential Challenges and Mitigations - Identify risks and how to address them
-                    8. Next Steps - Immediate actions to get started
-                    
-                    Format the plan in Markdown with clear headers, bullet points, and sections. Be specific, actionable, and thorough.
-                    """
-                }
-            ]
-            
-            plan = generate_with_openai(
-                st.session_state.selected_model,
-                messages,
-                st.session_state.api_key
+            # Increment plan iteration counter and store the generated plan
+            st.session_state.plan_iteration += 1
+            st.session_state.generated_plan = job.result["plan"]
+            st.session_state.generation_complete = True
+            st.session_state.setdefault("artifact_models", []).append(
+                plan_artifact_record(job.result["route"], st.session_state.plan_iteration)
             )
-        
-        # Increment plan iteration counter
-        st.session_state.plan_iteration += 1
-        
-        # Store the generated plan
-        st.session_state.generated_plan = plan
-        st.session_state.generation_complete = True
-        
-        logger.info(f"Plan generation completed successfully (length: {len(plan)} chars)")
-        return plan
+            if job.kind == DRAFT_JOB_KIND:
+                # Drafts are only persisted once they are known to be wanted
+                checkpoint_plan_result(st.session_state.session_id, job.result, st.session_state.plan_iteration)
+            if job.result["route"] != get_session_routes(st.session_state)["plan"]:
+                st.warning(f"The plan model was unavailable, so this plan was written by {route_label(job.result['route'])}.")
 
 # Display idea summary
+profiler.mark("idea_summary")
 st.subheader("Your Idea Summary")
 col1, col2 = st.columns([3, 2])
 
@@ -212,35 +149,63 @@ with col1:
     st.markdown(f"**Plan Type:** {st.session_state.plan_type}")
     if "brainstorm_context" in st.session_state and len(st.session_state.brainstorm_context) > 0:
         st.markdown(f"**Brainstorming:** {len(st.session_state.brainstorm_context) // 2} question-answer pairs")
+    if st.session_state.get("brainstorm_facts"):
+        st.markdown(f"**Key Facts:** {len(st.session_state.brainstorm_facts)} gathered while brainstorming")
+    # Show the model that actually wrote the current plan (it may be a failover model)
+    plan_records = [record for record in st.session_state.get("artifact_models", []) if record["artifact"] == "plan"]
+    if st.session_state.generated_plan and plan_records:
+        st.markdown(f"**Plan by:** {plan_records[-1]['model']}")
+    else:
+        st.markdown(f"**Plan by:** {route_label(get_session_routes(st.session_state).get('plan'))}")
 
+thumbnail_pending = False
 with col2:
-    if st.session_state.uploaded_image:
+    if st.session_state.image_hash:
+        # Keeps this session's hold on the image alive while the idea is being worked on
+        touch_ref(st.session_state.image_hash, session_holder(st.session_state.session_id))
         try:
-            image = Image.open(io.BytesIO(st.session_state.uploaded_image))
-            st.image(image, caption="Your Idea Visualization", width=250)
+            with profiler.section("image"):
+                # Rendered in the CPU process pool; the page polls until it is ready
+                thumbnail = poll_thumbnail(st.session_state.image_hash, 250)
+            if thumbnail is None:
+                thumbnail_pending = True
+                st.caption("Preparing a preview of your drawing...")
+            else:
+                st.image(thumbnail, caption="Your Idea Visualization", width=250)
         except Exception:
             st.error("Unable to display the image")
 
 # Generate plan if not yet generated
-if not st.session_state.generated_plan:
+profiler.mark("generation_controls")
+if not st.session_state.generated_plan and not st.session_state.plan_job_id:
     if st.button("Generate Implementation Plan", type="primary"):
         log_user_action(logger, "initiate_plan_generation")
         logger.info("User initiated plan generation")
-        generated_plan = generate_plan()
+        st.session_state.plan_job_id = submit_plan_job(st.session_state)
         st.rerun()
 
+# Show progress of a running plan job; the page re-runs to poll it at the end of the script
+running_job = get_job(st.session_state.plan_job_id)
+if running_job is not None:
+    st.info("⏳ Generating your implementation plan... You can leave this page and come back, generation continues in the background.")
+    if running_job.partial_output:
+        st.markdown(running_job.partial_output)
+
 # If plan is generated, display it
+profiler.mark("plan_display")
 if st.session_state.generated_plan and st.session_state.generation_complete:
     st.header(f"Your Implementation Plan (Iteration {st.session_state.plan_iteration})")
     
-    # Display the generated plan content
-    st.markdown(st.session_state.generated_plan)
+    # Display the generated plan section by section (parsed once per plan, not per rerun)
+    with profiler.section("plan_markdown"):
+        render_plan(st, st.session_state.generated_plan)
     
     # Add download link
     if st.session_state.generated_plan:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"implementation_plan_{timestamp}.md"
-        st.markdown(get_download_link(st.session_state.generated_plan, filename), unsafe_allow_html=True)
+        with profiler.section("download_link"):
+            st.markdown(get_download_link(st.session_state.generated_plan, filename), unsafe_allow_html=True)
     
 # Handle feedback form if user selected "Needs Improvement"
 if "current_feedback" in st.session_state and st.session_state.current_feedback:
@@ -262,6 +227,11 @@ if "current_feedback" in st.session_state and st.session_state.current_feedback:
             # Clear the current plan to trigger regeneration
             st.session_state.generated_plan = ""
             st.session_state.generation_complete = False
+            append_checkpoint(
+                st.session_state.session_id, "plan_feedback",
+                updates={"generated_plan": "", "generation_complete": False},
+                appends={"feedback_history": [feedback]}
+            )
             
             st.success("Feedback recorded! Regenerating plan...")
             st.rerun()
@@ -269,6 +239,7 @@ if "current_feedback" in st.session_state and st.session_state.current_feedback:
             st.error("Please provide feedback before submitting.")
 
 # Feedback and regeneration section
+profiler.mark("feedback")
 st.markdown("---")
 st.subheader("Feedback and Regeneration")
 st.markdown("If you'd like to modify the plan, provide specific feedback below and regenerate it.")
@@ -291,6 +262,11 @@ if st.button("Regenerate Plan with Feedback", disabled=not st.session_state.gene
         # Clear the current plan to trigger regeneration
         st.session_state.generated_plan = ""
         st.session_state.generation_complete = False
+        append_checkpoint(
+            st.session_state.session_id, "plan_feedback",
+            updates={"generated_plan": "", "generation_complete": False},
+            appends={"feedback_history": [feedback]}
+        )
         
         st.success("Feedback recorded! Regenerating plan...")
         st.rerun()
@@ -298,6 +274,7 @@ if st.button("Regenerate Plan with Feedback", disabled=not st.session_state.gene
         st.error("Please provide feedback before submitting.")
 
 # Navigation buttons
+profiler.mark("navigation")
 st.markdown("---")
 col1, col2, col3 = st.columns([1, 2, 1])
 
@@ -329,5 +306,23 @@ with col3:
         st.session_state.plan_history.append(plan_entry)
         logger.debug(f"Plan saved to history (now {len(st.session_state.plan_history)} plans in history)")
         
+        # Persist the plan to the plan store read by the History page and bulk export
+        save_plan({
+            "timestamp": timestamp,
+            "idea_description": st.session_state.idea_description,
+            "plan_type": st.session_state.plan_type,
+            "generated_plan": st.session_state.generated_plan,
+            "iteration": st.session_state.plan_iteration,
+            "feedback_history": st.session_state.feedback_history,
+            "artifact_models": st.session_state.get("artifact_models", [])
+        }, image_hash=st.session_state.image_hash)
+        
         st.session_state.current_step = "history"
         st.switch_page("pages/5_History.py")
+
+finish_rerun_profile(st, profiler)
+
+# Keep polling while the plan job or the thumbnail render runs; any click interrupts the wait and re-runs immediately
+if running_job is not None or thumbnail_pending:
+    time.sleep(POLL_INTERVAL_SECONDS)
+    st.rerun()
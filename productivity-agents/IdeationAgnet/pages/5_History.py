@@ -5,12 +5,17 @@ import time
 import json
 import base64
 from datetime import datetime
-from PIL import Image
-import io
 
 # Add parent directory to path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from utils.logging_utils import setup_logger, log_user_action
+from utils.profiling import start_rerun_profile, finish_rerun_profile
+from utils.plan_store import parse_timestamp, delete_plan
+from utils.plan_document import render_plan
+from utils.blob_store import release_ref, session_holder
+from utils.export_utils import submit_plans_export
+from utils.job_utils import cancel_job, POLL_INTERVAL_SECONDS
+from utils.checkpoint_utils import JOB_ID_KEYS
 
 # Set up logging
 logger = setup_logger(__name__)
@@ -24,6 +29,8 @@ st.set_page_config(
 )
 
 logger.debug("History page loaded")
+profiler = start_rerun_profile(st, "History")
+profiler.mark("load_plans")
 
 st.title("📚 Plan History")
 st.markdown("View and download your previously generated implementation plans.")
@@ -83,6 +90,7 @@ def get_download_link(plan_text, filename="implementation_plan.md"):
     return js + href
 
 # Display available plans
+profiler.mark("plan_display")
 if plans:
     st.subheader(f"You have {len(plans)} saved plans")
     
@@ -117,7 +125,7 @@ if plans:
     st.markdown("---")
     st.subheader("Implementation Plan")
     plan_content = selected_plan.get('generated_plan', 'No plan content available')
-    st.markdown(plan_content)
+    render_plan(st, plan_content)
     
     # Provide download option
     st.markdown("---")
@@ -141,8 +149,7 @@ if plans:
                 log_user_action(logger, "delete_plan", {"filename": filename})
                 logger.info(f"User deleting plan: {filename}")
                 
-                file_path = os.path.join(plans_dir, filename)
-                os.remove(file_path)
+                delete_plan(filename, plans_dir=plans_dir)
                 
                 st.success(f"Plan deleted successfully!")
                 logger.info(f"Plan deleted successfully: {filename}")
@@ -157,6 +164,64 @@ if plans:
             error_msg = f"Error deleting plan: {str(e)}"
             logger.error(error_msg)
             st.error(error_msg)
+    
+    # Bulk export of plans as a ZIP archive streamed from the plan store
+    st.markdown("---")
+    profiler.mark("bulk_export")
+    st.subheader("Bulk Export")
+    with st.expander("Export multiple plans as a ZIP archive"):
+        plan_dates = [parse_timestamp(plan).date() for plan in plans]
+        date_range = st.date_input(
+            "Created between:",
+            value=(min(plan_dates), max(plan_dates))
+        )
+        available_types = sorted({plan.get("plan_type") or "Not specified" for plan in plans})
+        selected_types = st.multiselect("Plan types:", available_types, default=available_types)
+        # Plans saved without a type are listed as "Not specified" but stored with none
+        export_types = [None if plan_type == "Not specified" else plan_type for plan_type in selected_types]
+        include_pdf = st.checkbox("Include PDF versions of each plan")
+        include_sketches = st.checkbox("Include source sketches")
+        
+        if not selected_types:
+            st.caption("Select at least one plan type to export.")
+        if st.button("Prepare Export", disabled=not selected_types):
+            start_date = date_range[0] if date_range else None
+            end_date = date_range[1] if len(date_range) > 1 else start_date
+            log_user_action(logger, "bulk_export_plans", {
+                "start_date": str(start_date), "end_date": str(end_date), "plan_types": export_types
+            })
+            # Built in the CPU process pool; this page only polls for the result
+            st.session_state.export_future = submit_plans_export(
+                plans_dir=plans_dir,
+                start_date=start_date,
+                end_date=end_date,
+                plan_types=export_types,
+                include_pdf=include_pdf,
+                include_sketches=include_sketches
+            )
+            st.session_state.export_path = None
+        
+        export_future = st.session_state.get("export_future")
+        if export_future is not None and export_future.done():
+            st.session_state.export_future = None
+            try:
+                st.session_state.export_path = export_future.result()
+            except Exception as e:
+                error_msg = f"Error building export: {str(e)}"
+                logger.error(error_msg)
+                st.error(error_msg)
+        
+        export_path = st.session_state.get("export_path")
+        if export_path and os.path.exists(export_path):
+            with open(export_path, "rb") as f:
+                st.download_button(
+                    "Download Export (ZIP)",
+                    data=f,
+                    file_name=os.path.basename(export_path),
+                    mime="application/zip"
+                )
+        elif st.session_state.get("export_future") is not None:
+            st.info("Building export archive...")
 else:
     st.info("You don't have any saved plans yet. Generate a plan first!")
     logger.info("No saved plans found to display")
@@ -167,6 +232,8 @@ else:
         logger.info("User starting to create their first plan")
         st.switch_page("pages/2_idea_Input.py")
 
+finish_rerun_profile(st, profiler)
+
 # Navigation
 st.markdown("---")
 if st.button("← Back to Plan Generator"):
@@ -194,12 +261,21 @@ if st.button("Start New Idea"):
     else:
         api_key = None
         
+    stage_models = st.session_state.get("stage_models", {})
+    
     # Preserve plan history
     if "plan_history" in st.session_state:
         plan_history = st.session_state.plan_history
     else:
         plan_history = []
     
+    # Release this session's hold on the uploaded image so it can be garbage collected
+    if st.session_state.get("image_hash") and st.session_state.get("session_id"):
+        release_ref(st.session_state.image_hash, session_holder(st.session_state.session_id))
+    # Background jobs for the old idea (brainstorming, plan, plan draft) are no longer needed
+    for key in JOB_ID_KEYS:
+        cancel_job(st.session_state.get(key))
+    
     logger.debug("Clearing session state while preserving model settings and plan history")
     
     # Reset session state
@@ -209,9 +285,15 @@ if st.button("Start New Idea"):
     # Restore preserved values
     st.session_state.model_type = model_type
     st.session_state.selected_model = selected_model
+    st.session_state.stage_models = stage_models
     if api_key is not None:
         st.session_state.api_key = api_key
     st.session_state.plan_history = plan_history
     
     logger.info("Redirecting to idea input page")
     st.switch_page("pages/2_idea_Input.py")
+
+# Poll the export while it is being built
+if st.session_state.get("export_future") is not None:
+    time.sleep(POLL_INTERVAL_SECONDS)
+    st.rerun()
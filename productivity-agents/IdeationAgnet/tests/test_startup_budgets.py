@@ -0,0 +1,29 @@
+"""
+Startup budgets from benchmarks/startup_budgets.json, checked for every page
+
+Each page is measured once in a fresh interpreter by the startup benchmark: its
+module-level imports must stay within the import budget without loading backend
+SDKs, and its first AppTest render within the render budget.
+"""
+import json
+import tempfile
+
+import pytest
+
+pytest.importorskip("streamlit")
+
+import startup_benchmark
+
+
+@pytest.fixture(scope="module")
+def budgets():
+    with open(startup_benchmark.BUDGETS_PATH, "r") as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize("page", startup_benchmark.list_pages())
+def test_page_within_startup_budgets(page, budgets):
+    with tempfile.TemporaryDirectory() as workdir:
+        result = startup_benchmark.measure_page(page, repeat=1, workdir=workdir, render=True)
+    violations = startup_benchmark.check_budgets({page: result}, budgets)
+    assert not violations, "\n".join(violations)
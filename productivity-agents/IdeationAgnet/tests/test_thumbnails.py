@@ -0,0 +1,56 @@
+"""
+Thumbnails rendered by the CPU process pool while a page runs under AppTest
+
+Streamlit runs each page as __main__, so pool workers started from a page must not
+re-run it: a worker that does crashes, breaks the pool and leaves the page without
+its image.
+"""
+import io
+import os
+
+import pytest
+
+pytest.importorskip("streamlit")
+Image = pytest.importorskip("PIL.Image")
+
+from streamlit.testing.v1 import AppTest
+
+from conftest import APP_DIR
+from utils import cpu_pool
+from utils.blob_store import get_derived_dir, put_blob, session_holder
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # Blobs, thumbnails, logs and checkpoints all live under the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(cpu_pool, "CPU_WORKERS", max(1, cpu_pool.CPU_WORKERS))
+    # Start from no workers, so they are started while the page is __main__
+    cpu_pool.shutdown_cpu_pool()
+    yield tmp_path
+    cpu_pool.shutdown_cpu_pool()
+
+
+def _store_sketch(session_id):
+    buffer = io.BytesIO()
+    Image.new("RGB", (800, 600), (40, 120, 200)).save(buffer, format="PNG")
+    buffer.seek(0)
+    return put_blob(buffer, holder=session_holder(session_id))
+
+
+def test_idea_input_renders_uploaded_thumbnail(workdir):
+    at = AppTest.from_file(os.path.join(APP_DIR, "pages", "2_idea_Input.py"), default_timeout=60)
+    at.session_state.session_id = "thumbnail-test"
+    at.session_state.idea_description = "A bike rack that folds into the wall"
+    image_hash = _store_sketch("thumbnail-test")
+    at.session_state.image_hash = image_hash
+    # The page shows a placeholder and polls until the pool has rendered the thumbnail
+    for _ in range(30):
+        at.run()
+        assert not at.exception, [e.message for e in at.exception]
+        assert not [e.value for e in at.error if "image" in e.value.lower()]
+        if at.get("imgs"):
+            break
+
+    assert len(at.get("imgs")) == 1
+    assert os.path.exists(os.path.join(get_derived_dir(image_hash), "thumb_400.jpg"))
@@ -0,0 +1,275 @@
+import base64
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+# Add parent directory to path for direct imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.logging_utils import get_logger, log_error, log_function_call, log_function_return
+
+# Set up logger for this module
+logger = get_logger(__name__)
+
+# Content-addressed store shared by all sessions: blobs/<aa>/<sha256> holds the data,
+# blobs/refs/<sha256>/<holder> marks who still uses it and blobs/derived/<sha256>/ holds
+# files computed from it (thumbnails etc.), removed together with the blob
+BLOB_DIR = os.environ.get("IDEATION_BLOB_DIR", "blobs")
+CHUNK_SIZE = 64 * 1024
+# Base64 works on 3-byte groups, so encode in multiples of 3 to avoid padding mid-stream
+BASE64_CHUNK_SIZE = 3 * 16 * 1024
+# Largest upload accepted (also set as Streamlit's server.maxUploadSize in .streamlit/config.toml)
+MAX_UPLOAD_BYTES = int(float(os.environ.get("IDEATION_MAX_UPLOAD_MB", "20")) * 1024 * 1024)
+# Session references are refreshed on use (see touch_ref) and expire when a session goes
+# away without releasing them
+SESSION_REF_TTL = 24 * 60 * 60
+# touch_ref rewrites a reference's timestamp at most this often
+REF_REFRESH_SECONDS = 10 * 60
+# Unreferenced blobs younger than this are kept so a just-uploaded image isn't collected before its ref lands
+GC_GRACE_SECONDS = 10 * 60
+# Uploads start a garbage collection at most this often (see gc_due)
+GC_INTERVAL_SECONDS = 10 * 60
+
+_last_gc_started = 0.0
+_gc_lock = threading.Lock()
+
+
+class BlobTooLarge(ValueError):
+    """Raised by put_blob when the data exceeds its size limit; nothing is stored"""
+
+
+def session_holder(session_id):
+    """Return the reference holder name for a browser session"""
+    return f"session-{session_id}"
+
+
+def plan_holder(plan_filename):
+    """Return the reference holder name for a saved plan"""
+    return f"plan-{plan_filename}"
+
+
+def _blob_path(blob_hash, blob_dir=BLOB_DIR):
+    return os.path.join(blob_dir, blob_hash[:2], blob_hash)
+
+
+def _refs_dir(blob_hash, blob_dir=BLOB_DIR):
+    return os.path.join(blob_dir, "refs", blob_hash)
+
+
+def get_derived_dir(blob_hash, blob_dir=BLOB_DIR):
+    """
+    Return (and create) the directory for files derived from a blob
+    """
+    derived_dir = os.path.join(blob_dir, "derived", blob_hash)
+    os.makedirs(derived_dir, exist_ok=True)
+    return derived_dir
+
+
+def put_blob(source, blob_dir=BLOB_DIR, max_bytes=None, holder=None):
+    """
+    Store data in the blob store and return its SHA-256 hash
+
+    Identical content uploaded by different sessions is stored only once.
+
+    Args:
+        source (bytes or file-like): Data to store; file objects are read in chunks
+        blob_dir (str): Root directory of the blob store
+        max_bytes (int, optional): Reject data larger than this with BlobTooLarge
+        holder (str, optional): Reference the blob for this holder before it is
+            stored, so garbage collection cannot remove it in between
+
+    Returns:
+        str: Hex SHA-256 digest identifying the blob
+    """
+    log_function_call(logger, "put_blob")
+    os.makedirs(blob_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+
+    fd, tmp_path = tempfile.mkstemp(dir=blob_dir, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                chunks = [bytes(source)]
+            else:
+                if hasattr(source, "seek"):
+                    source.seek(0)
+                chunks = iter(lambda: source.read(CHUNK_SIZE), b"")
+            for chunk in chunks:
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise BlobTooLarge(f"Upload is larger than {max_bytes // (1024 * 1024)} MB")
+                digest.update(chunk)
+                tmp.write(chunk)
+
+        blob_hash = digest.hexdigest()
+        if holder:
+            # collect_garbage re-checks references after setting a blob aside, so a blob
+            # referenced here is either kept or already gone and stored again below
+            add_ref(blob_hash, holder, blob_dir)
+        path = _blob_path(blob_hash, blob_dir)
+        if os.path.exists(path):
+            logger.debug(f"Blob {blob_hash[:12]} already stored, deduplicated")
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+            logger.info(f"Stored new blob {blob_hash[:12]} ({size} bytes)")
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    log_function_return(logger, "put_blob", blob_hash)
+    return blob_hash
+
+
+def has_blob(blob_hash, blob_dir=BLOB_DIR):
+    """Return True if the blob exists in the store"""
+    return bool(blob_hash) and os.path.exists(_blob_path(blob_hash, blob_dir))
+
+
+def get_blob_path(blob_hash, blob_dir=BLOB_DIR):
+    """
+    Return the on-disk path of a blob, raising FileNotFoundError if it is missing
+    """
+    path = _blob_path(blob_hash, blob_dir)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Blob not found: {blob_hash}")
+    return path
+
+
+def file_base64(path):
+    """Base64-encode a file chunk by chunk, without holding its raw bytes in memory"""
+    parts = []
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(BASE64_CHUNK_SIZE), b""):
+            parts.append(base64.b64encode(chunk).decode("utf-8"))
+    return "".join(parts)
+
+
+def add_ref(blob_hash, holder, blob_dir=BLOB_DIR):
+    """
+    Record that a holder (session or saved plan) references a blob
+
+    Adding the same holder twice is a no-op apart from refreshing its timestamp.
+    """
+    refs_dir = _refs_dir(blob_hash, blob_dir)
+    os.makedirs(refs_dir, exist_ok=True)
+    with open(os.path.join(refs_dir, holder), "a"):
+        pass
+    os.utime(os.path.join(refs_dir, holder))
+    logger.debug(f"Added reference {holder} to blob {blob_hash[:12]}")
+
+
+def touch_ref(blob_hash, holder, blob_dir=BLOB_DIR, min_interval=REF_REFRESH_SECONDS):
+    """
+    Refresh a holder's reference to a blob it is using, creating it if it is missing
+
+    Pages call this whenever they read a session's blob, so session references only
+    expire once a session stops using them. The timestamp is rewritten at most every
+    min_interval seconds.
+    """
+    if not blob_hash:
+        return
+    try:
+        if time.time() - os.path.getmtime(os.path.join(_refs_dir(blob_hash, blob_dir), holder)) < min_interval:
+            return
+    except FileNotFoundError:
+        pass
+    add_ref(blob_hash, holder, blob_dir)
+
+
+def release_ref(blob_hash, holder, blob_dir=BLOB_DIR):
+    """Drop a holder's reference to a blob; unreferenced blobs are removed by collect_garbage"""
+    if not blob_hash:
+        return
+    try:
+        os.remove(os.path.join(_refs_dir(blob_hash, blob_dir), holder))
+        logger.debug(f"Released reference {holder} from blob {blob_hash[:12]}")
+    except FileNotFoundError:
+        pass
+
+
+def ref_count(blob_hash, blob_dir=BLOB_DIR):
+    """Return the number of holders referencing a blob"""
+    try:
+        return len(os.listdir(_refs_dir(blob_hash, blob_dir)))
+    except FileNotFoundError:
+        return 0
+
+
+def gc_due(min_interval=GC_INTERVAL_SECONDS):
+    """
+    Whether a garbage collection is due: none was started in this process for min_interval seconds
+
+    A True result counts as starting one, so concurrent uploads start a single collection.
+    """
+    global _last_gc_started
+    with _gc_lock:
+        now = time.time()
+        if now - _last_gc_started < min_interval:
+            return False
+        _last_gc_started = now
+        return True
+
+
+def collect_garbage(blob_dir=BLOB_DIR, session_ttl=SESSION_REF_TTL, grace_seconds=GC_GRACE_SECONDS):
+    """
+    Delete blobs that no holder references any more
+
+    Session references older than session_ttl are treated as abandoned and
+    dropped first; plan references never expire.
+
+    Returns:
+        int: Number of blobs removed
+    """
+    log_function_call(logger, "collect_garbage")
+    if not os.path.isdir(blob_dir):
+        return 0
+
+    now = time.time()
+    removed = 0
+    for prefix in os.listdir(blob_dir):
+        prefix_dir = os.path.join(blob_dir, prefix)
+        if prefix == "refs" or len(prefix) != 2 or not os.path.isdir(prefix_dir):
+            continue
+        for blob_hash in os.listdir(prefix_dir):
+            refs_dir = _refs_dir(blob_hash, blob_dir)
+            try:
+                for holder in os.listdir(refs_dir):
+                    ref_path = os.path.join(refs_dir, holder)
+                    if holder.startswith("session-") and now - os.path.getmtime(ref_path) > session_ttl:
+                        os.remove(ref_path)
+                        logger.debug(f"Expired stale reference {holder} on blob {blob_hash[:12]}")
+            except FileNotFoundError:
+                pass
+
+            path = os.path.join(prefix_dir, blob_hash)
+            if ref_count(blob_hash, blob_dir) != 0 or now - os.path.getmtime(path) <= grace_seconds:
+                continue
+            try:
+                # Set the blob aside before re-checking its references: put_blob adds its
+                # reference before looking for the blob, so either the re-check sees it
+                # or put_blob finds the blob gone and stores it again
+                doomed_path = f"{path}.gc"
+                os.replace(path, doomed_path)
+                if ref_count(blob_hash, blob_dir) != 0:
+                    os.replace(doomed_path, path)
+                    continue
+                os.remove(doomed_path)
+                try:
+                    os.rmdir(refs_dir)
+                except OSError:
+                    pass
+                shutil.rmtree(os.path.join(blob_dir, "derived", blob_hash), ignore_errors=True)
+                removed += 1
+            except OSError as e:
+                log_error(logger, e, f"Failed to remove blob {blob_hash[:12]}")
+
+    logger.info(f"Blob garbage collection removed {removed} blobs")
+    log_function_return(logger, "collect_garbage", removed)
+    return removed
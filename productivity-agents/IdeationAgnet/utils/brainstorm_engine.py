@@ -0,0 +1,246 @@
+import json
+import os
+import re
+import sys
+
+# Add parent directory to path for direct imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.model_utils import generate_with_ollama, generate_with_openai, is_generation_error, OUTPUT_TOKEN_BUDGETS
+from utils.ollama_options import get_ollama_options
+from utils.prompt_templates import (
+    build_brainstorm_messages,
+    build_first_turn_messages_with_image,
+    format_image_analysis,
+    messages_to_prompt
+)
+from utils.context_manager import fit_context
+from utils.hedging import hedged_generate
+from utils.circuit_breaker import call_with_breaker, generate_with_failover
+from utils.logging_utils import get_logger, log_function_call, log_function_return
+from utils import metrics
+
+# Set up logger for this module
+logger = get_logger(__name__)
+
+# Hard limit on model calls per brainstorming session (the opening questions count as round 1)
+MAX_ROUNDS = int(os.environ.get("IDEATION_BRAINSTORM_MAX_ROUNDS", "3"))
+# Brainstorming stops early once the model rates the known information at least this complete
+COMPLETENESS_THRESHOLD = float(os.environ.get("IDEATION_BRAINSTORM_THRESHOLD", "0.8"))
+# Analyze the drawing and ask the first questions in one multimodal request (cloud models)
+FUSED_FIRST_TURN = os.environ.get("IDEATION_FUSED_FIRST_TURN", "1") != "0"
+# Shown in place of questions when the first round already finds the idea complete
+NO_QUESTIONS_MESSAGE = "Your description already covers everything the plan needs, so there are no questions."
+
+_FENCE_PATTERN = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def parse_turn(text):
+    """
+    Parse a structured brainstorming response into questions, completeness and facts
+
+    Missing or malformed fields fall back to safe defaults. If the response is not
+    JSON at all (e.g. a backend error string), the raw text is kept as a single
+    question so the user still sees what the model said.
+
+    Args:
+        text (str): Raw model response
+
+    Returns:
+        dict: questions (list of str), completeness (float 0-1), facts (list of str),
+        image_analysis (str or None, only filled by first turns with an image), valid (bool)
+    """
+    cleaned = _FENCE_PATTERN.sub("", (text or "").strip())
+    try:
+        data = json.loads(cleaned)
+        if not isinstance(data, dict):
+            raise ValueError("expected a JSON object")
+    except ValueError:
+        logger.warning(f"Brainstorming response is not valid JSON: {cleaned[:50]}...")
+        metrics.increment("brainstorm.invalid_responses")
+        return {"questions": [cleaned] if cleaned else [], "completeness": 0.0, "facts": [],
+                "image_analysis": None, "valid": False}
+
+    questions = data.get("questions") or []
+    if isinstance(questions, str):
+        questions = [questions]
+    facts = data.get("facts") or []
+    if isinstance(facts, str):
+        facts = [facts]
+    try:
+        completeness = max(0.0, min(1.0, float(data.get("completeness", 0.0))))
+    except (TypeError, ValueError):
+        completeness = 0.0
+    image_analysis = format_image_analysis(data.get("image_analysis")) or None
+
+    return {
+        "questions": [str(q).strip() for q in questions if str(q).strip()],
+        "completeness": completeness,
+        "facts": [str(f).strip() for f in facts if str(f).strip()],
+        "image_analysis": image_analysis,
+        "valid": True
+    }
+
+
+def merge_facts(known_facts, new_facts):
+    """Append new facts to the known ones, skipping case-insensitive duplicates"""
+    merged = list(known_facts or [])
+    seen = {fact.lower() for fact in merged}
+    for fact in new_facts:
+        if fact.lower() not in seen:
+            merged.append(fact)
+            seen.add(fact.lower())
+    return merged
+
+
+def format_questions(questions):
+    """Render questions as the numbered list shown to the user and kept in the transcript"""
+    if len(questions) == 1:
+        return questions[0]
+    return "\n".join(f"{index}. {question}" for index, question in enumerate(questions, start=1))
+
+
+def _generate_turn(route, messages, api_key, stream_callback=None):
+    """Send brainstorming messages to the backend and model of a route in JSON mode"""
+    if route["model_type"] == "local":
+        system_prompt, prompt = messages_to_prompt(messages)
+        return generate_with_ollama(route["model"], prompt, system_prompt=system_prompt, json_mode=True,
+                                    stream_callback=stream_callback,
+                                    options=get_ollama_options(route["model"], "brainstorm"))
+    return generate_with_openai(route["model"], messages, api_key, stream_callback=stream_callback, json_mode=True,
+                                max_tokens=OUTPUT_TOKEN_BUDGETS["brainstorm"])
+
+
+def run_turn(model_type, selected_model, api_key, idea_description, plan_type, image_analysis,
+             brainstorm_context, known_facts=None, max_rounds=MAX_ROUNDS, threshold=COMPLETENESS_THRESHOLD,
+             hedge_route=None, fallback_routes=None):
+    """
+    Run one brainstorming round as a single structured model call
+
+    The round number is the number of assistant turns already in the transcript plus one.
+    The session is complete when the model's completeness score reaches the threshold,
+    when it has no more questions, or when this was the last allowed round; the facts
+    of the final round are still merged.
+
+    Args:
+        model_type (str): "local" or "cloud"
+        selected_model (str): Model name
+        api_key (str): API key for cloud models
+        idea_description (str): The user's idea
+        plan_type (str): Selected plan type
+        image_analysis (str): Description of the uploaded drawing
+        brainstorm_context (list): Conversation so far
+        known_facts (list, optional): Facts extracted in earlier rounds
+        max_rounds (int): Maximum number of brainstorming rounds
+        threshold (float): Completeness score at which brainstorming stops early
+        hedge_route (dict, optional): Backup route (model_type, model) that gets a duplicate
+            request if the selected model is slow to start answering
+        fallback_routes (list, optional): Routes tried in order if the selected model (and the
+            hedge) fail or their circuit is open
+
+    Raises:
+        RuntimeError: If no backend could produce an answer
+
+    Returns:
+        dict: question (str or None), complete (bool), completeness (float), facts (list), round (int),
+        route (the route that produced the answer)
+    """
+    round_number = sum(1 for msg in brainstorm_context if msg["role"] == "assistant") + 1
+    log_function_call(logger, "run_turn", args=[model_type, selected_model], kwargs={"round": round_number})
+
+    # Older turns are folded into a running summary once the transcript outgrows the budget
+    fixed_messages = build_brainstorm_messages(idea_description, plan_type, image_analysis, [])
+    context = fit_context(
+        "brainstorm", model_type, selected_model, api_key,
+        "\n\n".join(msg["content"] for msg in fixed_messages), brainstorm_context
+    )
+    messages = build_brainstorm_messages(
+        idea_description, plan_type, image_analysis, context["recent_context"], context["context_summary"]
+    )
+    route = {"model_type": model_type, "model": selected_model}
+
+    def generate(target, stream_callback=None):
+        return call_with_breaker(target, lambda: _generate_turn(target, messages, api_key, stream_callback))
+
+    if hedge_route and hedge_route != route:
+        tried = [route, hedge_route]
+        response, route = hedged_generate(route, hedge_route, generate)
+    else:
+        tried = [route]
+        response = generate(route)
+    remaining = [target for target in (fallback_routes or []) if target not in tried]
+    if is_generation_error(response) and remaining:
+        response, route = generate_with_failover(remaining, lambda target: _generate_turn(target, messages, api_key))
+    metrics.increment("brainstorm.model_calls")
+    if is_generation_error(response):
+        # Never show a backend error to the user as if it were a question
+        log_function_return(logger, "run_turn", response)
+        raise RuntimeError(response)
+
+    result = _finish_turn(parse_turn(response), round_number, known_facts, max_rounds, threshold)
+    result["route"] = route
+    log_function_return(logger, "run_turn", {"complete": result["complete"], "completeness": result["completeness"]})
+    return result
+
+
+def run_first_turn_with_image(selected_model, api_key, idea_description, plan_type, image_base64,
+                              known_facts=None, max_rounds=MAX_ROUNDS, threshold=COMPLETENESS_THRESHOLD):
+    """
+    Analyze the drawing and run the first brainstorming round in one multimodal request
+
+    This replaces a separate vision call followed by a text call, halving the round
+    trips before the first question (cloud vision models only).
+
+    Args:
+        selected_model (str): Vision-capable cloud model
+        api_key (str): API key
+        idea_description (str): The user's idea
+        plan_type (str): Selected plan type
+        image_base64 (str): The drawing, base64-encoded
+        known_facts (list, optional): Facts extracted earlier
+        max_rounds (int): Maximum number of brainstorming rounds
+        threshold (float): Completeness score at which brainstorming stops early
+
+    Returns:
+        dict: Same as run_turn plus image_analysis (str), or None if the response did not
+        contain a usable analysis and the caller should fall back to separate calls
+    """
+    log_function_call(logger, "run_first_turn_with_image", args=[selected_model])
+    messages = build_first_turn_messages_with_image(idea_description, plan_type, image_base64)
+    response = call_with_breaker(
+        {"model_type": "cloud", "model": selected_model},
+        # The combined answer carries the drawing analysis as well as the questions
+        lambda: generate_with_openai(selected_model, messages, api_key, json_mode=True,
+                                     max_tokens=OUTPUT_TOKEN_BUDGETS["vision"] + OUTPUT_TOKEN_BUDGETS["brainstorm"]),
+        "vision"
+    )
+    metrics.increment("brainstorm.model_calls")
+
+    turn = parse_turn(response)
+    if not turn["valid"] or not turn["image_analysis"]:
+        logger.warning("Combined first turn returned no usable image analysis")
+        metrics.increment("brainstorm.first_turn_fallbacks")
+        log_function_return(logger, "run_first_turn_with_image", None)
+        return None
+
+    result = _finish_turn(turn, 1, known_facts, max_rounds, threshold)
+    result["image_analysis"] = turn["image_analysis"]
+    result["route"] = {"model_type": "cloud", "model": selected_model}
+    log_function_return(logger, "run_first_turn_with_image", {"complete": result["complete"]})
+    return result
+
+
+def _finish_turn(turn, round_number, known_facts, max_rounds, threshold):
+    """Decide whether brainstorming is complete and build the result of a round"""
+    complete = turn["valid"] and (
+        turn["completeness"] >= threshold or not turn["questions"] or round_number >= max_rounds
+    )
+    if complete:
+        metrics.observe("brainstorm.rounds", round_number)
+        logger.info(f"Brainstorming complete after {round_number} round(s), completeness {turn['completeness']:.2f}")
+    return {
+        "question": None if complete else format_questions(turn["questions"]),
+        "complete": complete,
+        "completeness": turn["completeness"],
+        "facts": merge_facts(known_facts, turn["facts"]),
+        "round": round_number
+    }
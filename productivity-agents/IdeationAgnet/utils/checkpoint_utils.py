@@ -0,0 +1,266 @@
+import copy
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+# Add parent directory to path for direct imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.logging_utils import get_logger, log_error, log_function_call, log_function_return
+
+# Set up logger for this module
+logger = get_logger(__name__)
+
+# One append-only JSONL file per session: checkpoints/<session_id>.jsonl
+CHECKPOINT_DIR = os.environ.get("IDEATION_CHECKPOINT_DIR", "checkpoints")
+# Only the most recently updated sessions are kept, and none older than the age limit
+CHECKPOINT_RETENTION = int(os.environ.get("IDEATION_CHECKPOINT_RETENTION", "50"))
+CHECKPOINT_MAX_AGE_DAYS = int(os.environ.get("IDEATION_CHECKPOINT_MAX_AGE_DAYS", "30"))
+# Last records are read backwards in blocks of this size
+TAIL_BLOCK_SIZE = 8 * 1024
+
+# Session state keys that make up an in-progress idea. API keys are deliberately
+# excluded: they are only ever kept in memory.
+RESTORABLE_KEYS = [
+    "model_type", "selected_model", "idea_description", "image_hash", "plan_type",
+    "image_analysis", "brainstorm_context", "current_question", "brainstorming_complete",
+    "brainstorm_facts", "brainstorm_completeness",
+    "generated_plan", "plan_iteration", "generation_complete", "feedback_history",
+    "stage_models", "artifact_models"
+]
+LIST_KEYS = ["brainstorm_context", "feedback_history", "artifact_models"]
+# Values of the restorable keys in a fresh session; restore_session starts from these so
+# nothing of the session being replaced survives
+SESSION_DEFAULTS = {
+    "model_type": None, "selected_model": None, "idea_description": "", "image_hash": None, "plan_type": None,
+    "image_analysis": None, "brainstorm_context": [], "current_question": None, "brainstorming_complete": False,
+    "brainstorm_facts": [], "brainstorm_completeness": 0.0,
+    "generated_plan": "", "plan_iteration": 0, "generation_complete": False, "feedback_history": [],
+    "stage_models": {}, "artifact_models": []
+}
+# Background jobs belong to the session that started them and are never restored
+JOB_ID_KEYS = ["brainstorm_job_id", "plan_job_id", "plan_draft_job_id"]
+
+
+def _checkpoint_path(session_id, checkpoint_dir=CHECKPOINT_DIR):
+    return os.path.join(checkpoint_dir, f"{session_id}.jsonl")
+
+
+def _read_last_record(path):
+    """
+    Return the last complete record of a checkpoint file, reading it from the end
+
+    A torn final line is skipped in favour of the record before it. Returns None if
+    the file holds no readable record.
+    """
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b""
+        while position > 0:
+            step = min(TAIL_BLOCK_SIZE, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+            lines = data.split(b"\n")
+            # The first piece may be cut off unless the start of the file was reached
+            candidates = lines if position == 0 else lines[1:]
+            for line in reversed(candidates):
+                if not line.strip():
+                    continue
+                try:
+                    return json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+    return None
+
+
+def prune_checkpoints(checkpoint_dir=CHECKPOINT_DIR, keep=CHECKPOINT_RETENTION, max_age_days=CHECKPOINT_MAX_AGE_DAYS):
+    """
+    Delete checkpoint files beyond the keep most recent ones or older than max_age_days
+
+    Returns:
+        int: Number of files removed
+    """
+    if not os.path.isdir(checkpoint_dir):
+        return 0
+    now = time.time()
+    files = []
+    for name in os.listdir(checkpoint_dir):
+        if name.endswith(".jsonl"):
+            try:
+                files.append((os.path.getmtime(os.path.join(checkpoint_dir, name)), name))
+            except FileNotFoundError:
+                pass
+    files.sort(reverse=True)
+
+    removed = 0
+    for index, (mtime, name) in enumerate(files):
+        if index >= keep or now - mtime > max_age_days * 24 * 60 * 60:
+            try:
+                os.remove(os.path.join(checkpoint_dir, name))
+                removed += 1
+            except OSError as e:
+                log_error(logger, e, f"Failed to remove old checkpoint {name}")
+    if removed:
+        logger.info(f"Pruned {removed} old session checkpoints")
+    return removed
+
+
+def append_checkpoint(session_id, stage, updates=None, appends=None, checkpoint_dir=CHECKPOINT_DIR):
+    """
+    Append one incremental checkpoint record for a session
+
+    Only what changed at the stage boundary is written: replaced values go in
+    updates, new items for list-valued keys (brainstorm turns, feedback) go in
+    appends, so each write stays small however long the session gets. Every record
+    also repeats the idea description, so listing sessions only reads last records.
+
+    Args:
+        session_id (str): Session the record belongs to
+        stage (str): Name of the stage boundary, e.g. "image_analysis"
+        updates (dict, optional): Session state keys to overwrite on restore
+        appends (dict, optional): Items to append to list-valued session state keys
+        checkpoint_dir (str): Directory where checkpoint files are stored
+    """
+    if not session_id:
+        return
+    record = {"ts": time.time(), "stage": stage}
+    if updates:
+        record["set"] = {key: value for key, value in updates.items() if key in RESTORABLE_KEYS}
+    if appends:
+        record["append"] = {key: list(items) for key, items in appends.items() if key in LIST_KEYS}
+
+    try:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        path = _checkpoint_path(session_id, checkpoint_dir)
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        if "idea_description" in record.get("set", {}):
+            record["idea"] = record["set"]["idea_description"]
+        elif not is_new:
+            last_record = _read_last_record(path) or {}
+            if "idea" in last_record:
+                record["idea"] = last_record["idea"]
+        line = json.dumps(record) + "\n"
+        # Start on a fresh line if a previous write was torn by a crash
+        if not is_new:
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    line = "\n" + line
+        with open(path, "a") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        logger.debug(f"Checkpoint '{stage}' written for session {session_id[:8]}")
+        if is_new:
+            prune_checkpoints(checkpoint_dir)
+    except (IOError, TypeError, ValueError) as e:
+        # A failed checkpoint must never break the workflow itself
+        log_error(logger, e, f"Failed to write checkpoint '{stage}' for session {session_id[:8]}")
+
+
+def load_checkpoint(session_id, checkpoint_dir=CHECKPOINT_DIR):
+    """
+    Replay a session's checkpoint records into a session state dictionary
+
+    A torn final line (e.g. from a crash mid-write) is skipped.
+
+    Returns:
+        dict: Restorable session state values, empty if no checkpoint exists
+    """
+    log_function_call(logger, "load_checkpoint", args=[session_id])
+    state = {}
+    try:
+        with open(_checkpoint_path(session_id, checkpoint_dir), "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping corrupt checkpoint line for session {session_id[:8]}")
+                    continue
+                state.update(record.get("set", {}))
+                for key, items in record.get("append", {}).items():
+                    state.setdefault(key, []).extend(items)
+                state["last_stage"] = record.get("stage")
+    except FileNotFoundError:
+        logger.warning(f"No checkpoint found for session {session_id}")
+
+    log_function_return(logger, "load_checkpoint", list(state.keys()))
+    return state
+
+
+def list_checkpoints(checkpoint_dir=CHECKPOINT_DIR, limit=10):
+    """
+    List the most recently updated checkpointed sessions
+
+    Only the last record of each file is read; files written before records carried
+    the idea description are replayed in full.
+
+    Returns:
+        list: Dicts with session_id, updated (datetime), idea_description and last_stage
+    """
+    if not os.path.isdir(checkpoint_dir):
+        return []
+
+    files = [name for name in os.listdir(checkpoint_dir) if name.endswith(".jsonl")]
+    files.sort(key=lambda name: os.path.getmtime(os.path.join(checkpoint_dir, name)), reverse=True)
+
+    sessions = []
+    for name in files[:limit]:
+        session_id = name[:-len(".jsonl")]
+        path = os.path.join(checkpoint_dir, name)
+        try:
+            record = _read_last_record(path) or {}
+        except FileNotFoundError:
+            continue
+        if "idea" in record:
+            idea_description, last_stage = record["idea"], record.get("stage")
+        else:
+            state = load_checkpoint(session_id, checkpoint_dir)
+            idea_description, last_stage = state.get("idea_description"), state.get("last_stage")
+        if not idea_description:
+            continue
+        sessions.append({
+            "session_id": session_id,
+            "updated": datetime.fromtimestamp(os.path.getmtime(path)),
+            "idea_description": idea_description,
+            "last_stage": last_stage
+        })
+    return sessions
+
+
+def restore_session(session_state, session_id, checkpoint_dir=CHECKPOINT_DIR):
+    """
+    Rebuild session state from a checkpoint without re-running completed LLM calls
+
+    Every restorable key is first reset to its SESSION_DEFAULTS value and job ids
+    are cleared, so no state of the session being replaced leaks into the restored
+    one. The restored session keeps the checkpoint's session id so later checkpoints
+    continue the same file. Cancel the replaced session's jobs before calling this.
+
+    Args:
+        session_state: Streamlit session state (or any mutable mapping)
+        session_id (str): Session to restore
+
+    Returns:
+        str: Page the user should continue on
+    """
+    log_function_call(logger, "restore_session", args=[session_id])
+    state = load_checkpoint(session_id, checkpoint_dir)
+    for key in RESTORABLE_KEYS:
+        session_state[key] = state[key] if key in state else copy.deepcopy(SESSION_DEFAULTS[key])
+    for key in JOB_ID_KEYS:
+        session_state[key] = None
+    session_state["session_id"] = session_id
+    logger.info(f"Restored session {session_id[:8]} at stage '{state.get('last_stage')}'")
+
+    if state.get("generated_plan") or state.get("plan_iteration"):
+        next_page = "pages/4_Plan_Generator.py"
+    elif state.get("brainstorm_context"):
+        next_page = "pages/3_Brainstorming.py"
+    else:
+        next_page = "pages/2_idea_Input.py"
+    log_function_return(logger, "restore_session", next_page)
+    return next_page
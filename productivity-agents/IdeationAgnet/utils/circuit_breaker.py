@@ -0,0 +1,195 @@
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+# Add parent directory to path for direct imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.model_utils import GenerationCancelled, GenerationFailure, is_generation_error
+from utils.logging_utils import get_logger, log_function_call, log_function_return
+from utils import metrics
+
+# Set up logger for this module
+logger = get_logger(__name__)
+
+# A breaker opens when at least BREAKER_MIN_CALLS of its last BREAKER_WINDOW calls were made
+# and BREAKER_ERROR_RATE of them failed or were slow, or after BREAKER_CONSECUTIVE_FAILURES
+# failures in a row. While open, calls fail immediately; after BREAKER_OPEN_SECONDS a single
+# probe call is let through (half-open) and its outcome closes or re-opens the breaker.
+BREAKER_WINDOW = 10
+BREAKER_MIN_CALLS = 4
+BREAKER_ERROR_RATE = float(os.environ.get("IDEATION_BREAKER_ERROR_RATE", "0.5"))
+BREAKER_CONSECUTIVE_FAILURES = 3
+BREAKER_OPEN_SECONDS = float(os.environ.get("IDEATION_BREAKER_OPEN_SECONDS", "30"))
+# Calls slower than this count as failures; plans are long by nature
+SLOW_CALL_SECONDS = {"brainstorm": 60, "vision": 90, "summary": 60, "plan": 300}
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Tracks recent outcomes of one backend/model and decides whether to call it at all"""
+
+    def __init__(self, name):
+        self.name = name
+        self.state = CLOSED
+        self.opened_at = None
+        self.outcomes = deque(maxlen=BREAKER_WINDOW)
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """Return True if a call may be made now; claims the probe slot when half-open"""
+        with self._lock:
+            if self.state == OPEN and time.time() - self.opened_at >= BREAKER_OPEN_SECONDS:
+                self.state = HALF_OPEN
+                logger.info(f"Circuit for {self.name} is half-open; probing")
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self, seconds, slow_seconds=None):
+        """Record a finished call; a slow call counts as a failure"""
+        if slow_seconds is not None and seconds > slow_seconds:
+            self.record_failure(f"slow call ({seconds:.1f}s)")
+            return
+        with self._lock:
+            if self.state != CLOSED:
+                # Recovered: judge the backend on calls made from now on
+                logger.info(f"Circuit for {self.name} closed again")
+                metrics.increment(f"breaker.{self.name}.closed")
+                self.outcomes.clear()
+            self.outcomes.append(True)
+            self.consecutive_failures = 0
+            self.probe_in_flight = False
+            self.state = CLOSED
+
+    def record_failure(self, error=None):
+        """Record a failed call and open the breaker if the failure rate is too high"""
+        with self._lock:
+            self.outcomes.append(False)
+            self.consecutive_failures += 1
+            self.probe_in_flight = False
+            self.last_error = error
+            failures = self.outcomes.count(False)
+            too_many = (len(self.outcomes) >= BREAKER_MIN_CALLS
+                        and failures / len(self.outcomes) >= BREAKER_ERROR_RATE)
+            if self.state == HALF_OPEN or too_many or self.consecutive_failures >= BREAKER_CONSECUTIVE_FAILURES:
+                if self.state != OPEN:
+                    logger.warning(f"Circuit for {self.name} opened: {error}")
+                    metrics.increment(f"breaker.{self.name}.opened")
+                self.state = OPEN
+                self.opened_at = time.time()
+
+    def release(self):
+        """Give back a probe slot without recording an outcome (e.g. a cancelled call)"""
+        with self._lock:
+            self.probe_in_flight = False
+
+    def status(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "recent_calls": len(self.outcomes),
+                "recent_failures": self.outcomes.count(False),
+                "last_error": self.last_error
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def route_key(route):
+    """Breaker name of a route: one breaker per backend and model"""
+    return f"{route['model_type']}:{route['model']}"
+
+
+def get_breaker(route):
+    """Return the process-wide breaker of a route, creating it on first use"""
+    key = route_key(route)
+    with _breakers_lock:
+        if key not in _breakers:
+            _breakers[key] = CircuitBreaker(key)
+        return _breakers[key]
+
+
+def breaker_statuses():
+    """Return the status of every breaker created so far, keyed by route"""
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {key: breaker.status() for key, breaker in sorted(breakers.items())}
+
+
+def call_with_breaker(route, generate, stage="brainstorm"):
+    """
+    Call a backend through its circuit breaker
+
+    Args:
+        route (dict): Route (model_type, model) the call goes to
+        generate (callable): Makes the call and returns text or a GenerationFailure
+        stage (str): Pipeline stage, which decides what counts as a slow call
+
+    Returns:
+        str: The generated text, or a GenerationFailure (immediately if the breaker is open)
+    """
+    breaker = get_breaker(route)
+    if not breaker.allow_request():
+        metrics.increment(f"breaker.{breaker.name}.rejected")
+        return GenerationFailure(f"Error: {breaker.name} is unavailable (circuit open after repeated failures)")
+
+    start_time = time.time()
+    try:
+        text = generate()
+    except GenerationCancelled:
+        breaker.release()
+        raise
+    except Exception as e:
+        breaker.record_failure(str(e))
+        raise
+    if is_generation_error(text):
+        breaker.record_failure(text)
+    else:
+        breaker.record_success(time.time() - start_time, SLOW_CALL_SECONDS.get(stage))
+    return text
+
+
+def generate_with_failover(chain, generate, stage="brainstorm"):
+    """
+    Try each route of a failover chain in order until one succeeds
+
+    Routes whose breaker is open are skipped without a request.
+
+    Args:
+        chain (list): Routes in order of preference
+        generate (callable): generate(route) makes the call and returns text or a GenerationFailure
+        stage (str): Pipeline stage, used for slow-call thresholds and metric names
+
+    Returns:
+        tuple: (text, route that produced it); if every route failed, an error listing each failure and None
+    """
+    log_function_call(logger, "generate_with_failover", args=[stage], kwargs={"chain": [route_key(r) for r in chain]})
+    errors = []
+    for position, route in enumerate(chain):
+        text = call_with_breaker(route, lambda: generate(route), stage)
+        if not is_generation_error(text):
+            if position:
+                metrics.increment(f"failover.{stage}.used")
+                logger.info(f"{stage} served by fallback {route_key(route)} after: {errors[-1]}")
+            log_function_return(logger, "generate_with_failover", route_key(route))
+            return text, route
+        errors.append(f"{route_key(route)}: {text}")
+        logger.warning(f"{stage} call to {route_key(route)} failed: {text}")
+
+    metrics.increment(f"failover.{stage}.exhausted")
+    error = GenerationFailure("Error: no backend could serve this request (" + "; ".join(errors) + ")")
+    log_function_return(logger, "generate_with_failover", error)
+    return error, None
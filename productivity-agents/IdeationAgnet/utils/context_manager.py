@@ -0,0 +1,249 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+# Add parent directory to path for direct imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.model_utils import generate_with_ollama, generate_with_openai, is_generation_error, OUTPUT_TOKEN_BUDGETS
+from utils.ollama_options import get_ollama_options
+from utils.circuit_breaker import call_with_breaker
+from utils.prompt_templates import build_summary_prompt, format_transcript, to_messages
+from utils.logging_utils import get_logger, log_function_call, log_function_return
+from utils import metrics
+
+# Set up logger for this module
+logger = get_logger(__name__)
+
+# Prompt token budget per stage for cloud models. Local budgets follow each stage's
+# Ollama context window instead (see prompt_budget).
+PROMPT_BUDGETS = {
+    "cloud": {"brainstorm": 6000, "plan": 8000}
+}
+# Share of an Ollama context window kept free, since local token counts are estimates
+LOCAL_CONTEXT_MARGIN = 0.1
+# Smallest local prompt budget, whatever the stage options say
+MIN_PROMPT_BUDGET = 512
+# Most recent brainstorming messages (question/answer pairs) always kept verbatim
+KEEP_RECENT_TURNS = 4
+# Most recent feedback entries always kept verbatim
+KEEP_RECENT_FEEDBACK = 2
+# Tokens reserved for a running summary when fitting recent turns into the budget
+SUMMARY_TOKENS = 300
+# Rough characters per token when no tokenizer is available for a backend
+CHARS_PER_TOKEN = 3.5
+# Running summaries kept in memory, keyed by the exact content they summarise
+SUMMARY_CACHE_SIZE = 256
+
+_summary_cache = OrderedDict()
+_summary_lock = threading.Lock()
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model):
+    """Return a tiktoken encoding for an OpenAI model, or None if tiktoken is not installed"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text, model_type, model=None):
+    """
+    Count the tokens of a text for a backend
+
+    Cloud models use tiktoken when it is installed; otherwise (and for Ollama, whose
+    tokenizer depends on the model) a conservative characters-per-token estimate is used.
+    """
+    if not text:
+        return 0
+    if model_type == "cloud" and model:
+        encoding = _get_encoding(model)
+        if encoding is not None:
+            return len(encoding.encode(text))
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def _cache_key(kind, items):
+    payload = json.dumps({"kind": kind, "items": items}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cache_get(key):
+    with _summary_lock:
+        summary = _summary_cache.get(key)
+        if summary is not None:
+            _summary_cache.move_to_end(key)
+        return summary
+
+
+def _cache_put(key, summary):
+    with _summary_lock:
+        _summary_cache[key] = summary
+        _summary_cache.move_to_end(key)
+        while len(_summary_cache) > SUMMARY_CACHE_SIZE:
+            _summary_cache.popitem(last=False)
+
+
+def running_summary(kind, items, model_type, selected_model, api_key):
+    """
+    Return a summary of items, extending the longest cached summary of a prefix of them
+
+    Older turns only ever grow at the end, so each fold normally costs one short
+    call covering just the newly folded items.
+
+    Args:
+        kind (str): "conversation" or "feedback"
+        items (list): Messages or feedback entries to summarise
+        model_type (str): "local" or "cloud"
+        selected_model (str): Model used for summarising
+        api_key (str): API key for cloud models
+
+    Returns:
+        str: Summary text, or None if summarising failed
+    """
+    if not items:
+        return None
+    key = _cache_key(kind, items)
+    cached = _cache_get(key)
+    if cached is not None:
+        metrics.increment("context.summary_cache_hits")
+        return cached
+
+    # Find the longest already-summarised prefix
+    previous_summary, start = None, 0
+    for length in range(len(items) - 1, 0, -1):
+        previous_summary = _cache_get(_cache_key(kind, items[:length]))
+        if previous_summary is not None:
+            start = length
+            break
+
+    log_function_call(logger, "running_summary", args=[kind], kwargs={"folded": len(items), "new": len(items) - start})
+    system_prompt, user_prompt = build_summary_prompt(kind, previous_summary, items[start:])
+    if model_type == "local":
+        generate = lambda: generate_with_ollama(selected_model, user_prompt, system_prompt=system_prompt,
+                                                options=get_ollama_options(selected_model, "summary"))
+    else:
+        generate = lambda: generate_with_openai(selected_model, to_messages(system_prompt, user_prompt), api_key,
+                                                max_tokens=OUTPUT_TOKEN_BUDGETS["summary"])
+    # A backend with an open circuit fails fast and the caller falls back to a placeholder summary
+    summary = call_with_breaker({"model_type": model_type, "model": selected_model}, generate, "summary")
+    metrics.increment("context.summary_calls")
+
+    if is_generation_error(summary):
+        logger.warning(f"Could not summarise older {kind}: {summary}")
+        log_function_return(logger, "running_summary", None)
+        return None
+    summary = summary.strip()
+    _cache_put(key, summary)
+    log_function_return(logger, "running_summary", f"<{len(summary)} chars>")
+    return summary
+
+
+def _fallback_summary(kind, items):
+    """Placeholder used when folded items could not be summarised"""
+    label = "messages" if kind == "conversation" else "feedback entries"
+    return f"({len(items)} earlier {label} omitted to fit the context window)"
+
+
+def prompt_budget(stage, model_type, selected_model):
+    """
+    Return the prompt token budget for a stage
+
+    For Ollama models this is what the stage's context window (num_ctx, including any
+    override from the Configuration page) leaves for the prompt once the answer
+    (num_predict) and a safety margin are set aside.
+    """
+    if model_type != "local":
+        return PROMPT_BUDGETS[model_type][stage]
+    options = get_ollama_options(selected_model, stage)
+    budget = int(options["num_ctx"] * (1 - LOCAL_CONTEXT_MARGIN)) - options["num_predict"]
+    return max(MIN_PROMPT_BUDGET, budget)
+
+
+def fit_context(stage, model_type, selected_model, api_key, fixed_text, brainstorm_context,
+                feedback_history=None, budget=None):
+    """
+    Fit the brainstorming transcript and feedback into a stage's prompt budget
+
+    Everything is passed through unchanged while it fits. Otherwise the most recent
+    turns and feedback stay verbatim and older ones are folded into running summaries.
+    Recent turns are dropped oldest-first if even that does not fit.
+
+    Args:
+        stage (str): "brainstorm" or "plan"
+        model_type (str): "local" or "cloud"
+        selected_model (str): Model the prompt is for (also used for summarising)
+        api_key (str): API key for cloud models
+        fixed_text (str): Parts of the prompt that are always sent (system prompt, idea, facts)
+        brainstorm_context (list): Full brainstorming transcript
+        feedback_history (list, optional): All feedback given on earlier plans
+        budget (int, optional): Prompt token budget; defaults to prompt_budget()
+
+    Returns:
+        dict: recent_context (list), context_summary (str or None),
+        recent_feedback (list), feedback_summary (str or None), prompt_tokens (int)
+    """
+    budget = budget or prompt_budget(stage, model_type, selected_model)
+    feedback_history = list(feedback_history or [])
+    tokens = lambda text: count_tokens(text, model_type, selected_model)
+
+    fixed_tokens = tokens(fixed_text)
+    feedback_text = "\n".join(feedback_history)
+    total = fixed_tokens + tokens(format_transcript(brainstorm_context)) + tokens(feedback_text)
+    result = {
+        "recent_context": list(brainstorm_context),
+        "context_summary": None,
+        "recent_feedback": feedback_history,
+        "feedback_summary": None,
+        "prompt_tokens": total
+    }
+    metrics.observe(f"context.{stage}.full_prompt_tokens", total)
+    if total <= budget:
+        metrics.observe(f"context.{stage}.prompt_tokens", total)
+        return result
+
+    logger.info(f"{stage} prompt needs ~{total} tokens (budget {budget}); folding older context")
+
+    # Fold old feedback first: it is the least relevant part of a regeneration
+    if len(feedback_history) > KEEP_RECENT_FEEDBACK:
+        folded_feedback = feedback_history[:-KEEP_RECENT_FEEDBACK]
+        result["recent_feedback"] = feedback_history[-KEEP_RECENT_FEEDBACK:]
+        result["feedback_summary"] = (
+            running_summary("feedback", folded_feedback, model_type, selected_model, api_key)
+            or _fallback_summary("feedback", folded_feedback)
+        )
+    used = fixed_tokens + tokens("\n".join(result["recent_feedback"])) + tokens(result["feedback_summary"])
+
+    # Keep as many recent turns as fit next to a summary of the rest
+    available = budget - used - SUMMARY_TOKENS
+    keep = 0
+    for msg in reversed(brainstorm_context[-KEEP_RECENT_TURNS:]):
+        cost = tokens(msg["content"])
+        if cost > available:
+            break
+        available -= cost
+        keep += 1
+    folded = brainstorm_context[:len(brainstorm_context) - keep]
+    result["recent_context"] = brainstorm_context[len(brainstorm_context) - keep:]
+    if folded:
+        result["context_summary"] = (
+            running_summary("conversation", folded, model_type, selected_model, api_key)
+            or _fallback_summary("conversation", folded)
+        )
+
+    result["prompt_tokens"] = (used + tokens(format_transcript(result["recent_context"]))
+                               + tokens(result["context_summary"]))
+    if result["prompt_tokens"] > budget:
+        logger.warning(f"{stage} prompt still needs ~{result['prompt_tokens']} tokens after folding (budget {budget})")
+    metrics.observe(f"context.{stage}.prompt_tokens", result["prompt_tokens"])
+    logger.info(f"Folded {len(folded)} messages and {len(feedback_history) - len(result['recent_feedback'])} "
+                f"feedback entries; prompt now ~{result['prompt_tokens']} tokens")
+    return result
@@ -0,0 +1,132 @@
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+# Add parent directory to path for direct imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.logging_utils import get_logger, log_error
+from utils import metrics
+
+# Set up logger for this module
+logger = get_logger(__name__)
+
+# CPU-bound work (image decoding and resizing, PDF rasterisation, PDF export) runs in a
+# process pool shared by all sessions, so it neither blocks a page run nor competes with
+# other sessions for the GIL. IDEATION_CPU_WORKERS=0 runs tasks inline instead.
+CPU_WORKERS = int(os.environ.get("IDEATION_CPU_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) - 1)))))
+
+_pool = None
+_pool_lock = threading.Lock()
+# Key -> future of a task still running, so identical requests share one computation
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def _get_pool():
+    """Start the process pool on first use; page imports stay cheap"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+            from utils.cpu_worker import get_worker_context
+            # Forking a process with Streamlit's server threads running is unsafe, so workers are
+            # spawned, without re-running the page script that is __main__ (see utils/cpu_worker.py)
+            _pool = ProcessPoolExecutor(max_workers=CPU_WORKERS, mp_context=get_worker_context())
+            logger.info(f"Started CPU process pool with {CPU_WORKERS} workers")
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _run_inline(fn, args, kwargs):
+    future = Future()
+    try:
+        future.set_result(fn(*args, **kwargs))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def submit_cpu_task(fn, *args, key=None, **kwargs):
+    """
+    Run a CPU-bound function in the shared process pool
+
+    fn must be a module-level function. Pass file paths rather than large data: arguments
+    and results are pickled between processes, so tasks should read their input from
+    disk and write their output there.
+
+    Args:
+        fn (callable): Function to run in a worker process
+        *args: Positional arguments for fn
+        key (str, optional): Identifies the result (e.g. the output path); while a task
+            with the same key is running its future is returned instead of starting another
+        **kwargs: Keyword arguments for fn
+
+    Returns:
+        concurrent.futures.Future: Resolves to fn's return value
+    """
+    name = fn.__name__
+    if key is not None:
+        with _pending_lock:
+            if key in _pending:
+                metrics.increment(f"cpu_tasks.{name}.coalesced")
+                return _pending[key]
+
+    metrics.increment(f"cpu_tasks.{name}")
+    start_time = time.time()
+    if CPU_WORKERS <= 0:
+        future = _run_inline(fn, args, kwargs)
+    else:
+        from concurrent.futures.process import BrokenProcessPool
+        try:
+            future = _get_pool().submit(fn, *args, **kwargs)
+        except BrokenProcessPool as e:
+            # A worker died (e.g. killed for memory); start a fresh pool for this and later tasks
+            log_error(logger, e, "CPU process pool is broken; restarting it")
+            _reset_pool()
+            future = _get_pool().submit(fn, *args, **kwargs)
+
+    def finished(done_future):
+        metrics.observe(f"cpu_task_seconds.{name}", time.time() - start_time)
+        if key is not None:
+            with _pending_lock:
+                if _pending.get(key) is done_future:
+                    del _pending[key]
+
+    if key is not None:
+        with _pending_lock:
+            _pending[key] = future
+    # Runs immediately if the task has already finished, which also releases its key
+    future.add_done_callback(finished)
+    return future
+
+
+def run_cpu_task(fn, *args, key=None, timeout=None, **kwargs):
+    """
+    Run a CPU-bound function in the process pool and wait for its result
+
+    For callers that need the result straight away, such as background jobs; the
+    waiting thread releases the GIL while the work runs in another process. If the
+    pool breaks while the task runs, the pool is restarted and the task runs inline.
+    """
+    from concurrent.futures.process import BrokenProcessPool
+    try:
+        return submit_cpu_task(fn, *args, key=key, **kwargs).result(timeout=timeout)
+    except BrokenProcessPool as e:
+        log_error(logger, e, f"CPU process pool broke while running {fn.__name__}; running it inline")
+        metrics.increment(f"cpu_tasks.{fn.__name__}.inline_fallbacks")
+        _reset_pool()
+        return fn(*args, **kwargs)
+
+
+def shutdown_cpu_pool():
+    """Stop the worker processes (used by benchmarks and at exit)"""
+    _reset_pool()
@@ -0,0 +1,52 @@
+import multiprocessing
+import sys
+import types
+from multiprocessing import spawn
+
+if sys.platform == "win32":
+    from multiprocessing import popen_spawn_win32 as _popen_module
+else:
+    from multiprocessing import popen_spawn_posix as _popen_module
+
+# Spawn context for the CPU process pool whose workers start without the parent's __main__.
+# A spawned process normally re-runs the parent's __main__ before doing any work; under
+# Streamlit that is whichever page script ran last, so every worker would execute a page
+# without a session, crash and break the pool. Workers started through this context only
+# get the parent's sys.path and working directory. Kept in its own module because each
+# worker imports it to unpickle its Process object.
+
+
+def _worker_preparation_data(name):
+    """Preparation data for a worker process, without the instructions to re-run __main__"""
+    data = spawn.get_preparation_data(name)
+    data.pop("init_main_from_name", None)
+    data.pop("init_main_from_path", None)
+    return data
+
+
+# Popen._launch of the standard library, resolving `spawn` to a copy of the module that
+# leaves __main__ out; the rest of the launch (pipes, command line, pickling) is unchanged
+_worker_spawn = types.SimpleNamespace(**vars(spawn))
+_worker_spawn.get_preparation_data = _worker_preparation_data
+_launch = _popen_module.Popen._launch
+_worker_launch = types.FunctionType(_launch.__code__, dict(vars(_popen_module), spawn=_worker_spawn),
+                                    _launch.__name__, _launch.__defaults__, _launch.__closure__)
+
+
+class WorkerPopen(_popen_module.Popen):
+    _launch = _worker_launch
+
+
+class WorkerProcess(multiprocessing.get_context("spawn").Process):
+    @staticmethod
+    def _Popen(process_obj):
+        return WorkerPopen(process_obj)
+
+
+class WorkerContext(type(multiprocessing.get_context("spawn"))):
+    Process = WorkerProcess
+
+
+def get_worker_context():
+    """Return the multiprocessing context used to start CPU pool workers"""
+    return WorkerContext()
@@ -0,0 +1,238 @@
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+import zipfile
+from datetime import datetime
+
+# Add parent directory to path for direct imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.logging_utils import get_logger, log_error, log_function_call, log_function_return
+from utils.plan_store import PLANS_DIR, detect_image_extension, iter_plans
+from utils.blob_store import get_blob_path
+from utils.cpu_pool import submit_cpu_task
+
+# Set up logger for this module
+logger = get_logger(__name__)
+
+# Size of the pieces sketches are copied in, and of the manifest held in RAM before spilling to disk
+CHUNK_SIZE = 64 * 1024
+EXPORTS_DIR = "exports"
+# Export archives are only kept long enough to be downloaded
+EXPORT_TTL_SECONDS = 60 * 60
+
+
+class _ZipSink(io.RawIOBase):
+    """Write-only, unseekable buffer that the zip writer fills and the generator drains"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _plan_stem(plan_data):
+    """Return the archive name stem for a plan based on its filename"""
+    return os.path.splitext(plan_data.get("filename", "plan"))[0]
+
+
+def plan_to_markdown(plan_data):
+    """
+    Render a saved plan as a standalone Markdown document with a metadata header
+    """
+    return (
+        f"# Implementation Plan\n\n"
+        f"**Idea:** {plan_data.get('idea_description', 'No description available')}\n\n"
+        f"**Plan Type:** {plan_data.get('plan_type', 'Not specified')}\n\n"
+        f"**Created:** {plan_data.get('timestamp', 'Unknown')}\n\n"
+        f"**Iteration:** {plan_data.get('iteration', 1)}\n\n"
+        f"---\n\n"
+        f"{plan_data.get('generated_plan', '')}\n"
+    )
+
+
+def plan_to_pdf(markdown_text):
+    """
+    Render Markdown text to PDF bytes using fpdf
+
+    Returns None when fpdf is not installed so callers can skip PDF output.
+    """
+    try:
+        from fpdf import FPDF
+    except ImportError:
+        logger.warning("fpdf is not installed; skipping PDF export")
+        return None
+
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+    for line in markdown_text.splitlines():
+        # fpdf's core fonts only cover latin-1
+        text = line.encode("latin-1", "replace").decode("latin-1")
+        if text.startswith("#"):
+            pdf.set_font("Arial", "B", 14)
+            text = text.lstrip("#").strip()
+        else:
+            pdf.set_font("Arial", size=10)
+        pdf.multi_cell(0, 6, text)
+    return pdf.output(dest="S").encode("latin-1")
+
+
+def stream_plans_zip(plans_dir=PLANS_DIR, start_date=None, end_date=None, plan_types=None,
+                     include_markdown=True, include_pdf=False, include_sketches=False):
+    """
+    Stream saved plans as a ZIP archive, yielding the archive in byte chunks
+
+    Plans are read from the plan store one at a time and each entry is flushed
+    as soon as it is written, so memory use does not grow with the number of
+    plans. The JSONL manifest is spooled to a temporary file and appended last.
+
+    Args:
+        plans_dir (str): Directory where plans are stored
+        start_date (date, optional): Earliest creation date to include (inclusive)
+        end_date (date, optional): Latest creation date to include (inclusive)
+        plan_types (list, optional): Plan types to include; None includes all, an empty
+            list none and None in the list matches plans saved without a type
+        include_markdown (bool): Add each plan as a Markdown file
+        include_pdf (bool): Add each plan as a PDF file (requires fpdf)
+        include_sketches (bool): Add the source sketch saved with each plan
+
+    Yields:
+        bytes: Consecutive pieces of the ZIP archive
+    """
+    log_function_call(logger, "stream_plans_zip", kwargs={
+        "start_date": start_date, "end_date": end_date, "plan_types": plan_types,
+        "include_pdf": include_pdf, "include_sketches": include_sketches
+    })
+    sink = _ZipSink()
+    exported = 0
+
+    with tempfile.SpooledTemporaryFile(max_size=CHUNK_SIZE, mode="w+b") as manifest:
+        with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for plan_data in iter_plans(plans_dir, start_date, end_date, plan_types):
+                stem = _plan_stem(plan_data)
+                entry = {
+                    "filename": plan_data.get("filename"),
+                    "timestamp": plan_data.get("timestamp"),
+                    "plan_type": plan_data.get("plan_type"),
+                    "idea_description": plan_data.get("idea_description"),
+                    "iteration": plan_data.get("iteration", 1),
+                    "files": []
+                }
+
+                markdown_text = plan_to_markdown(plan_data)
+                if include_markdown:
+                    archive.writestr(f"plans/{stem}.md", markdown_text)
+                    entry["files"].append(f"plans/{stem}.md")
+                    yield sink.drain()
+
+                if include_pdf:
+                    pdf_bytes = plan_to_pdf(markdown_text)
+                    if pdf_bytes is not None:
+                        archive.writestr(f"plans/{stem}.pdf", pdf_bytes)
+                        entry["files"].append(f"plans/{stem}.pdf")
+                        yield sink.drain()
+
+                if include_sketches and plan_data.get("image_hash"):
+                    try:
+                        with open(get_blob_path(plan_data["image_hash"]), "rb") as src:
+                            sketch_name = f"sketches/{stem}.{detect_image_extension(src.read(8))}"
+                            src.seek(0)
+                            with archive.open(sketch_name, "w") as dst:
+                                for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                                    dst.write(chunk)
+                                    yield sink.drain()
+                        entry["files"].append(sketch_name)
+                    except IOError as e:
+                        log_error(logger, e, f"Missing sketch for plan {plan_data.get('filename')}")
+                    yield sink.drain()
+
+                manifest.write((json.dumps(entry) + "\n").encode("utf-8"))
+                exported += 1
+
+            manifest.seek(0)
+            with archive.open("manifest.jsonl", "w") as dst:
+                for chunk in iter(lambda: manifest.read(CHUNK_SIZE), b""):
+                    dst.write(chunk)
+                    yield sink.drain()
+
+        # Closing the archive writes the central directory
+        yield sink.drain()
+
+    logger.info(f"Streamed ZIP export of {exported} plans")
+    log_function_return(logger, "stream_plans_zip", exported)
+
+
+def prune_exports(ttl_seconds=EXPORT_TTL_SECONDS):
+    """Delete export archives older than ttl_seconds from EXPORTS_DIR"""
+    if not os.path.isdir(EXPORTS_DIR):
+        return
+    now = time.time()
+    removed = 0
+    for filename in os.listdir(EXPORTS_DIR):
+        path = os.path.join(EXPORTS_DIR, filename)
+        try:
+            if now - os.path.getmtime(path) > ttl_seconds:
+                os.remove(path)
+                removed += 1
+        except OSError as e:
+            log_error(logger, e, f"Could not remove old export {path}")
+    if removed:
+        logger.info(f"Removed {removed} expired plan exports")
+
+
+def _new_export_path():
+    # Each new export clears out the ones old enough to have been downloaded
+    prune_exports()
+    os.makedirs(EXPORTS_DIR, exist_ok=True)
+    # The random suffix keeps exports started in the same second (two sessions, a double click) apart
+    name = f"plans_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.zip"
+    return os.path.join(EXPORTS_DIR, name)
+
+
+def write_plans_zip(output_path=None, **filters):
+    """
+    Write a streamed plan export to disk and return its path
+
+    Accepts the same keyword arguments as stream_plans_zip.
+    """
+    if output_path is None:
+        output_path = _new_export_path()
+
+    with open(output_path, "wb") as f:
+        for chunk in stream_plans_zip(**filters):
+            if chunk:
+                f.write(chunk)
+
+    logger.info(f"Plan export written to {output_path}")
+    return output_path
+
+
+def submit_plans_export(**filters):
+    """
+    Start writing a plan export in the CPU process pool and return at once
+
+    PDF rendering and compression run in a worker process, so the page that asked
+    for the export keeps responding; it polls the future and offers the file when done.
+    Accepts the same keyword arguments as stream_plans_zip.
+
+    Returns:
+        concurrent.futures.Future: Resolves to the path of the written ZIP archive
+    """
+    log_function_call(logger, "submit_plans_export", kwargs=filters)
+    output_path = _new_export_path()
+    return submit_cpu_task(write_plans_zip, output_path=output_path, key=output_path, **filters)
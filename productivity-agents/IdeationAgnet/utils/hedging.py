@@ -0,0 +1,153 @@
+import os
+import queue
+import sys
+import threading
+import time
+
+# Add parent directory to path for direct imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.model_utils import GenerationCancelled, GenerationFailure, is_generation_error
+from utils.logging_utils import get_logger, log_function_call, log_function_return
+from utils import metrics
+
+# Set up logger for this module
+logger = get_logger(__name__)
+
+# A duplicate request is sent to the backup backend when the primary has not produced a
+# first token within this percentile of its recent time to first token
+HEDGE_PERCENTILE = float(os.environ.get("IDEATION_HEDGE_PERCENTILE", "90"))
+# Delay used until enough samples have been seen for a backend
+HEDGE_DEFAULT_DELAY = float(os.environ.get("IDEATION_HEDGE_DELAY", "3.0"))
+HEDGE_MIN_SAMPLES = 5
+# Never hedge sooner than this, so a fast primary is not doubled up on every small jitter
+HEDGE_MIN_DELAY = 0.5
+
+
+def _ttft_metric(route):
+    return f"hedge.ttft.{route['model_type']}.{route['model']}"
+
+
+def hedge_delay(route):
+    """Seconds to wait for the primary's first token before sending the duplicate request"""
+    samples = metrics.get_samples(_ttft_metric(route))
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY
+    return max(HEDGE_MIN_DELAY, metrics.percentile(_ttft_metric(route), HEDGE_PERCENTILE))
+
+
+def hedged_generate(primary, secondary, generate, stage="brainstorm"):
+    """
+    Run a generation on the primary route and hedge it with the secondary one if it is slow
+
+    generate(route, stream_callback) must stream its output through stream_callback and
+    return the full text (or a GenerationFailure). The first successful response wins;
+    the other request is cancelled by raising GenerationCancelled from its stream callback,
+    which closes its connection (Ollama stops generating when the client disconnects).
+    If the primary fails before the hedge delay, the secondary is started straight away.
+
+    Args:
+        primary (dict): Route (model_type, model) tried first
+        secondary (dict): Backup route
+        generate (callable): Runs one request on a route, see above
+        stage (str): Pipeline stage, used in metric names
+
+    Returns:
+        tuple: (text, winning route); text is the primary's error if both requests failed
+    """
+    log_function_call(logger, "hedged_generate", args=[primary["model"], secondary["model"]], kwargs={"stage": stage})
+    metrics.increment(f"hedge.{stage}.calls")
+    results = queue.Queue()
+    first_token = threading.Event()
+    cancel = {"primary": threading.Event(), "secondary": threading.Event()}
+    routes = {"primary": primary, "secondary": secondary}
+
+    def attempt(name):
+        start = time.time()
+        seen_first = []
+
+        def stream_callback(piece):
+            if cancel[name].is_set():
+                raise GenerationCancelled(f"{name} request lost the race")
+            if not seen_first:
+                seen_first.append(True)
+                metrics.observe(_ttft_metric(routes[name]), time.time() - start)
+                if name == "primary":
+                    first_token.set()
+
+        try:
+            text = generate(routes[name], stream_callback)
+        except Exception as e:
+            text = GenerationFailure(f"Error: {str(e)}")
+        if not seen_first and cancel[name].is_set():
+            # A cancelled request still tells us its first token took at least this long
+            metrics.observe(_ttft_metric(routes[name]), time.time() - start)
+        results.put((name, text))
+
+    def launch(name):
+        threading.Thread(target=attempt, args=(name,), daemon=True, name=f"hedge-{stage}-{name}").start()
+
+    delay = hedge_delay(primary)
+    launch("primary")
+    pending = 1
+    hedged = False
+    winner, text, errors = None, None, {}
+    # Wait for the first token, an early primary result, or the hedge delay
+    deadline = time.time() + delay
+    while not first_token.is_set() and results.empty() and time.time() < deadline:
+        first_token.wait(min(0.05, max(0.0, deadline - time.time())))
+    if not first_token.is_set() and not results.empty():
+        name, result = results.get()
+        pending -= 1
+        if is_generation_error(result):
+            errors[name] = result
+        else:
+            winner, text = name, result
+    if not first_token.is_set() and winner is None:
+        hedged = True
+        metrics.increment(f"hedge.{stage}.hedged")
+        logger.info(f"No first token from {primary['model']} after {delay:.2f}s; hedging with {secondary['model']}")
+        launch("secondary")
+        pending += 1
+
+    while pending and winner is None:
+        name, result = results.get()
+        pending -= 1
+        if is_generation_error(result):
+            errors[name] = result
+            continue
+        winner, text = name, result
+    for name, event in cancel.items():
+        if name != winner:
+            event.set()
+    if winner is not None and pending:
+        metrics.increment(f"hedge.{stage}.cancelled")
+
+    if winner is None:
+        metrics.increment(f"hedge.{stage}.failures")
+        text = errors.get("primary") or errors.get("secondary")
+        log_function_return(logger, "hedged_generate", text)
+        return text, primary
+    if hedged:
+        metrics.increment(f"hedge.{stage}.wins.{winner}")
+    log_function_return(logger, "hedged_generate", {"winner": winner, "hedged": hedged})
+    return text, routes[winner]
+
+
+def hedge_stats(stage="brainstorm"):
+    """
+    Return hedging statistics for a stage since the app started
+
+    Returns:
+        dict: calls, hedged, hedge_rate, primary_wins, secondary_wins, cancelled, failures
+    """
+    calls = metrics.get_counter(f"hedge.{stage}.calls")
+    hedged = metrics.get_counter(f"hedge.{stage}.hedged")
+    return {
+        "calls": calls,
+        "hedged": hedged,
+        "hedge_rate": hedged / calls if calls else 0.0,
+        "primary_wins": metrics.get_counter(f"hedge.{stage}.wins.primary"),
+        "secondary_wins": metrics.get_counter(f"hedge.{stage}.wins.secondary"),
+        "cancelled": metrics.get_counter(f"hedge.{stage}.cancelled"),
+        "failures": metrics.get_counter(f"hedge.{stage}.failures")
+    }
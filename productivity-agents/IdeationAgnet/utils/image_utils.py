@@ -0,0 +1,329 @@
+import functools
+import math
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import Future
+
+# Add parent directory to path for direct imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.logging_utils import get_logger, log_function_call, log_function_return
+from utils.blob_store import BLOB_DIR, file_base64, get_blob_path, get_derived_dir
+from utils.cpu_pool import submit_cpu_task
+
+# Set up logger for this module
+logger = get_logger(__name__)
+
+THUMBNAIL_QUALITY = 85
+# Thumbnails of bundled files (e.g. assets/) live outside the content-addressed area
+FILE_THUMBNAIL_DIR = os.path.join(BLOB_DIR, "files")
+# Number of (image, width) thumbnails kept decoded in process memory
+THUMBNAIL_CACHE_SIZE = 128
+# Only the first PDF_MAX_PAGES pages of an uploaded PDF are ever rasterised, at most at
+# PDF_DPI, and only when a thumbnail or a vision request needs them
+PDF_MAX_PAGES = int(os.environ.get("IDEATION_PDF_MAX_PAGES", "4"))
+PDF_DPI = int(os.environ.get("IDEATION_PDF_DPI", "110"))
+# Longest side of the image sent to vision models, so the payload is bounded whatever was uploaded
+VISION_MAX_SIDE = int(os.environ.get("IDEATION_VISION_MAX_SIDE", "1568"))
+VISION_QUALITY = 85
+
+
+def _to_rgb(image):
+    """Convert a decoded image to RGB, flattening transparency onto white"""
+    from PIL import Image
+
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        return background
+    return image.convert("RGB")
+
+
+def _save_jpeg(image, output_path, quality):
+    """Write a JPEG atomically, so concurrent sessions never read a half-written file"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(output_path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as tmp:
+        image.save(tmp, format="JPEG", quality=quality, optimize=True)
+    os.replace(tmp_path, output_path)
+
+
+def render_thumbnail(source_path, output_path, width):
+    """
+    Decode an image, scale it down to the given width and save it as JPEG
+
+    Images narrower than the target width are re-encoded at their own size.
+    """
+    from PIL import Image
+
+    with Image.open(source_path) as image:
+        # Let JPEG decoding downscale while decoding instead of materialising the full image
+        image.draft("RGB", (width, 1))
+        image = _to_rgb(image)
+        image.thumbnail((width, image.height))
+        _save_jpeg(image, output_path, THUMBNAIL_QUALITY)
+    return output_path
+
+
+def is_pdf(path):
+    """Whether a stored upload is a PDF (judged by its magic number, not its file name)"""
+    with open(path, "rb") as f:
+        return f.read(5) == b"%PDF-"
+
+
+def _import_fitz():
+    try:
+        import fitz
+    except ImportError:
+        raise RuntimeError("PDF uploads need PyMuPDF (pip install PyMuPDF)")
+    return fitz
+
+
+@functools.lru_cache(maxsize=THUMBNAIL_CACHE_SIZE)
+def pdf_page_count(image_hash):
+    """Number of pages of a stored PDF (only the page index is read)"""
+    fitz = _import_fitz()
+    with fitz.open(get_blob_path(image_hash)) as document:
+        return document.page_count
+
+
+def render_pdf_page(pdf_path, page_number, output_path, dpi=PDF_DPI, max_side=VISION_MAX_SIDE):
+    """
+    Rasterise one PDF page to PNG at no more than dpi and max_side pixels on its longest side
+
+    Only the requested page is decoded; the rest of the document is never loaded.
+    """
+    fitz = _import_fitz()
+    with fitz.open(pdf_path) as document:
+        page = document.load_page(page_number)
+        zoom = min(dpi / 72.0, max_side / max(page.rect.width, page.rect.height))
+        pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(output_path), suffix=".png")
+        os.close(fd)
+        pixmap.save(tmp_path)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def _completed(value):
+    """A future that has already resolved, for renders that exist on disk"""
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+def _submit_after(futures, start):
+    """
+    Return a future of the CPU task start() submits once all the given futures have finished
+
+    Lets a render that needs others first (a thumbnail of a PDF page, a vision image
+    composed from several) be handed out as one future without a thread waiting in
+    between. Fails with the first error among the futures it waited for.
+    """
+    if not futures:
+        return start()
+    result = Future()
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def relay(task_future):
+        try:
+            result.set_result(task_future.result())
+        except Exception as e:
+            result.set_exception(e)
+
+    def finished(_):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        try:
+            for future in futures:
+                future.result()
+            start().add_done_callback(relay)
+        except Exception as e:
+            result.set_exception(e)
+
+    for future in futures:
+        future.add_done_callback(finished)
+    return result
+
+
+def _submit_pdf_page(image_hash, page_number):
+    """Start rendering a PDF page in the CPU pool unless it exists; returns (path, future or None)"""
+    page_path = os.path.join(get_derived_dir(image_hash), f"page_{page_number + 1}_{PDF_DPI}dpi.png")
+    if os.path.exists(page_path):
+        return page_path, None
+    log_function_call(logger, "render_pdf_page", args=[image_hash[:12], page_number])
+    return page_path, submit_cpu_task(render_pdf_page, get_blob_path(image_hash), page_number, page_path, key=page_path)
+
+
+def compose_images(paths, output_path, max_side, quality=VISION_QUALITY):
+    """
+    Save one JPEG no larger than max_side on either side showing all the given images
+
+    A single image is only scaled down; several are laid out in a grid of equal cells
+    on a white background, in order, left to right and top to bottom.
+    """
+    from PIL import Image
+
+    columns = math.ceil(math.sqrt(len(paths)))
+    rows = math.ceil(len(paths) / columns)
+    cell = (max_side // columns, max_side // rows)
+    tiles = []
+    for path in paths:
+        with Image.open(path) as image:
+            image.draft("RGB", cell)
+            image = _to_rgb(image)
+            image.thumbnail(cell)
+            tiles.append(image)
+    if len(tiles) == 1:
+        _save_jpeg(tiles[0], output_path, quality)
+        return output_path
+
+    canvas = Image.new("RGB", (columns * cell[0], rows * cell[1]), (255, 255, 255))
+    for index, tile in enumerate(tiles):
+        left = (index % columns) * cell[0] + (cell[0] - tile.width) // 2
+        top = (index // columns) * cell[1] + (cell[1] - tile.height) // 2
+        canvas.paste(tile, (left, top))
+    _save_jpeg(canvas, output_path, quality)
+    return output_path
+
+
+def vision_page_count(image_hash):
+    """Number of pages shown to vision models: 1 for images, the first PDF_MAX_PAGES pages of a PDF"""
+    if not is_pdf(get_blob_path(image_hash)):
+        return 1
+    return min(PDF_MAX_PAGES, pdf_page_count(image_hash))
+
+
+def submit_vision_image(image_hash):
+    """
+    Start rendering the JPEG sent to vision models for an upload, unless it exists
+
+    Images are scaled down to VISION_MAX_SIDE. For PDFs the first PDF_MAX_PAGES pages
+    are rendered in parallel, one worker process each, and composed into a single image
+    of the same bounded size.
+
+    Args:
+        image_hash (str): Blob store hash of the upload
+
+    Returns:
+        concurrent.futures.Future: Resolves to the path of the JPEG on disk
+    """
+    vision_path = os.path.join(get_derived_dir(image_hash), f"vision_{VISION_MAX_SIDE}_{PDF_MAX_PAGES}.jpg")
+    if os.path.exists(vision_path):
+        return _completed(vision_path)
+    log_function_call(logger, "submit_vision_image", args=[image_hash[:12]])
+    if is_pdf(get_blob_path(image_hash)):
+        pages = [_submit_pdf_page(image_hash, page) for page in range(vision_page_count(image_hash))]
+    else:
+        pages = [(get_blob_path(image_hash), None)]
+    paths = [path for path, _ in pages]
+    return _submit_after([future for _, future in pages if future is not None],
+                         lambda: submit_cpu_task(compose_images, paths, vision_path, VISION_MAX_SIDE, key=vision_path))
+
+
+def get_vision_image_path(image_hash):
+    """Return the path of the vision image for an upload, waiting for it to be rendered (for jobs)"""
+    return submit_vision_image(image_hash).result()
+
+
+def get_vision_image_base64(image_hash):
+    """
+    Return the vision image of an upload base64-encoded, produced on demand for a request
+
+    Nothing is cached in memory: the encoded copy lives only as long as the caller needs it.
+    """
+    return file_base64(get_vision_image_path(image_hash))
+
+
+def prepare_upload_images(image_hash, thumbnail_widths=()):
+    """
+    Render everything later pages need from an upload: the vision image and thumbnails
+
+    Meant to run as a background job right after an upload, so the renders happen in the
+    CPU pool while the user carries on instead of when a page first needs them.
+
+    Returns:
+        dict: vision (path of the vision image) and thumbnails (width -> path)
+    """
+    log_function_call(logger, "prepare_upload_images", args=[image_hash[:12]], kwargs={"widths": list(thumbnail_widths)})
+    thumbnails = {width: submit_thumbnail(image_hash, width) for width in thumbnail_widths}
+    result = {
+        "vision": get_vision_image_path(image_hash),
+        "thumbnails": {width: future.result() for width, future in thumbnails.items()}
+    }
+    log_function_return(logger, "prepare_upload_images", result)
+    return result
+
+
+def submit_thumbnail(image_hash, width):
+    """
+    Start rendering a width-limited thumbnail of a stored image, unless it exists
+
+    Args:
+        image_hash (str): Blob store hash of the original image (or PDF, shown by its first page)
+        width (int): Maximum thumbnail width in pixels
+
+    Returns:
+        concurrent.futures.Future: Resolves to the path of the JPEG thumbnail on disk
+    """
+    thumb_path = os.path.join(get_derived_dir(image_hash), f"thumb_{width}.jpg")
+    if os.path.exists(thumb_path):
+        return _completed(thumb_path)
+    log_function_call(logger, "submit_thumbnail", args=[image_hash[:12], width])
+    source_path, pending = get_blob_path(image_hash), []
+    if is_pdf(source_path):
+        # Pages are rasterised lazily: the thumbnail needs the first one only
+        source_path, page_future = _submit_pdf_page(image_hash, 0)
+        if page_future is not None:
+            pending.append(page_future)
+    return _submit_after(pending, lambda: submit_cpu_task(render_thumbnail, source_path, thumb_path, width, key=thumb_path))
+
+
+def submit_file_thumbnail(path, width):
+    """
+    Start rendering a thumbnail of an image file on disk (e.g. in assets/), unless it exists
+
+    Thumbnails are named after the file's modification time, so a changed file is re-rendered.
+
+    Returns:
+        concurrent.futures.Future: Resolves to the path of the JPEG thumbnail on disk
+    """
+    name = f"{os.path.splitext(os.path.basename(path))[0]}_{int(os.path.getmtime(path))}_{width}.jpg"
+    thumb_path = os.path.join(FILE_THUMBNAIL_DIR, name)
+    if os.path.exists(thumb_path):
+        return _completed(thumb_path)
+    os.makedirs(FILE_THUMBNAIL_DIR, exist_ok=True)
+    return submit_cpu_task(render_thumbnail, os.path.abspath(path), thumb_path, width, key=thumb_path)
+
+
+@functools.lru_cache(maxsize=THUMBNAIL_CACHE_SIZE)
+def _read_thumbnail(thumb_path):
+    # Thumbnail paths name their content (blob hash or file mtime, and width), so cached bytes never go stale
+    with open(thumb_path, "rb") as f:
+        return f.read()
+
+
+def _poll(future):
+    if not future.done():
+        return None
+    return _read_thumbnail(future.result())
+
+
+def poll_thumbnail(image_hash, width):
+    """
+    Return JPEG thumbnail bytes for a stored image once rendered, or None while it renders
+
+    For pages: the render starts in the CPU pool on the first call and is never waited
+    for. Show a placeholder and rerun until bytes come back. Raises the render's error
+    if it failed.
+    """
+    return _poll(submit_thumbnail(image_hash, width))
+
+
+def poll_file_thumbnail(path, width):
+    """Return JPEG thumbnail bytes for an image file once rendered, or None while it renders (see poll_thumbnail)"""
+    return _poll(submit_file_thumbnail(path, width))
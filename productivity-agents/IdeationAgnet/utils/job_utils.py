@@ -0,0 +1,245 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Add parent directory to path for direct imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.model_utils import GenerationCancelled
+from utils.logging_utils import get_logger, log_error, log_function_call
+from utils import metrics
+
+# Set up logger for this module
+logger = get_logger(__name__)
+
+# LLM calls are network-bound, so a thread pool shared by all sessions is enough
+MAX_WORKERS = int(os.environ.get("IDEATION_JOB_WORKERS", "4"))
+# Finished jobs nobody collected are forgotten after this long (results are also checkpointed)
+JOB_TTL_SECONDS = 60 * 60
+# How often pages re-run to poll a running job
+POLL_INTERVAL_SECONDS = 1.0
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="ideation-job")
+_jobs = {}
+# Idempotency key -> id of the job currently producing (or holding) that result
+_jobs_by_key = {}
+_jobs_lock = threading.Lock()
+
+
+class Job:
+    """A generation running in the worker pool, polled by the page that started it"""
+
+    def __init__(self, kind, session_id=None, idempotency_key=None):
+        self.job_id = uuid.uuid4().hex
+        self.kind = kind
+        self.session_id = session_id
+        self.idempotency_key = idempotency_key
+        self.status = "pending"
+        self.message = "Waiting for a free worker..."
+        self.progress = 0.0
+        self.partial_output = ""
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancelled = False
+        self._lock = threading.Lock()
+
+    def report(self, message=None, progress=None):
+        """Update the human-readable status message and/or progress fraction (0-1)"""
+        with self._lock:
+            if message is not None:
+                self.message = message
+            if progress is not None:
+                self.progress = max(0.0, min(1.0, progress))
+
+    def append_output(self, text):
+        """Append streamed output; used as the stream_callback of generation functions"""
+        if self.cancelled:
+            # Stops the generation at its next piece and drops the backend connection
+            raise GenerationCancelled(f"job {self.job_id[:8]} was cancelled")
+        with self._lock:
+            self.partial_output += text
+
+    @property
+    def done(self):
+        return self.status in ("done", "error")
+
+
+def _run_job(job, fn, args, kwargs, on_complete):
+    if job.cancelled:
+        # Cancelled while waiting for a worker
+        job.status = "error"
+        job.error = "cancelled"
+        job.finished_at = time.time()
+        return
+    job.started_at = time.time()
+    job.status = "running"
+    # Time spent waiting for a free worker
+    metrics.observe(f"job_queue_seconds.{job.kind}", job.started_at - job.created_at)
+    job.report(message="Working...")
+    try:
+        result = fn(*args, **kwargs)
+    except GenerationCancelled:
+        job.error = "cancelled"
+        job.status = "error"
+        job.finished_at = time.time()
+        logger.info(f"Job {job.job_id[:8]} ({job.kind}) stopped after being cancelled")
+        return
+    except Exception as e:
+        job.error = str(e)
+        job.report(message=f"Failed: {e}")
+        job.status = "error"
+        job.finished_at = time.time()
+        log_error(logger, e, f"Job {job.job_id[:8]} ({job.kind}) failed")
+        return
+
+    if on_complete is not None:
+        # Runs even if the page that started the job has been left, and before the job
+        # is marked done, so a poller never collects it ahead of these side effects
+        try:
+            on_complete(result)
+        except Exception as e:
+            log_error(logger, e, f"Completion handler for job {job.job_id[:8]} ({job.kind}) failed")
+    job.result = result
+    job.report(message="Finished", progress=1.0)
+    job.finished_at = time.time()
+    job.status = "done"
+    logger.info(f"Job {job.job_id[:8]} ({job.kind}) finished in {job.finished_at - job.created_at:.2f}s")
+
+
+def make_idempotency_key(session_id, stage, inputs):
+    """
+    Build a stable idempotency key for a session's stage from the inputs that determine its result
+
+    Args:
+        session_id (str): Session the stage belongs to
+        stage (str): Pipeline stage, e.g. "brainstorm_follow_up"
+        inputs (dict): JSON-serialisable inputs of the stage (leave out secrets like API keys)
+
+    Returns:
+        str: Hex digest identifying this exact request
+    """
+    payload = json.dumps({"session": session_id, "stage": stage, "inputs": inputs}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def submit_job(kind, fn, args=(), kwargs=None, session_id=None, on_complete=None, stream=False,
+               report_progress=False, idempotency_key=None):
+    """
+    Run a generation function in the background worker pool
+
+    The function must not touch Streamlit session state; pass it everything it
+    needs as arguments and apply the result when the page collects the job.
+
+    Args:
+        kind (str): Kind of job, e.g. "plan" or "brainstorm_question"
+        fn (callable): Function to run
+        args (tuple): Positional arguments for fn
+        kwargs (dict, optional): Keyword arguments for fn
+        session_id (str, optional): Session that owns the job
+        on_complete (callable, optional): Called with the result in the worker thread,
+            e.g. to checkpoint it
+        stream (bool): Pass stream_callback=job.append_output to fn so partial output
+            can be shown while it runs
+        report_progress (bool): Pass progress_callback=job.report to fn for multi-step jobs
+        idempotency_key (str, optional): Key from make_idempotency_key; while a job with
+            the same key is running or uncollected, its id is returned instead of
+            starting a second backend call
+
+    Returns:
+        str: Job id to store in session state and poll with get_job
+    """
+    log_function_call(logger, "submit_job", args=[kind], kwargs={"session_id": session_id})
+    prune_jobs()
+
+    with _jobs_lock:
+        existing_id = _jobs_by_key.get(idempotency_key) if idempotency_key else None
+        if existing_id in _jobs:
+            metrics.increment("duplicate_generations")
+            metrics.increment(f"duplicate_generations.{kind}")
+            logger.info(f"Coalesced duplicate {kind} request into job {existing_id[:8]}")
+            return existing_id
+        job = Job(kind, session_id, idempotency_key)
+        _jobs[job.job_id] = job
+        if idempotency_key:
+            _jobs_by_key[idempotency_key] = job.job_id
+    metrics.increment(f"jobs_submitted.{kind}")
+
+    kwargs = dict(kwargs or {})
+    if stream:
+        kwargs["stream_callback"] = job.append_output
+    if report_progress:
+        kwargs["progress_callback"] = job.report
+
+    _executor.submit(_run_job, job, fn, args, kwargs, on_complete)
+    logger.info(f"Submitted job {job.job_id[:8]} ({kind})")
+    return job.job_id
+
+
+def _forget_key(job):
+    # Caller holds _jobs_lock
+    if job.idempotency_key and _jobs_by_key.get(job.idempotency_key) == job.job_id:
+        del _jobs_by_key[job.idempotency_key]
+
+
+def get_job(job_id):
+    """Return a job by id, or None if it is unknown or has expired"""
+    if not job_id:
+        return None
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def collect_job(job_id):
+    """
+    Remove a finished job from the registry and return it
+
+    Returns None if the job is unknown or still running.
+    """
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None or not job.done:
+            return None
+        del _jobs[job_id]
+        _forget_key(job)
+    logger.debug(f"Collected job {job_id[:8]} ({job.kind})")
+    return job
+
+
+def cancel_job(job_id):
+    """
+    Forget a job whose result is no longer wanted
+
+    A queued job never starts and a streaming job stops at its next piece of output.
+    The job's idempotency key is released immediately.
+
+    Returns:
+        bool: True if the job was known
+    """
+    with _jobs_lock:
+        job = _jobs.pop(job_id, None) if job_id else None
+        if job is None:
+            return False
+        _forget_key(job)
+    job.cancelled = True
+    metrics.increment(f"jobs_cancelled.{job.kind}")
+    logger.info(f"Cancelled job {job_id[:8]} ({job.kind})")
+    return True
+
+
+def prune_jobs(ttl_seconds=JOB_TTL_SECONDS):
+    """Forget finished jobs that were never collected"""
+    now = time.time()
+    with _jobs_lock:
+        expired = [job_id for job_id, job in _jobs.items()
+                   if job.done and job.finished_at and now - job.finished_at > ttl_seconds]
+        for job_id in expired:
+            _forget_key(_jobs.pop(job_id))
+    if expired:
+        logger.debug(f"Pruned {len(expired)} expired jobs")
@@ -0,0 +1,77 @@
+import os
+import sys
+import threading
+from collections import defaultdict, deque
+
+# Add parent directory to path for direct imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.logging_utils import get_logger
+
+# Set up logger for this module
+logger = get_logger(__name__)
+
+# Number of recent samples kept per timing/value metric
+MAX_SAMPLES = 500
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_samples = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+
+
+def increment(name, amount=1):
+    """Increase a process-wide counter"""
+    with _lock:
+        _counters[name] += amount
+
+
+def observe(name, value):
+    """Record a sample (e.g. a latency in seconds) for a metric"""
+    with _lock:
+        _samples[name].append(value)
+
+
+def get_counter(name):
+    """Return the current value of a counter"""
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def get_samples(name):
+    """Return a copy of the recent samples recorded for a metric"""
+    with _lock:
+        return list(_samples.get(name, ()))
+
+
+def percentile(name, q):
+    """
+    Return the q-th percentile (0-100) of a metric's recent samples, or None without samples
+    """
+    values = sorted(get_samples(name))
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(round(q / 100.0 * (len(values) - 1)))))
+    return values[index]
+
+
+def snapshot():
+    """
+    Return all counters plus count/p50/p95 of every sampled metric
+    """
+    with _lock:
+        counters = dict(_counters)
+        sample_names = list(_samples.keys())
+    summaries = {}
+    for name in sample_names:
+        summaries[name] = {
+            "count": len(get_samples(name)),
+            "p50": percentile(name, 50),
+            "p95": percentile(name, 95)
+        }
+    return {"counters": counters, "samples": summaries}
+
+
+def reset():
+    """Clear all metrics (used by benchmarks between runs)"""
+    with _lock:
+        _counters.clear()
+        _samples.clear()
@@ -0,0 +1,237 @@
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Add parent directory to path for direct imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.model_utils import generate_with_ollama, generate_with_openai, is_generation_error, OUTPUT_TOKEN_BUDGETS
+from utils.ollama_options import get_ollama_options
+from utils.prompt_templates import PLAN_END_MARKER, build_brainstorm_messages, build_plan_prompt, messages_to_prompt, to_messages
+from utils.brainstorm_engine import parse_turn
+from utils.context_manager import count_tokens
+from utils.logging_utils import get_logger, log_error, log_function_call, log_function_return
+
+# Set up logger for this module
+logger = get_logger(__name__)
+
+# Latest benchmark result per backend, model and stage
+BENCHMARK_FILE = os.environ.get("IDEATION_MODEL_BENCHMARK_FILE", "model_benchmarks.json")
+STAGES = ["brainstorm", "plan"]
+
+# Standard inputs, so results are comparable between models and machines
+SAMPLE_IDEA = "A mobile app that helps people track their daily water intake with reminders and progress charts"
+SAMPLE_PLAN_TYPE = "App Development"
+SAMPLE_CONTEXT = [
+    {"role": "assistant", "content": "1. Who is the app for?\n2. Which platforms and what budget?"},
+    {"role": "user", "content": "Office workers aged 25-45 who forget to drink water; iOS first, about $20k."}
+]
+SAMPLE_FACTS = ["Target users: office workers aged 25-45", "iOS first", "Budget about $20k"]
+# A plan shorter than this is not considered adequate
+MIN_PLAN_CHARS = 800
+
+_file_lock = threading.Lock()
+# (model_type, benchmark file) -> (file mtime, recommendations)
+_recommendations = {}
+_recommendations_lock = threading.Lock()
+
+
+def _run_stage(model_type, model, api_key, stage):
+    """Run one standard prompt with streaming and measure it"""
+    first_token_at = []
+
+    def stream_callback(piece):
+        if not first_token_at:
+            first_token_at.append(time.time())
+
+    start_time = time.time()
+    if stage == "brainstorm":
+        messages = build_brainstorm_messages(SAMPLE_IDEA, SAMPLE_PLAN_TYPE, None, SAMPLE_CONTEXT)
+        if model_type == "local":
+            system_prompt, prompt = messages_to_prompt(messages)
+            output = generate_with_ollama(model, prompt, system_prompt=system_prompt, stream_callback=stream_callback,
+                                          json_mode=True, options=get_ollama_options(model, stage))
+        else:
+            output = generate_with_openai(model, messages, api_key, stream_callback=stream_callback, json_mode=True,
+                                          max_tokens=OUTPUT_TOKEN_BUDGETS[stage])
+    else:
+        system_prompt, user_prompt = build_plan_prompt(SAMPLE_IDEA, SAMPLE_PLAN_TYPE, None, SAMPLE_CONTEXT, [], SAMPLE_FACTS)
+        if model_type == "local":
+            output = generate_with_ollama(model, user_prompt, system_prompt=system_prompt, stream_callback=stream_callback,
+                                          options=get_ollama_options(model, stage), stop=[PLAN_END_MARKER],
+                                          continue_on_length=True)
+        else:
+            output = generate_with_openai(model, to_messages(system_prompt, user_prompt), api_key,
+                                          stream_callback=stream_callback, max_tokens=OUTPUT_TOKEN_BUDGETS[stage],
+                                          stop=[PLAN_END_MARKER], continue_on_length=True)
+    total_seconds = time.time() - start_time
+
+    if is_generation_error(output):
+        return {"error": output or "Error: empty response", "adequate": False, "total_seconds": round(total_seconds, 3)}
+
+    ttft = (first_token_at[0] - start_time) if first_token_at else total_seconds
+    output_tokens = count_tokens(output, model_type, model)
+    generation_seconds = total_seconds - ttft
+    if stage == "brainstorm":
+        adequate = parse_turn(output)["valid"]
+    else:
+        adequate = len(output) >= MIN_PLAN_CHARS
+    return {
+        "ttft_seconds": round(ttft, 3),
+        "tokens_per_sec": round(output_tokens / generation_seconds, 2) if generation_seconds > 0 else None,
+        "total_seconds": round(total_seconds, 3),
+        "output_chars": len(output),
+        "output_tokens": output_tokens,
+        "adequate": adequate
+    }
+
+
+def benchmark_model(model_type, model, api_key=None, stage="brainstorm"):
+    """
+    Run the standard prompt for a stage against one model
+
+    Args:
+        model_type (str): "local" or "cloud"
+        model (str): Model name
+        api_key (str, optional): API key for cloud models
+        stage (str): "brainstorm" or "plan"
+
+    Returns:
+        dict: model_type, model, stage, timestamp and either ttft_seconds, tokens_per_sec,
+        total_seconds, output_chars, output_tokens and adequate, or error
+    """
+    log_function_call(logger, "benchmark_model", args=[model_type, model, stage])
+    try:
+        result = _run_stage(model_type, model, api_key, stage)
+    except Exception as e:
+        log_error(logger, e, f"Benchmark failed for {model} ({stage})")
+        result = {"error": f"Error: {str(e)}", "adequate": False}
+    result.update({
+        "model_type": model_type, "model": model, "stage": stage,
+        "timestamp": datetime.now().isoformat(timespec="seconds")
+    })
+    log_function_return(logger, "benchmark_model", result)
+    return result
+
+
+def run_benchmarks(model_type, models, api_key=None, stages=STAGES, concurrent=False, progress_callback=None,
+                   benchmark_file=BENCHMARK_FILE):
+    """
+    Benchmark each model on each stage and store the results
+
+    Runs are sequential by default. Concurrent runs finish sooner but compete for
+    the same hardware (a local Ollama server mostly serves one request at a time),
+    so their latencies are only comparable with other concurrent runs.
+
+    Args:
+        model_type (str): "local" or "cloud"
+        models (list): Model names
+        api_key (str, optional): API key for cloud models
+        stages (list): Stages to benchmark
+        concurrent (bool): Run all models at once
+        progress_callback (callable, optional): Called with (done, total, result) after each run
+        benchmark_file (str): Where results are stored
+
+    Returns:
+        list: One result dict per model and stage
+    """
+    log_function_call(logger, "run_benchmarks", args=[model_type], kwargs={"models": models, "concurrent": concurrent})
+    tasks = [(model, stage) for model in models for stage in stages]
+    results = []
+
+    def finished(result):
+        results.append(result)
+        if progress_callback:
+            progress_callback(len(results), len(tasks), result)
+
+    if concurrent:
+        with ThreadPoolExecutor(max_workers=len(models) or 1) as executor:
+            # Each model's stages still run one after the other
+            futures = [executor.submit(lambda model: [benchmark_model(model_type, model, api_key, stage)
+                                                      for stage in stages], model) for model in models]
+            for future in futures:
+                for result in future.result():
+                    finished(result)
+    else:
+        for model, stage in tasks:
+            finished(benchmark_model(model_type, model, api_key, stage))
+
+    save_results(results, benchmark_file)
+    log_function_return(logger, "run_benchmarks", f"<{len(results)} results>")
+    return results
+
+
+def load_results(benchmark_file=BENCHMARK_FILE):
+    """Return all stored results as {"<model_type>:<model>": {stage: result}}"""
+    try:
+        with open(benchmark_file, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (IOError, ValueError) as e:
+        log_error(logger, e, f"Could not read model benchmarks from {benchmark_file}")
+        return {}
+
+
+def save_results(results, benchmark_file=BENCHMARK_FILE):
+    """Merge results into the benchmark file, replacing older results for the same model and stage"""
+    with _file_lock:
+        stored = load_results(benchmark_file)
+        for result in results:
+            stored.setdefault(f"{result['model_type']}:{result['model']}", {})[result["stage"]] = result
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(benchmark_file)), exist_ok=True)
+            tmp_path = f"{benchmark_file}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(stored, f, indent=2)
+            os.replace(tmp_path, benchmark_file)
+        except IOError as e:
+            log_error(logger, e, f"Failed to save model benchmarks to {benchmark_file}")
+
+
+def get_results(model_type, benchmark_file=BENCHMARK_FILE):
+    """Return the stored results for one backend as a flat list, ordered by model and stage"""
+    prefix = f"{model_type}:"
+    return [
+        result
+        for key, stages in sorted(load_results(benchmark_file).items()) if key.startswith(prefix)
+        for stage, result in sorted(stages.items())
+    ]
+
+
+def recommend_models(model_type, benchmark_file=BENCHMARK_FILE):
+    """
+    Recommend the fastest adequate model per stage from stored results
+
+    Brainstorming is judged on time to first token, since the user waits for the
+    questions; plans are judged on total latency. Routing asks for this on every page
+    run, so recommendations are reused while the benchmark file is unchanged; treat
+    the returned dict as read-only.
+
+    Returns:
+        dict: stage -> result of the recommended model (stages without an adequate result are left out)
+    """
+    try:
+        mtime = os.path.getmtime(benchmark_file)
+    except OSError:
+        return {}
+    cache_key = (model_type, os.path.abspath(benchmark_file))
+    with _recommendations_lock:
+        cached = _recommendations.get(cache_key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+    recommendations = {}
+    for result in get_results(model_type, benchmark_file):
+        if not result.get("adequate"):
+            continue
+        key = "ttft_seconds" if result["stage"] == "brainstorm" else "total_seconds"
+        best = recommendations.get(result["stage"])
+        if best is None or result[key] < best[key]:
+            recommendations[result["stage"]] = result
+    with _recommendations_lock:
+        _recommendations[cache_key] = (mtime, recommendations)
+    return recommendations
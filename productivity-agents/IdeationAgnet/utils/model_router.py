@@ -0,0 +1,183 @@
+import os
+import re
+import sys
+
+# Add parent directory to path for direct imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.model_benchmark import recommend_models
+from utils.logging_utils import get_logger
+
+# Set up logger for this module
+logger = get_logger(__name__)
+
+# Pipeline stages that can each use their own backend and model.
+# "brainstorm" covers the clarifying questions and the completeness check (one call per round),
+# "vision" the drawing analysis and "plan" the implementation plan and its summaries.
+ROUTED_STAGES = ["brainstorm", "vision", "plan"]
+STAGE_LABELS = {
+    "brainstorm": "Clarifying questions",
+    "vision": "Drawing analysis",
+    "plan": "Implementation plan"
+}
+
+# Optional backup route for brainstorming: a duplicate request is sent to it when the
+# brainstorming model is slow to start answering (see utils/hedging.py)
+HEDGE_ROUTE = "brainstorm_hedge"
+
+# Optional ordered list of routes tried when a stage's own route fails or its circuit is open.
+# Without one, the other stage's model is tried, then DEFAULT_CLOUD_FAILOVER if an API key is set.
+FAILOVER_ROUTE = "failover"
+DEFAULT_CLOUD_FAILOVER = "gpt-4o-mini"
+FAILOVER_ENABLED = os.environ.get("IDEATION_FAILOVER", "1") != "0"
+
+# Set IDEATION_STAGE_ROUTING=0 to use the selected model for every stage by default
+ROUTING_ENABLED = os.environ.get("IDEATION_STAGE_ROUTING", "1") != "0"
+DEFAULT_VISION_MODEL = "gpt-4o"
+VISION_MODELS = ["gpt-4o", "gpt-4o-mini", "gpt-4-turbo"]
+# Smaller cloud model used for brainstorming when a large one is selected
+SMALL_CLOUD_MODELS = {
+    "gpt-4o": "gpt-4o-mini",
+    "gpt-4-turbo": "gpt-4o-mini",
+    "claude-3-opus": "claude-3-haiku",
+    "claude-3-sonnet": "claude-3-haiku",
+    "gemini-1.5-pro": "gemini-1.0-pro"
+}
+# Local models below this size (billions of parameters) tend to break the JSON brainstorming format
+MIN_QUESTION_MODEL_BILLIONS = 1.0
+
+_SIZE_PATTERN = re.compile(r"(\d+(?:\.\d+)?)b\b", re.IGNORECASE)
+
+
+def make_route(model_type, model):
+    """Return the route of a stage: which backend and model it runs on"""
+    return {"model_type": model_type, "model": model}
+
+
+def route_label(route):
+    """Human-readable name of a route, also recorded with each generated artifact"""
+    if not route:
+        return "not available"
+    return f"{route['model']} ({route['model_type']})"
+
+
+def can_read_images(model):
+    """Whether a cloud model accepts images"""
+    return "vision" in model or model in VISION_MODELS
+
+
+def model_size_billions(model):
+    """Parameter count in billions from an Ollama tag such as "llama3.2:3b", or None if unknown"""
+    tag = model.split(":", 1)[1] if ":" in model else ""
+    match = _SIZE_PATTERN.search(tag)
+    return float(match.group(1)) if match else None
+
+
+def _smaller_local_model(selected_model, available_models):
+    """Smallest usable model of the same family as the selected one, if it is smaller"""
+    selected_size = model_size_billions(selected_model)
+    if selected_size is None:
+        return None
+    family = selected_model.split(":", 1)[0]
+    candidates = []
+    for model in available_models:
+        size = model_size_billions(model)
+        if (model.split(":", 1)[0] == family and size is not None
+                and MIN_QUESTION_MODEL_BILLIONS <= size < selected_size):
+            candidates.append((size, model))
+    return min(candidates)[1] if candidates else None
+
+
+def default_routes(model_type, selected_model, available_models=None):
+    """
+    Return the default route for each stage
+
+    Plans use the selected model. Brainstorming uses the model the benchmark found fastest
+    for it, otherwise a smaller model of the same family. Drawings are analysed by a
+    vision-capable cloud model, which is only available with a cloud backend.
+
+    Args:
+        model_type (str): "local" or "cloud"
+        selected_model (str): Model chosen on the Configuration page
+        available_models (list, optional): Installed Ollama models, for local backends
+
+    Returns:
+        dict: stage -> route (dict with model_type and model), or None if the stage is unavailable
+    """
+    routes = {stage: make_route(model_type, selected_model) for stage in ("brainstorm", "plan")}
+    if model_type == "cloud":
+        vision_model = selected_model if can_read_images(selected_model) else DEFAULT_VISION_MODEL
+        routes["vision"] = make_route("cloud", vision_model)
+    else:
+        routes["vision"] = None
+    if not ROUTING_ENABLED:
+        return routes
+
+    recommended = recommend_models(model_type).get("brainstorm")
+    if recommended and (model_type == "cloud" or recommended["model"] in (available_models or [])):
+        routes["brainstorm"] = make_route(model_type, recommended["model"])
+    elif model_type == "cloud" and selected_model in SMALL_CLOUD_MODELS:
+        routes["brainstorm"] = make_route("cloud", SMALL_CLOUD_MODELS[selected_model])
+    elif model_type == "local":
+        smaller = _smaller_local_model(selected_model, available_models or [])
+        if smaller:
+            routes["brainstorm"] = make_route("local", smaller)
+    return routes
+
+
+def resolve_routes(model_type, selected_model, overrides=None, available_models=None):
+    """
+    Return the route of each stage, applying any routes chosen on the Configuration page
+
+    Args:
+        model_type (str): "local" or "cloud"
+        selected_model (str): Model chosen on the Configuration page
+        overrides (dict, optional): stage -> route set by the user
+        available_models (list, optional): Installed Ollama models
+
+    Returns:
+        dict: stage -> route, or None for stages that are not available; HEDGE_ROUTE is only
+        present when a backup route was chosen
+    """
+    routes = default_routes(model_type, selected_model, available_models)
+    for stage, route in (overrides or {}).items():
+        if (stage in ROUTED_STAGES or stage in (HEDGE_ROUTE, FAILOVER_ROUTE)) and route:
+            routes[stage] = route
+    logger.debug("Stage routes: " + ", ".join(f"{stage}={route_label(route)}" for stage, route in routes.items()))
+    return routes
+
+
+def failover_chain(stage, routes, has_api_key=False):
+    """
+    Return the routes to try for a stage, in order: its own route, then the failover routes
+
+    Cloud routes are only included when an API key is available.
+
+    Args:
+        stage (str): "brainstorm" or "plan"
+        routes (dict): Routes from resolve_routes
+        has_api_key (bool): Whether the session has a cloud API key
+
+    Returns:
+        list: Routes, starting with the stage's own one
+    """
+    chain = [routes[stage]]
+    if not FAILOVER_ENABLED:
+        return chain
+    candidates = routes.get(FAILOVER_ROUTE)
+    if not candidates:
+        candidates = [routes.get(other) for other in ("brainstorm", "plan") if other != stage]
+        candidates.append(make_route("cloud", DEFAULT_CLOUD_FAILOVER))
+    for route in candidates:
+        if route and route not in chain and (route["model_type"] == "local" or has_api_key):
+            chain.append(route)
+    return chain
+
+
+def get_session_routes(session_state):
+    """Resolve the stage routes for the current Streamlit session"""
+    if not session_state.get("model_type") or not session_state.get("selected_model"):
+        return {}
+    return resolve_routes(
+        session_state["model_type"], session_state["selected_model"],
+        session_state.get("stage_models"), session_state.get("available_ollama_models")
+    )
@@ -1,32 +1,83 @@
-import requests
 import json
 import os
 import sys
-import openai
-from dotenv import load_dotenv
 import time
 
 # Add parent directory to path for direct imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))) 
 from utils.logging_utils import get_logger, log_api_request, log_api_response, log_error, log_function_call, log_function_return
+from utils import metrics
 
 # Set up logger for this module
 logger = get_logger(__name__)
 
-# Load environment variables
-load_dotenv()
-logger.debug("Environment variables loaded")
+# Backend SDKs (requests, openai, python-dotenv) are imported inside the functions that use
+# them, so importing this module is cheap for pages that never call a backend
+_env_loaded = False
+
+DEFAULT_OLLAMA_URL = "http://localhost:11434"
+# Fail fast when Ollama is down; the read timeout is the longest silence allowed between bytes
+OLLAMA_CONNECT_TIMEOUT = float(os.environ.get("IDEATION_OLLAMA_CONNECT_TIMEOUT", "3"))
+OLLAMA_READ_TIMEOUT = float(os.environ.get("IDEATION_OLLAMA_READ_TIMEOUT", "300"))
+OPENAI_TIMEOUT = float(os.environ.get("IDEATION_OPENAI_TIMEOUT", "120"))
+
+# Output token budget of each pipeline stage: brainstorming turns are short JSON objects,
+# plans are long documents. Ollama gets the same budgets as num_predict (see ollama_options).
+OUTPUT_TOKEN_BUDGETS = {"brainstorm": 500, "summary": 400, "vision": 800, "plan": 3000}
+DEFAULT_MAX_TOKENS = 2000
+# Follow-up requests allowed when an output stops at the token limit (continue_on_length)
+MAX_CONTINUATIONS = int(os.environ.get("IDEATION_MAX_CONTINUATIONS", "2"))
+CONTINUE_PROMPT = "Continue exactly where you stopped. Do not repeat anything and do not add a preamble."
+
+
+class GenerationCancelled(Exception):
+    """Raised from a stream callback to stop reading a response that is no longer wanted"""
+
+class GenerationFailure(str):
+    """
+    The "Error: ..." message returned in place of text when a generation fails
+
+    It reads as the message wherever it is shown or logged. Callers tell failures apart
+    with is_generation_error, by type and never by wording: a valid answer may start
+    with "Error" too.
+    """
+
+def is_generation_error(text):
+    """True if a generation returned a failure (or nothing) instead of text"""
+    return not text or isinstance(text, GenerationFailure)
+
+def _ensure_env_loaded():
+    """
+    Load environment variables from .env on first backend use instead of at import time
+    """
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+        logger.debug("Environment variables loaded")
+
+def _ollama_url(path):
+    """
+    Build an Ollama API URL; OLLAMA_BASE_URL points the app at another server (e.g. the benchmark mock)
+    
+    The OpenAI SDK reads OPENAI_BASE_URL the same way.
+    """
+    _ensure_env_loaded()
+    return os.environ.get("OLLAMA_BASE_URL", DEFAULT_OLLAMA_URL).rstrip("/") + path
 
 def get_available_ollama_models():
     """
-    Check for available Ollama models on localhost:11434
+    Check for available Ollama models on the Ollama server (localhost:11434 by default)
     Returns a list of model names or empty list if Ollama is not running
     """
     log_function_call(logger, "get_available_ollama_models")
+    import requests
     try:
-        log_api_request(logger, "http://localhost:11434/api/tags")
-        response = requests.get("http://localhost:11434/api/tags", timeout=2)
-        log_api_response(logger, "http://localhost:11434/api/tags", response.status_code)
+        url = _ollama_url("/api/tags")
+        log_api_request(logger, url)
+        response = requests.get(url, timeout=2)
+        log_api_response(logger, url, response.status_code)
         
         if response.status_code == 200:
             models = response.json()
@@ -47,17 +98,19 @@ def test_ollama_connection(model_name):
     Test if connection to Ollama is working with the specified model
     """
     log_function_call(logger, "test_ollama_connection", args=[model_name])
+    import requests
     try:
         request_data = {"model": model_name, "prompt": "Hello", "stream": False}
-        log_api_request(logger, "http://localhost:11434/api/generate", params=request_data)
+        url = _ollama_url("/api/generate")
+        log_api_request(logger, url, params=request_data)
         start_time = time.time()
         response = requests.post(
-            "http://localhost:11434/api/generate",
+            url,
             json=request_data,
             timeout=5
         )
         elapsed_time = time.time() - start_time
-        log_api_response(logger, "http://localhost:11434/api/generate", response.status_code)
+        log_api_response(logger, url, response.status_code)
         logger.debug(f"Ollama response time: {elapsed_time:.2f}s")
         
         success = response.status_code == 200
@@ -89,6 +142,8 @@ def test_openai_connection(api_key):
     Test if OpenAI API connection works with the provided key
     """
     log_function_call(logger, "test_openai_connection")
+    import openai
+    _ensure_env_loaded()
     try:
         logger.debug("Testing OpenAI API connection")
         # Create a fresh client instance without any proxy settings
@@ -110,9 +165,103 @@ def test_openai_connection(api_key):
         log_function_return(logger, "test_openai_connection", False)
         return False
 
-def generate_with_ollama(model, prompt, system_prompt=None):
+def _record_usage(backend, prompt_tokens=None, cached_tokens=None, prefill_tokens=None, completion_tokens=None):
+    """
+    Record token usage reported by a backend, including how much of the prompt came from cache
+    
+    prefill_tokens is the part of the prompt the backend actually had to process; with a stable
+    prompt prefix it should stay well below prompt_tokens on repeated calls.
+    """
+    if prefill_tokens is None and prompt_tokens is not None:
+        prefill_tokens = prompt_tokens - (cached_tokens or 0)
+    for name, value in (("prompt_tokens", prompt_tokens), ("cached_prompt_tokens", cached_tokens),
+                        ("prefill_tokens", prefill_tokens), ("completion_tokens", completion_tokens)):
+        if value is not None:
+            metrics.observe(f"{name}.{backend}", value)
+            metrics.increment(f"{name}_total.{backend}", value)
+    logger.info(f"Token usage | Backend: {backend} | Prompt: {prompt_tokens} | Cached: {cached_tokens} | "
+                f"Prefill: {prefill_tokens} | Completion: {completion_tokens}")
+
+def _usage_field(block, name):
+    # SDKs that predate a field return it as a plain dict instead of a typed object
+    if isinstance(block, dict):
+        return block.get(name)
+    return getattr(block, name, None)
+
+def _record_openai_usage(usage):
+    """Record the usage block of an OpenAI response (cached tokens need a recent API/SDK)"""
+    if usage is None:
+        return
+    details = _usage_field(usage, "prompt_tokens_details")
+    cached_tokens = _usage_field(details, "cached_tokens") if details is not None else None
+    _record_usage("openai", prompt_tokens=_usage_field(usage, "prompt_tokens") or 0, cached_tokens=cached_tokens or 0,
+                  completion_tokens=_usage_field(usage, "completion_tokens") or 0)
+
+def _read_ollama_stream(response, stream_callback):
+    """
+    Read a streaming Ollama /api/generate response, passing each piece to stream_callback
+    Returns the full text and the final chunk, which carries the timing and token statistics
+    """
+    parts = []
+    final_chunk = {}
+    for line in response.iter_lines():
+        if not line:
+            continue
+        chunk = json.loads(line)
+        piece = chunk.get("response", "")
+        if piece:
+            parts.append(piece)
+            stream_callback(piece)
+        if chunk.get("done"):
+            final_chunk = chunk
+            break
+    return "".join(parts), final_chunk
+
+def _apply_ollama_options(data, options):
+    """Add generation options to an Ollama request; keep_alive is a request field, not a model option"""
+    if not options:
+        return
+    options = dict(options)
+    keep_alive = options.pop("keep_alive", None)
+    if keep_alive not in (None, ""):
+        data["keep_alive"] = keep_alive
+    if options:
+        data["options"] = options
+
+def _ollama_request(data, stream_callback):
+    """
+    Send one /api/generate request
+    Returns (text, final chunk) on success or (error string, None) on an HTTP error
+    """
+    import requests
+    url = _ollama_url("/api/generate")
+    log_api_request(logger, url)
+    response = requests.post(url, json=data, stream=stream_callback is not None,
+                             timeout=(OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT))
+    log_api_response(logger, url, response.status_code)
+    if response.status_code != 200:
+        return GenerationFailure(f"Error: {response.status_code}"), None
+    if stream_callback is not None:
+        try:
+            return _read_ollama_stream(response, stream_callback)
+        finally:
+            # Drop the connection if reading stopped early (e.g. a hedged request was cancelled);
+            # Ollama stops generating when the client disconnects
+            response.close()
+    final_chunk = response.json()
+    return final_chunk.get("response", ""), final_chunk
+
+def generate_with_ollama(model, prompt, system_prompt=None, stream_callback=None, json_mode=False, options=None,
+                         stop=None, continue_on_length=False):
     """
     Generate response using local Ollama model
+    If stream_callback is given, the response is streamed and each piece is passed to it
+    If json_mode is set, the model is constrained to return a single JSON object
+    options are Ollama generation options (num_ctx, num_predict, num_thread, ...) plus keep_alive,
+    usually from ollama_options.get_ollama_options
+    stop is a list of sequences that end generation early
+    If continue_on_length is set and the output hits num_predict, up to MAX_CONTINUATIONS
+    follow-up requests continue it from the returned context and the pieces are stitched together
     """
     log_function_call(logger, "generate_with_ollama", args=[model], kwargs={"system_prompt": system_prompt is not None})
     prompt_short = prompt[:50] + "..." if len(prompt) > 50 else prompt
@@ -122,66 +271,190 @@ def generate_with_ollama(model, prompt, system_prompt=None):
         data = {
             "model": model,
             "prompt": prompt,
-            "stream": False
+            "stream": stream_callback is not None
         }
         if system_prompt:
             data["system"] = system_prompt
             logger.debug("Using system prompt with Ollama")
+        if json_mode:
+            data["format"] = "json"
+        if stop:
+            options = dict(options or {}, stop=list(stop))
+        _apply_ollama_options(data, options)
             
-        log_api_request(logger, "http://localhost:11434/api/generate")
         start_time = time.time()
-        response = requests.post("http://localhost:11434/api/generate", json=data)
+        parts = []
+        for attempt in range(MAX_CONTINUATIONS + 1):
+            result, final_chunk = _ollama_request(data, stream_callback)
+            if final_chunk is None:
+                if parts:
+                    # Keep what was generated before the continuation failed
+                    logger.warning(f"Ollama continuation failed ({result}); returning truncated output")
+                    break
+                log_error(logger, result, "Ollama API error")
+                log_function_return(logger, "generate_with_ollama", result)
+                return result
+            parts.append(result)
+            # Ollama reports only the prompt tokens it evaluated; tokens reused from its KV cache are skipped
+            _record_usage("ollama", prefill_tokens=final_chunk.get("prompt_eval_count"),
+                          completion_tokens=final_chunk.get("eval_count"))
+            if final_chunk.get("done_reason") != "length":
+                break
+            metrics.increment("output_truncations.ollama")
+            if not continue_on_length or attempt == MAX_CONTINUATIONS or not final_chunk.get("context"):
+                logger.warning(f"Ollama output from {model} was cut off at the token limit")
+                break
+            metrics.increment("continuations.ollama")
+            logger.info(f"Ollama output from {model} hit the token limit; continuing ({attempt + 1}/{MAX_CONTINUATIONS})")
+            # The context of the previous request already holds the prompt and the partial answer
+            data = dict(data, prompt=CONTINUE_PROMPT, context=final_chunk["context"])
+            data.pop("system", None)
+        result = "".join(parts)
         elapsed_time = time.time() - start_time
         logger.debug(f"Ollama generation time: {elapsed_time:.2f}s")
-        log_api_response(logger, "http://localhost:11434/api/generate", response.status_code)
-        
-        if response.status_code == 200:
-            result = response.json().get("response", "")
-            result_short = result[:50] + "..." if len(result) > 50 else result
-            logger.info(f"Ollama generation successful: {result_short}")
-            log_function_return(logger, "generate_with_ollama", "<response_content>")
-            return result
-        
-        error_msg = f"Error: {response.status_code}"
-        log_error(logger, error_msg, "Ollama API error")
-        log_function_return(logger, "generate_with_ollama", error_msg)
-        return error_msg
+        result_short = result[:50] + "..." if len(result) > 50 else result
+        logger.info(f"Ollama generation successful: {result_short}")
+        log_function_return(logger, "generate_with_ollama", "<response_content>")
+        return result
+    except GenerationCancelled:
+        logger.info(f"Ollama generation with {model} cancelled")
+        raise
     except Exception as e:
-        error_msg = f"Error: {str(e)}"
+        error_msg = GenerationFailure(f"Error: {str(e)}")
         log_error(logger, e, "Exception in generate_with_ollama")
         log_function_return(logger, "generate_with_ollama", error_msg)
         return error_msg
 
-def generate_with_openai(model, messages, api_key):
+def run_ollama_calibration(model, prompt, options):
+    """
+    Run one non-streaming Ollama generation and return its timing statistics
+    
+    Used by the auto-tuner in ollama_options. Returns the final response fields
+    (prompt_eval_count, prompt_eval_duration, eval_count, eval_duration, ...) plus
+    wall_seconds, or None if the request failed.
+    """
+    log_function_call(logger, "run_ollama_calibration", args=[model], kwargs=options)
+    import requests
+    data = {"model": model, "prompt": prompt, "stream": False}
+    _apply_ollama_options(data, options)
+    try:
+        url = _ollama_url("/api/generate")
+        log_api_request(logger, url)
+        start_time = time.time()
+        response = requests.post(url, json=data, timeout=300)
+        log_api_response(logger, url, response.status_code)
+        if response.status_code != 200:
+            log_function_return(logger, "run_ollama_calibration", None)
+            return None
+        stats = {key: value for key, value in response.json().items() if key.endswith(("_count", "_duration"))}
+        stats["wall_seconds"] = time.time() - start_time
+        log_function_return(logger, "run_ollama_calibration", stats)
+        return stats
+    except requests.exceptions.RequestException as e:
+        log_error(logger, e, f"Calibration run failed for model {model}")
+        log_function_return(logger, "run_ollama_calibration", None)
+        return None
+
+def _openai_completion(client, model, messages, max_tokens, stream_callback, request_options):
+    """
+    Make one chat completion request
+    Returns the text and the finish reason ("stop", "length", ...)
+    """
+    if stream_callback is not None:
+        # Streams only report usage (prompt and cached tokens) in a final chunk when asked to;
+        # sent as extra_body because the pinned SDK has no stream_options argument
+        request_options = {**request_options, "extra_body": {"stream_options": {"include_usage": True}}}
+    response = client.chat.completions.create(
+        model=model,
+        messages=messages,
+        max_tokens=max_tokens,
+        stream=stream_callback is not None,
+        **request_options
+    )
+    if stream_callback is None:
+        _record_openai_usage(response.usage)
+        return response.choices[0].message.content or "", response.choices[0].finish_reason
+
+    parts = []
+    finish_reason = None
+    try:
+        for chunk in response:
+            if chunk.choices:
+                piece = chunk.choices[0].delta.content
+                if piece:
+                    parts.append(piece)
+                    stream_callback(piece)
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+            # The final chunk carries the usage of the whole request (with no choices)
+            _record_openai_usage(getattr(chunk, "usage", None))
+    finally:
+        # Drop the connection if reading stopped early (e.g. a hedged request was cancelled)
+        response.response.close()
+    return "".join(parts), finish_reason
+
+def generate_with_openai(model, messages, api_key, stream_callback=None, json_mode=False,
+                         max_tokens=DEFAULT_MAX_TOKENS, stop=None, continue_on_length=False):
     """
     Generate response using OpenAI API
+    If stream_callback is given, the response is streamed and each piece is passed to it
+    If json_mode is set, the model is constrained to return a single JSON object
+    (the messages must mention JSON)
+    max_tokens is the output budget, usually OUTPUT_TOKEN_BUDGETS[stage]; stop is a list of
+    sequences that end generation early
+    If continue_on_length is set and the output hits max_tokens, up to MAX_CONTINUATIONS
+    follow-up requests continue it and the pieces are stitched together
     """
-    log_function_call(logger, "generate_with_openai", args=[model])
+    log_function_call(logger, "generate_with_openai", args=[model], kwargs={"max_tokens": max_tokens})
+    import openai
+    _ensure_env_loaded()
     last_msg = messages[-1]["content"] if messages else "<no message>"
+    if isinstance(last_msg, list):
+        # Multimodal message: log only its text parts
+        last_msg = " ".join(part.get("text", "") for part in last_msg if part.get("type") == "text")
     last_msg_short = last_msg[:50] + "..." if len(last_msg) > 50 else last_msg
     logger.info(f"Generating with OpenAI model: {model}, last message: {last_msg_short}")
     
     try:
-        # Create a fresh client instance with the API key
-        client = openai.OpenAI(api_key=api_key)
+        # Create a fresh client instance with the API key; failover handles retries
+        client = openai.OpenAI(api_key=api_key, timeout=OPENAI_TIMEOUT, max_retries=0)
         log_api_request(logger, f"OpenAI chat.completions with model {model}")
         start_time = time.time()
-        response = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            max_tokens=2000
-        )
+        request_options = {"response_format": {"type": "json_object"}} if json_mode else {}
+        if stop:
+            request_options["stop"] = list(stop)
+        
+        parts = []
+        request_messages = messages
+        for attempt in range(MAX_CONTINUATIONS + 1):
+            text, finish_reason = _openai_completion(client, model, request_messages, max_tokens,
+                                                     stream_callback, request_options)
+            parts.append(text)
+            if finish_reason != "length":
+                break
+            metrics.increment("output_truncations.openai")
+            if not continue_on_length or attempt == MAX_CONTINUATIONS:
+                logger.warning(f"OpenAI output from {model} was cut off at {max_tokens} tokens")
+                break
+            metrics.increment("continuations.openai")
+            logger.info(f"OpenAI output from {model} hit the token limit; continuing ({attempt + 1}/{MAX_CONTINUATIONS})")
+            request_messages = list(messages) + [
+                {"role": "assistant", "content": "".join(parts)},
+                {"role": "user", "content": CONTINUE_PROMPT}
+            ]
+        result = "".join(parts)
         elapsed_time = time.time() - start_time
         logger.debug(f"OpenAI generation time: {elapsed_time:.2f}s")
         log_api_response(logger, "OpenAI chat.completions", 200)
         
-        result = response.choices[0].message.content
         result_short = result[:50] + "..." if len(result) > 50 else result
         logger.info(f"OpenAI generation successful: {result_short}")
         log_function_return(logger, "generate_with_openai", "<response_content>")
         return result
+    except GenerationCancelled:
+        logger.info(f"OpenAI generation with {model} cancelled")
+        raise
     except Exception as e:
-        error_msg = f"Error: {str(e)}"
+        error_msg = GenerationFailure(f"Error: {str(e)}")
         log_error(logger, e, f"Exception in generate_with_openai with model {model}")
         log_function_return(logger, "generate_with_openai", error_msg)
         return error_msg
@@ -191,12 +464,14 @@ def analyze_image_with_vision_model(api_key, image_data, prompt, model="gpt-4o")
     Analyze an image using a vision-capable model
     """
     log_function_call(logger, "analyze_image_with_vision_model", args=[model])
+    import openai
+    _ensure_env_loaded()
     prompt_short = prompt[:50] + "..." if len(prompt) > 50 else prompt
     logger.info(f"Analyzing image with vision model: {model}, prompt: {prompt_short}")
     
     try:
         # Create a fresh client instance with the API key
-        client = openai.OpenAI(api_key=api_key)
+        client = openai.OpenAI(api_key=api_key, timeout=OPENAI_TIMEOUT)
         logger.debug("Converting image data for analysis")
         
         # Convert image data to base64 if it's not already
@@ -226,7 +501,7 @@ def analyze_image_with_vision_model(api_key, image_data, prompt, model="gpt-4o")
                     ]
                 }
             ],
-            max_tokens=1000
+            max_tokens=OUTPUT_TOKEN_BUDGETS["vision"]
         )
         elapsed_time = time.time() - start_time
         logger.debug(f"Vision analysis time: {elapsed_time:.2f}s")
@@ -238,7 +513,7 @@ def analyze_image_with_vision_model(api_key, image_data, prompt, model="gpt-4o")
         log_function_return(logger, "analyze_image_with_vision_model", "<image_analysis_content>")
         return result
     except Exception as e:
-        error_msg = f"Error analyzing image: {str(e)}"
+        error_msg = GenerationFailure(f"Error analyzing image: {str(e)}")
         log_error(logger, e, f"Exception in analyze_image_with_vision_model with model {model}")
         log_function_return(logger, "analyze_image_with_vision_model", error_msg)
         return error_msg
@@ -0,0 +1,224 @@
+import json
+import os
+import sys
+import threading
+from datetime import datetime
+
+# Add parent directory to path for direct imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.model_utils import OUTPUT_TOKEN_BUDGETS
+from utils.logging_utils import get_logger, log_error, log_function_call, log_function_return
+
+# Set up logger for this module
+logger = get_logger(__name__)
+
+# Per-model generation options and auto-tuning results, shared by all sessions on this machine
+OPTIONS_FILE = os.environ.get("IDEATION_OLLAMA_OPTIONS_FILE", "ollama_options.json")
+
+# Stages that call Ollama. "summary" is the running summary of older context.
+STAGES = ["brainstorm", "plan", "summary"]
+
+# Defaults applied to every model. Plan prompts and answers are the longest, so the plan
+# stage gets a larger context window than Ollama's default. num_predict follows the
+# output budgets used for cloud models. The context window is fixed per stage (here or
+# on the Configuration page) rather than auto-tuned: it decides how much prompt a stage
+# can take (see context_manager.prompt_budget), which a throughput sweep cannot judge.
+DEFAULT_KEEP_ALIVE = os.environ.get("IDEATION_OLLAMA_KEEP_ALIVE", "30m")
+DEFAULT_STAGE_OPTIONS = {
+    "brainstorm": {"num_ctx": 4096, "num_predict": OUTPUT_TOKEN_BUDGETS["brainstorm"]},
+    "plan": {"num_ctx": 8192, "num_predict": OUTPUT_TOKEN_BUDGETS["plan"]},
+    "summary": {"num_ctx": 4096, "num_predict": OUTPUT_TOKEN_BUDGETS["summary"]}
+}
+# Options the auto-tuner picks for the machine; they apply to every stage of a model
+TUNED_OPTIONS = ["num_thread", "num_batch"]
+# Options that can be set per stage on the Configuration page
+STAGE_OPTIONS = ["num_ctx", "num_predict", "num_thread", "num_batch", "keep_alive"]
+
+# Calibration sweep: a prompt long enough to exercise prompt evaluation and a short answer
+CALIBRATION_PROMPT = (
+    "You are helping plan a software project. Read the notes below and then list three risks.\n\n"
+    + "\n".join(f"Note {i}: the team wants a small web app with user accounts, a dashboard, "
+                f"file uploads and a weekly email report." for i in range(1, 25))
+)
+CALIBRATION_TOKENS = 64
+
+_settings = None
+_settings_mtime = None
+_settings_lock = threading.Lock()
+_write_lock = threading.Lock()
+
+
+def _load_settings(options_file):
+    """Read the options file, reusing the parsed copy while the file is unchanged"""
+    global _settings, _settings_mtime
+    try:
+        mtime = os.path.getmtime(options_file)
+    except OSError:
+        return {}
+    with _settings_lock:
+        if _settings is None or _settings_mtime != mtime:
+            try:
+                with open(options_file, "r") as f:
+                    _settings = json.load(f)
+            except (IOError, ValueError) as e:
+                log_error(logger, e, f"Could not read Ollama options from {options_file}")
+                _settings = {}
+            _settings_mtime = mtime
+        return _settings
+
+
+def _update_settings(model, update, options_file):
+    """Apply update(model_settings) to one model's entry and write the file atomically"""
+    global _settings, _settings_mtime
+    with _write_lock:
+        settings = json.loads(json.dumps(_load_settings(options_file)))
+        update(settings.setdefault(model, {}))
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(options_file)), exist_ok=True)
+            tmp_path = f"{options_file}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(settings, f, indent=2)
+            os.replace(tmp_path, options_file)
+        except IOError as e:
+            log_error(logger, e, f"Failed to save Ollama options to {options_file}")
+            return False
+        with _settings_lock:
+            _settings, _settings_mtime = settings, os.path.getmtime(options_file)
+        return True
+
+
+def get_model_settings(model, options_file=OPTIONS_FILE):
+    """
+    Return what is stored for a model
+
+    Returns:
+        dict: "stages" (per-stage overrides) and "tuned" (last auto-tuning result), either may be missing
+    """
+    return _load_settings(options_file).get(model, {})
+
+
+def get_ollama_options(model, stage, options_file=OPTIONS_FILE, include_overrides=True):
+    """
+    Return the Ollama request options for a model and stage
+
+    Defaults are overridden by the auto-tuned settings for the model, which are
+    overridden by any options set for the stage on the Configuration page.
+
+    Args:
+        model (str): Ollama model name
+        stage (str): One of STAGES
+        options_file (str): Path of the stored options
+        include_overrides (bool): Apply the per-stage overrides (False shows what they override)
+
+    Returns:
+        dict: Ollama "options" values, plus "keep_alive"
+    """
+    model_settings = get_model_settings(model, options_file)
+    options = {"keep_alive": DEFAULT_KEEP_ALIVE}
+    options.update(DEFAULT_STAGE_OPTIONS.get(stage, {}))
+    tuned = model_settings.get("tuned", {})
+    options.update({key: tuned[key] for key in TUNED_OPTIONS if key in tuned})
+    if include_overrides:
+        options.update(model_settings.get("stages", {}).get(stage, {}))
+    return options
+
+
+def save_stage_options(model, stage, options, options_file=OPTIONS_FILE):
+    """
+    Store per-stage option overrides for a model; None or empty values clear an override
+
+    Returns:
+        bool: True if the options were saved
+    """
+    log_function_call(logger, "save_stage_options", args=[model, stage], kwargs=options)
+    overrides = {key: value for key, value in options.items() if key in STAGE_OPTIONS and value not in (None, "")}
+
+    def update(model_settings):
+        stages = model_settings.setdefault("stages", {})
+        if overrides:
+            stages[stage] = overrides
+        else:
+            stages.pop(stage, None)
+
+    saved = _update_settings(model, update, options_file)
+    log_function_return(logger, "save_stage_options", saved)
+    return saved
+
+
+def calibration_candidates(cpu_count=None):
+    """
+    Return the option combinations tried by the auto-tuner on this machine
+
+    Thread counts around the physical core count matter most on CPU-only machines;
+    hyperthreads usually slow Ollama down, so the logical count is tried last. Every
+    candidate uses the same small context window, since num_ctx is not tuned.
+    """
+    cpu_count = cpu_count or os.cpu_count() or 4
+    threads = sorted({max(1, cpu_count // 4), max(1, cpu_count // 2), cpu_count})
+    candidates = []
+    for num_thread in threads:
+        for num_batch in (256, 512):
+            candidates.append({"num_thread": num_thread, "num_batch": num_batch, "num_ctx": 2048})
+    return candidates
+
+
+def _score(stats):
+    """
+    Throughput of a calibration run: prompt and answer tokens per second
+
+    Changing thread or batch options makes Ollama reload the model, so the load
+    time is left out when Ollama reports evaluation durations.
+    """
+    seconds = (stats.get("prompt_eval_duration", 0) + stats.get("eval_duration", 0)) / 1e9
+    seconds = seconds or stats.get("wall_seconds", 0)
+    if not seconds:
+        return 0.0
+    return (stats.get("prompt_eval_count", 0) + stats.get("eval_count", 0)) / seconds
+
+
+def autotune(model, run_calibration, candidates=None, progress_callback=None, options_file=OPTIONS_FILE):
+    """
+    Run a calibration sweep for a model and store the fastest thread/batch settings
+
+    Args:
+        model (str): Ollama model name
+        run_calibration (callable): run_calibration(model, prompt, options) returning the
+            final Ollama statistics dict, or None on failure (see model_utils.run_ollama_calibration)
+        candidates (list, optional): Option combinations to try; defaults to calibration_candidates()
+        progress_callback (callable, optional): Called with (done, total, options, tokens_per_sec)
+        options_file (str): Path of the stored options
+
+    Returns:
+        dict: The stored tuning result, or None if every calibration run failed
+    """
+    candidates = candidates or calibration_candidates()
+    log_function_call(logger, "autotune", args=[model], kwargs={"candidates": len(candidates)})
+
+    results = []
+    best = None
+    for done, candidate in enumerate(candidates, start=1):
+        options = dict(candidate)
+        stats = run_calibration(model, CALIBRATION_PROMPT, dict(options, num_predict=CALIBRATION_TOKENS))
+        tokens_per_sec = _score(stats) if stats else 0.0
+        results.append({"options": options, "tokens_per_sec": round(tokens_per_sec, 2)})
+        if tokens_per_sec and (best is None or tokens_per_sec > best["tokens_per_sec"]):
+            best = results[-1]
+        logger.info(f"Calibration {done}/{len(candidates)} for {model}: {options} -> {tokens_per_sec:.1f} tokens/s")
+        if progress_callback:
+            progress_callback(done, len(candidates), options, tokens_per_sec)
+
+    if best is None:
+        logger.warning(f"Auto-tuning failed for {model}: no calibration run succeeded")
+        log_function_return(logger, "autotune", None)
+        return None
+
+    tuned = {key: best["options"][key] for key in TUNED_OPTIONS}
+    tuned.update({
+        "tokens_per_sec": best["tokens_per_sec"],
+        "cpu_count": os.cpu_count(),
+        "tuned_at": datetime.now().isoformat(timespec="seconds"),
+        "results": results
+    })
+    _update_settings(model, lambda model_settings: model_settings.__setitem__("tuned", tuned), options_file)
+    log_function_return(logger, "autotune", {key: tuned[key] for key in TUNED_OPTIONS})
+    return tuned
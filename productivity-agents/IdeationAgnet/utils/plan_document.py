@@ -0,0 +1,189 @@
+import hashlib
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+
+# Add parent directory to path for direct imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.context_manager import count_tokens
+from utils.logging_utils import get_logger
+from utils import metrics
+
+# Set up logger for this module
+logger = get_logger(__name__)
+
+# Parsed plans kept in memory, keyed by the hash of their text. A plan is parsed once,
+# not on every rerun of the page that shows it.
+PLAN_DOCUMENT_CACHE_SIZE = 64
+
+_HEADING_PATTERN = re.compile(r"^(#{1,6})[ \t]+(.+?)(?:[ \t]+#+)?[ \t]*$")
+_FENCE_PATTERN = re.compile(r"^[ \t]{0,3}(```|~~~)")
+_WORD_PATTERN = re.compile(r"\w+(?:['’-]\w+)*")
+
+_document_cache = OrderedDict()
+_document_lock = threading.Lock()
+
+
+def plan_hash(text):
+    """Content hash of a plan (or section) text"""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+class PlanSection:
+    """
+    One heading of a plan and everything up to the next heading of the same or a higher level
+
+    Offsets index into PlanDocument.text: start is the start of the heading line,
+    body_start the first character after it and end the end of the section including
+    its subsections. Counts and the hash cover the whole section.
+    """
+
+    def __init__(self, section_id, title, level, start, body_start):
+        self.section_id = section_id
+        self.title = title
+        self.level = level
+        self.start = start
+        self.body_start = body_start
+        self.end = None
+        self.word_count = 0
+        self.token_count = 0
+        self.hash = None
+        self.children = []
+
+    @property
+    def label(self):
+        """Title with the section size, as shown on collapsed sections"""
+        return f"{self.title} · {self.word_count} words"
+
+
+class PlanDocument:
+    """A generated plan parsed into a tree of sections"""
+
+    def __init__(self, text):
+        self.text = text or ""
+        self.hash = plan_hash(self.text)
+        self.sections = []
+        self.roots = []
+        self.word_count = _count_words(self.text)
+        self.token_count = count_tokens(self.text, "local")
+        self._parse()
+
+    def _parse(self):
+        stack = []
+        offset = 0
+        in_fence = False
+        for line in self.text.splitlines(keepends=True):
+            if _FENCE_PATTERN.match(line):
+                in_fence = not in_fence
+            match = None if in_fence else _HEADING_PATTERN.match(line.rstrip("\r\n"))
+            if match:
+                level = len(match.group(1))
+                while stack and stack[-1].level >= level:
+                    stack.pop().end = offset
+                parent = stack[-1] if stack else None
+                siblings = parent.children if parent else self.roots
+                section_id = f"{parent.section_id}.{len(siblings) + 1}" if parent else str(len(siblings) + 1)
+                section = PlanSection(section_id, match.group(2).strip(), level, offset, offset + len(line))
+                siblings.append(section)
+                self.sections.append(section)
+                stack.append(section)
+            offset += len(line)
+        for section in stack:
+            section.end = offset
+        for section in self.sections:
+            section_text = self.text[section.start:section.end]
+            section.word_count = _count_words(section_text)
+            section.token_count = count_tokens(section_text, "local")
+            section.hash = plan_hash(section_text)
+
+    @property
+    def intro_end(self):
+        """End of the text shown before the display sections (title, preamble)"""
+        sections = self.display_sections()
+        return sections[0].start if sections else len(self.text)
+
+    def display_sections(self):
+        """
+        Sections to show one by one: the top-level sections, or the sections under a
+        single top-level title such as "# Implementation Plan"
+        """
+        if len(self.roots) == 1 and self.roots[0].children:
+            return self.roots[0].children
+        return self.roots
+
+    def section_text(self, section, include_heading=True):
+        """Markdown of a section including its subsections"""
+        return self.text[section.start if include_heading else section.body_start:section.end]
+
+    def get_section(self, section_id):
+        """Return a section by id ("2", "2.1", ...), or None"""
+        for section in self.sections:
+            if section.section_id == section_id:
+                return section
+        return None
+
+    def outline(self):
+        """Flat list of (section_id, level, title, word_count, token_count, hash) for every section"""
+        return [(s.section_id, s.level, s.title, s.word_count, s.token_count, s.hash) for s in self.sections]
+
+
+def _count_words(text):
+    return len(_WORD_PATTERN.findall(text))
+
+
+def get_plan_document(text):
+    """
+    Return the parsed document of a plan, parsing it only the first time it is seen
+
+    Args:
+        text (str): Plan markdown
+
+    Returns:
+        PlanDocument: Section tree with offsets, word/token counts and content hashes
+    """
+    key = plan_hash(text)
+    with _document_lock:
+        document = _document_cache.get(key)
+        if document is not None:
+            _document_cache.move_to_end(key)
+            metrics.increment("plan_document.cache_hits")
+            return document
+    document = PlanDocument(text)
+    metrics.increment("plan_document.parses")
+    logger.debug(f"Parsed plan {key[:8]} into {len(document.sections)} sections")
+    with _document_lock:
+        _document_cache[key] = document
+        while len(_document_cache) > PLAN_DOCUMENT_CACHE_SIZE:
+            _document_cache.popitem(last=False)
+    return document
+
+
+def render_plan(st, text, expanded_sections=1):
+    """
+    Show a plan as its title and preamble followed by one expander per section
+
+    Only the first expanded_sections sections start open, so a long plan is not laid
+    out in full on every interaction. Plans without headings are shown as they are.
+
+    Args:
+        st: The streamlit module
+        text (str): Plan markdown
+        expanded_sections (int): Number of leading sections that start expanded
+
+    Returns:
+        PlanDocument: The parsed plan
+    """
+    document = get_plan_document(text)
+    sections = document.display_sections()
+    if not sections:
+        st.markdown(document.text)
+        return document
+    intro = document.text[:document.intro_end]
+    if intro.strip():
+        st.markdown(intro)
+    for index, section in enumerate(sections):
+        with st.expander(section.label, expanded=index < expanded_sections):
+            st.markdown(document.section_text(section, include_heading=False))
+    return document
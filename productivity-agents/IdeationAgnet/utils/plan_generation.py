@@ -0,0 +1,209 @@
+import copy
+import os
+import sys
+
+# Add parent directory to path for direct imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.model_utils import generate_with_ollama, generate_with_openai, OUTPUT_TOKEN_BUDGETS
+from utils.ollama_options import get_ollama_options
+from utils.model_router import get_session_routes, route_label, failover_chain
+from utils.circuit_breaker import generate_with_failover
+from utils.checkpoint_utils import append_checkpoint
+from utils.prompt_templates import TEMPLATE_VERSION, PLAN_END_MARKER, build_plan_prompt, to_messages
+from utils.context_manager import fit_context
+from utils.job_utils import submit_job, get_job, cancel_job, make_idempotency_key
+from utils.logging_utils import get_logger
+from utils import metrics
+
+# Set up logger for this module
+logger = get_logger(__name__)
+
+# Start drafting the plan in the background as soon as brainstorming completes, so it is
+# often ready by the time the user opens the Plan Generator. Set IDEATION_SPECULATIVE_PLAN=0 to disable.
+SPECULATIVE_PLANS = os.environ.get("IDEATION_SPECULATIVE_PLAN", "1") != "0"
+# Job kind of speculative drafts; they are checkpointed when the Plan Generator adopts them
+DRAFT_JOB_KIND = "plan_draft"
+# Session state keys a plan request is built from (see plan_job_inputs)
+PLAN_STATE_KEYS = [
+    "session_id", "model_type", "selected_model", "stage_models", "available_ollama_models", "api_key",
+    "idea_description", "plan_type", "image_analysis", "brainstorm_context", "feedback_history",
+    "brainstorm_facts", "plan_iteration"
+]
+
+
+def generate_plan(model_type, selected_model, api_key, idea_description, plan_type,
+                  image_analysis, brainstorm_context, feedback_history, brainstorm_facts=None,
+                  fallback_routes=None, stream_callback=None):
+    """
+    Generate an implementation plan from the idea, brainstorming and feedback so far
+
+    The routes in fallback_routes are tried in order if the plan model fails or its circuit is open.
+    Returns a dict with the plan and the route that produced it; raises RuntimeError if no backend could.
+    """
+    logger.info("Starting plan generation")
+    if brainstorm_context:
+        logger.debug(f"Including {len(brainstorm_context)} brainstorming exchanges in context")
+    # Keep the prompt within the stage budget however long the session has become
+    fixed_system, fixed_user = build_plan_prompt(idea_description, plan_type, image_analysis, [], [], brainstorm_facts)
+    context = fit_context(
+        "plan", model_type, selected_model, api_key,
+        f"{fixed_system}\n\n{fixed_user}", brainstorm_context, feedback_history
+    )
+    system_prompt, user_prompt = build_plan_prompt(
+        idea_description, plan_type, image_analysis, context["recent_context"], context["recent_feedback"],
+        brainstorm_facts, context["context_summary"], context["feedback_summary"]
+    )
+
+    def generate(route):
+        # Generate plan based on the model type
+        logger.info(f"Generating plan using {route['model_type']} model: {route['model']}")
+        if route["model_type"] == "local":
+            # For local Ollama models
+            return generate_with_ollama(
+                route["model"],
+                user_prompt,
+                system_prompt=system_prompt,
+                stream_callback=stream_callback,
+                options=get_ollama_options(route["model"], "plan"),
+                stop=[PLAN_END_MARKER],
+                continue_on_length=True
+            )
+        # For cloud-based models (OpenAI)
+        return generate_with_openai(
+            route["model"],
+            to_messages(system_prompt, user_prompt),
+            api_key,
+            stream_callback=stream_callback,
+            max_tokens=OUTPUT_TOKEN_BUDGETS["plan"],
+            stop=[PLAN_END_MARKER],
+            continue_on_length=True
+        )
+
+    chain = [{"model_type": model_type, "model": selected_model}] + list(fallback_routes or [])
+    plan, route = generate_with_failover(chain, generate, "plan")
+    if route is None:
+        # Never save a backend error as if it were a plan
+        raise RuntimeError(plan)
+    # The marker is a stop sequence, but a continued plan can still carry it
+    plan = plan.replace(PLAN_END_MARKER, "").rstrip()
+
+    logger.info(f"Plan generation completed successfully (length: {len(plan)} chars)")
+    return {"plan": plan, "route": route}
+
+
+def plan_artifact_record(plan_route, iteration):
+    """Record of which model produced a plan iteration"""
+    return {"artifact": "plan", "iteration": iteration, "model": route_label(plan_route)}
+
+
+def plan_job_inputs(session_state):
+    """
+    Return the inputs of the next plan generation for a session
+
+    The Brainstorming page (speculative drafts) and the Plan Generator both build the
+    request here, so a draft matches the plan the user would have asked for.
+
+    Returns:
+        tuple: (kwargs for generate_plan, plan iteration the result will be)
+    """
+    routes = get_session_routes(session_state)
+    plan_route = routes["plan"]
+    inputs = {
+        "model_type": plan_route["model_type"],
+        "selected_model": plan_route["model"],
+        "fallback_routes": failover_chain("plan", routes, bool(session_state.get("api_key")))[1:],
+        "api_key": session_state.get("api_key"),
+        "idea_description": session_state.get("idea_description"),
+        "plan_type": session_state.get("plan_type"),
+        "image_analysis": session_state.get("image_analysis"),
+        "brainstorm_context": list(session_state.get("brainstorm_context", [])),
+        "feedback_history": list(session_state.get("feedback_history", [])),
+        "brainstorm_facts": list(session_state.get("brainstorm_facts", []))
+    }
+    return inputs, session_state.get("plan_iteration", 0) + 1
+
+
+def snapshot_plan_state(session_state):
+    """
+    Copy the session state a plan request is built from, for use outside the script thread
+
+    Lets a job start a plan from its on_complete callback, where Streamlit session
+    state is not available.
+
+    Returns:
+        dict: Copies of the PLAN_STATE_KEYS values present in session_state
+    """
+    return {key: copy.deepcopy(session_state[key]) for key in PLAN_STATE_KEYS if key in session_state}
+
+
+def plan_job_key(session_id, inputs, iteration):
+    """Idempotency key of a plan generation; a draft is only used if the keys match"""
+    return make_idempotency_key(
+        session_id, "plan",
+        {**{k: v for k, v in inputs.items() if k != "api_key"}, "iteration": iteration, "template_version": TEMPLATE_VERSION}
+    )
+
+
+def checkpoint_plan_result(session_id, result, iteration):
+    """Persist a generated plan and the model that wrote it"""
+    append_checkpoint(session_id, "plan", updates={
+        "generated_plan": result["plan"],
+        "plan_iteration": iteration,
+        "generation_complete": True
+    }, appends={"artifact_models": [plan_artifact_record(result["route"], iteration)]})
+
+
+def submit_plan_job(session_state, speculative=False):
+    """
+    Submit plan generation for a session to the worker pool
+
+    Args:
+        session_state: Streamlit session state (read only), or a snapshot_plan_state copy
+        speculative (bool): Start a draft nobody asked for yet. Drafts are not checkpointed
+            when they finish, because the inputs may still change before they are used.
+
+    Returns:
+        str: Job id; an identical plan request that is already running or uncollected is reused
+    """
+    session_id = session_state["session_id"]
+    inputs, iteration = plan_job_inputs(session_state)
+    logger.info(f"Submitting {'speculative ' if speculative else ''}plan generation job (iteration {iteration})")
+    if speculative:
+        metrics.increment("speculative_plans.started")
+        on_complete = None
+    else:
+        # Persist the plan even if the user navigates away before it finishes
+        on_complete = lambda result: checkpoint_plan_result(session_id, result, iteration)
+    return submit_job(
+        DRAFT_JOB_KIND if speculative else "plan",
+        generate_plan,
+        kwargs=inputs,
+        session_id=session_id,
+        idempotency_key=plan_job_key(session_id, inputs, iteration),
+        on_complete=on_complete,
+        stream=True
+    )
+
+
+def adopt_plan_draft(session_state, draft_job_id):
+    """
+    Decide whether a speculative draft can serve the plan the session would request now
+
+    A draft whose inputs no longer match (new answers, other models, feedback, ...) or
+    that failed is cancelled.
+
+    Returns:
+        str: The draft's job id if it can be used, otherwise None
+    """
+    draft = get_job(draft_job_id)
+    if draft is None:
+        return None
+    inputs, iteration = plan_job_inputs(session_state)
+    if draft.status != "error" and draft.idempotency_key == plan_job_key(session_state.session_id, inputs, iteration):
+        metrics.increment("speculative_plans.used")
+        logger.info(f"Using speculative plan draft {draft_job_id[:8]} ({draft.status})")
+        return draft_job_id
+    metrics.increment("speculative_plans.discarded")
+    logger.info(f"Discarding speculative plan draft {draft_job_id[:8]}: inputs changed or it failed")
+    cancel_job(draft_job_id)
+    return None
@@ -0,0 +1,130 @@
+import json
+import os
+import sys
+from datetime import datetime
+
+# Add parent directory to path for direct imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.logging_utils import get_logger, log_error, log_function_call, log_function_return
+from utils.blob_store import add_ref, plan_holder, release_ref
+
+# Set up logger for this module
+logger = get_logger(__name__)
+
+# Directory where saved plans live (same location the History page reads from)
+PLANS_DIR = "plans"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def detect_image_extension(image_bytes):
+    """
+    Guess a file extension for uploaded sketch bytes from their magic number
+    """
+    if image_bytes.startswith(b"\x89PNG"):
+        return "png"
+    if image_bytes.startswith(b"\xff\xd8"):
+        return "jpg"
+    if image_bytes.startswith(b"%PDF"):
+        return "pdf"
+    return "bin"
+
+
+def parse_timestamp(plan_data):
+    """
+    Parse the timestamp of a saved plan, falling back to the epoch for bad values
+    """
+    try:
+        return datetime.strptime(plan_data.get("timestamp", ""), TIMESTAMP_FORMAT)
+    except (TypeError, ValueError):
+        return datetime(1970, 1, 1)
+
+
+def save_plan(plan_entry, image_hash=None, plans_dir=PLANS_DIR):
+    """
+    Save a plan as JSON in the plans directory, optionally linking its source sketch
+
+    Args:
+        plan_entry (dict): Plan data using the keys the History page reads
+        image_hash (str, optional): Blob store hash of the uploaded sketch
+        plans_dir (str): Directory where plans are stored
+
+    Returns:
+        str: Filename of the saved plan
+    """
+    log_function_call(logger, "save_plan", kwargs={"has_image": image_hash is not None})
+    os.makedirs(plans_dir, exist_ok=True)
+
+    filename = f"plan_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.json"
+    record = dict(plan_entry)
+
+    if image_hash:
+        # The plan keeps the sketch alive in the blob store until the plan is deleted
+        add_ref(image_hash, plan_holder(filename))
+        record["image_hash"] = image_hash
+        logger.debug(f"Linked sketch {image_hash[:12]} to plan {filename}")
+
+    with open(os.path.join(plans_dir, filename), "w") as f:
+        json.dump(record, f, indent=2)
+
+    logger.info(f"Plan saved to {os.path.join(plans_dir, filename)}")
+    log_function_return(logger, "save_plan", filename)
+    return filename
+
+
+def delete_plan(filename, plans_dir=PLANS_DIR):
+    """
+    Delete a saved plan and release its reference to the source sketch
+    """
+    log_function_call(logger, "delete_plan", args=[filename])
+    file_path = os.path.join(plans_dir, filename)
+    try:
+        with open(file_path, "r") as f:
+            image_hash = json.load(f).get("image_hash")
+    except (json.JSONDecodeError, IOError):
+        image_hash = None
+
+    os.remove(file_path)
+    release_ref(image_hash, plan_holder(filename))
+    logger.info(f"Deleted plan {filename}")
+
+
+def iter_plans(plans_dir=PLANS_DIR, start_date=None, end_date=None, plan_types=None):
+    """
+    Yield saved plans one at a time, optionally filtered by date range and plan type
+
+    Only one plan file is held in memory at a time, so callers can walk
+    arbitrarily large plan directories.
+
+    Args:
+        plans_dir (str): Directory where plans are stored
+        start_date (date, optional): Earliest creation date to include (inclusive)
+        end_date (date, optional): Latest creation date to include (inclusive)
+        plan_types (list, optional): Plan types to include; None includes all and an
+            empty list none. Use None in the list for plans saved without a type
+
+    Yields:
+        dict: Plan data with its "filename" added
+    """
+    if not os.path.isdir(plans_dir):
+        return
+
+    for filename in sorted(os.listdir(plans_dir)):
+        if not filename.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(plans_dir, filename), "r") as f:
+                plan_data = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            log_error(logger, e, f"Skipping unreadable plan {filename}")
+            continue
+
+        created = parse_timestamp(plan_data).date()
+        if start_date and created < start_date:
+            continue
+        if end_date and created > end_date:
+            continue
+        if plan_types is not None and (plan_data.get("plan_type") or None) not in plan_types:
+            continue
+
+        plan_data["filename"] = filename
+        yield plan_data
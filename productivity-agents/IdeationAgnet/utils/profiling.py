@@ -0,0 +1,214 @@
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Add parent directory to path for direct imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.logging_utils import get_logger, log_error
+
+# Set up logger for this module
+logger = get_logger(__name__)
+
+# Opt-in developer overlay. Set IDEATION_PROFILE (or the ?profile= query parameter) to a
+# comma-separated list of: sections (per-section timings), cprofile, pyinstrument, tracemalloc.
+# "1" means sections only, "all" means sections, cprofile and tracemalloc.
+PROFILE_ENV = "IDEATION_PROFILE"
+PROFILE_DIR = os.environ.get("IDEATION_PROFILE_DIR", "profiles")
+# Rows shown for cProfile stats and tracemalloc diffs
+TOP_ENTRIES = 20
+
+
+def _parse_modes(value):
+    if not value or value in ("0", "false", "off"):
+        return set()
+    if value in ("1", "true", "on"):
+        return {"sections"}
+    if value == "all":
+        return {"sections", "cprofile", "tracemalloc"}
+    return {"sections"} | {mode.strip() for mode in value.split(",") if mode.strip()}
+
+
+def get_profile_modes(query_params=None):
+    """Return the enabled profiling modes from the environment or the page's query parameters"""
+    modes = _parse_modes(os.environ.get(PROFILE_ENV, "").lower())
+    if query_params is not None:
+        modes |= _parse_modes(str(query_params.get("profile", "")).lower())
+    return modes
+
+
+class RerunProfile:
+    """
+    Times named sections of one page script run and optionally profiles the whole run
+
+    Sections are laps: mark("name") ends the current section and starts the next, so a
+    page only needs one line per block. section("name") times a nested block.
+    """
+
+    def __init__(self, page, modes, rerun):
+        self.page = page
+        self.modes = modes
+        self.rerun = rerun
+        self.sections = []
+        self.started_at = time.perf_counter()
+        self._current = None
+        self._current_start = None
+        self._profiler = None
+        self._profiler_kind = None
+        self._snapshot = None
+
+        if "pyinstrument" in modes:
+            try:
+                from pyinstrument import Profiler
+                self._profiler = Profiler()
+                self._profiler_kind = "pyinstrument"
+            except ImportError:
+                logger.warning("pyinstrument is not installed; falling back to cProfile")
+                modes.add("cprofile")
+        if self._profiler is None and "cprofile" in modes:
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler_kind = "cprofile"
+        if "tracemalloc" in modes:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            self._snapshot = tracemalloc.take_snapshot()
+        # Profilers only see this script thread, not background jobs
+        if self._profiler_kind == "pyinstrument":
+            self._profiler.start()
+        elif self._profiler_kind == "cprofile":
+            self._profiler.enable()
+
+    def mark(self, name):
+        """End the current section and start timing a new one"""
+        now = time.perf_counter()
+        if self._current is not None:
+            self.sections.append((self._current, now - self._current_start))
+        self._current, self._current_start = name, now
+
+    @contextmanager
+    def section(self, name):
+        """Time a block as its own section, independently of the current lap"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.sections.append((name, time.perf_counter() - start))
+
+    def finish(self):
+        """
+        Stop profiling and return the collected report
+
+        Returns:
+            dict: page, rerun, total_seconds, sections and, if enabled, profile and memory text
+        """
+        self.mark(None)
+        report = {
+            "page": self.page,
+            "rerun": self.rerun,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "total_seconds": time.perf_counter() - self.started_at,
+            "sections": [{"name": name, "seconds": seconds} for name, seconds in self.sections]
+        }
+
+        if self._profiler_kind == "cprofile":
+            import io
+            import pstats
+            self._profiler.disable()
+            buffer = io.StringIO()
+            pstats.Stats(self._profiler, stream=buffer).sort_stats("cumulative").print_stats(TOP_ENTRIES)
+            report["profile"] = buffer.getvalue()
+        elif self._profiler_kind == "pyinstrument":
+            self._profiler.stop()
+            report["profile"] = self._profiler.output_text(unicode=True, color=False)
+
+        if self._snapshot is not None:
+            import tracemalloc
+            diff = tracemalloc.take_snapshot().compare_to(self._snapshot, "lineno")
+            report["memory"] = "\n".join(str(stat) for stat in diff[:TOP_ENTRIES])
+        return report
+
+    def dump(self, report, profile_dir=PROFILE_DIR):
+        """Write the report (and a .prof file for cProfile) under profile_dir"""
+        try:
+            os.makedirs(profile_dir, exist_ok=True)
+            stem = f"{self.page.replace(' ', '_').lower()}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+            path = os.path.join(profile_dir, f"{stem}.json")
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+            if self._profiler_kind == "cprofile":
+                self._profiler.dump_stats(os.path.join(profile_dir, f"{stem}.prof"))
+            elif self._profiler_kind == "pyinstrument":
+                with open(os.path.join(profile_dir, f"{stem}.html"), "w") as f:
+                    f.write(self._profiler.output_html())
+            logger.debug(f"Rerun profile written to {path}")
+            return path
+        except IOError as e:
+            log_error(logger, e, "Failed to write rerun profile")
+            return None
+
+
+class _NullProfile:
+    """Stand-in used when profiling is off, so pages can call it unconditionally"""
+
+    def mark(self, name):
+        pass
+
+    @contextmanager
+    def section(self, name):
+        yield
+
+
+_NULL_PROFILE = _NullProfile()
+
+
+def start_rerun_profile(st, page):
+    """
+    Start profiling the current page script run if the developer overlay is enabled
+
+    Call right after st.set_page_config and pass the result to finish_rerun_profile at the
+    end of the script. Runs cut short by st.rerun, st.stop or st.switch_page are not reported.
+
+    Args:
+        st: The streamlit module
+        page (str): Page name shown in the overlay and used for dump file names
+
+    Returns:
+        RerunProfile, or a no-op stand-in when profiling is disabled
+    """
+    try:
+        modes = get_profile_modes(st.query_params)
+    except Exception:
+        modes = get_profile_modes()
+    if not modes:
+        return _NULL_PROFILE
+
+    counts = st.session_state.setdefault("_profile_reruns", {})
+    counts[page] = counts.get(page, 0) + 1
+    return RerunProfile(page, modes, counts[page])
+
+
+def finish_rerun_profile(st, profile):
+    """Finish a rerun profile, dump it to disk and show it in an expander"""
+    if not isinstance(profile, RerunProfile):
+        return
+    report = profile.finish()
+    path = profile.dump(report)
+
+    with st.expander(f"🛠 Rerun profile: {report['page']} run #{report['rerun']} ({report['total_seconds'] * 1000:.1f} ms)"):
+        rows = ["| Section | ms | % |", "|---|---:|---:|"]
+        for entry in sorted(report["sections"], key=lambda entry: entry["seconds"], reverse=True):
+            share = 100.0 * entry["seconds"] / report["total_seconds"] if report["total_seconds"] else 0.0
+            rows.append(f"| {entry['name']} | {entry['seconds'] * 1000:.1f} | {share:.0f} |")
+        st.markdown("\n".join(rows))
+        if "profile" in report:
+            st.caption("Profile of this run (cumulative time)")
+            st.code(report["profile"], language="text")
+        if "memory" in report:
+            st.caption("Memory allocated during this run (tracemalloc diff)")
+            st.code(report["memory"], language="text")
+        if path:
+            st.caption(f"Saved to {path}")
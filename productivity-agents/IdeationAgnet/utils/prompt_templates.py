@@ -0,0 +1,236 @@
+import re
+import textwrap
+
+# Bump whenever any static block below changes: it invalidates provider-side prompt caches
+# and is part of the idempotency keys of generation jobs
+TEMPLATE_VERSION = "5"
+
+# Every prompt is laid out static-first: the system message and instruction blocks are
+# byte-identical across ideas and turns, and per-idea values follow at the end, so OpenAI
+# prompt caching and Ollama's KV cache can reuse the longest possible prefix.
+
+
+def normalize_whitespace(text):
+    """
+    Dedent text, strip trailing spaces on every line and collapse runs of blank lines
+    """
+    text = textwrap.dedent(text).strip()
+    text = re.sub(r"[ \t]+\n", "\n", text)
+    return re.sub(r"\n{3,}", "\n\n", text)
+
+
+BRAINSTORM_SYSTEM = normalize_whitespace("""
+    You are a helpful assistant that asks clear, specific questions to understand the user's idea for creating an implementation plan.
+    Focus on understanding the scope, target audience, key features, constraints, or resources available.
+""")
+
+BRAINSTORM_TURN_INSTRUCTIONS = normalize_whitespace("""
+    In every turn, review the idea and the conversation so far and respond with a single JSON object with these fields:
+    - "questions": a list of 1-3 short clarifying questions that would most improve the plan, or an empty list if nothing important is missing
+    - "completeness": a number from 0 to 1 estimating how much of the information needed for a detailed implementation plan is already known
+    - "facts": a list of short, self-contained facts about the idea stated or clearly implied so far (scope, audience, features, constraints, resources)
+    Respond with the JSON object only, without any preamble or additional text.
+""")
+
+IMAGE_ANALYSIS_INSTRUCTIONS = normalize_whitespace("""
+    Analyze the attached drawing related to the idea described below.
+    Describe what you see in the drawing and how it relates to the idea.
+    Focus on identifying key elements, layout, functionality, and features shown in the drawing.
+""")
+
+FIRST_TURN_IMAGE_INSTRUCTIONS = normalize_whitespace("""
+    A drawing related to the idea is attached to the first message. Add one more field to the JSON object:
+    - "image_analysis": an object with "description" (what the drawing shows), "key_elements" (a list of the
+      main elements, layout, functionality and features shown) and "relation_to_idea" (how the drawing relates to the idea)
+    Use what the drawing shows when choosing your questions and facts.
+""")
+
+SUMMARY_SYSTEM = normalize_whitespace("""
+    You maintain a running summary of an idea-refinement session that is used as context for planning.
+    Merge the new material into the current summary. Keep every concrete decision, requirement, constraint,
+    number and preference, and drop pleasantries and repetition. When newer material contradicts older
+    material, keep the newer version. Write at most 150 words of plain bullet points, without any preamble.
+""")
+
+# The plan ends with this line; it is also the stop sequence of plan requests, so nothing the
+# model would add after the last section (closing remarks, offers to help) is generated
+PLAN_END_MARKER = "<!-- END OF PLAN -->"
+
+PLAN_SYSTEM = normalize_whitespace(f"""
+    You are an expert implementation planner specializing in turning ideas into actionable plans.
+    Your plans are comprehensive, well-structured, and tailored to the specific type of project.
+    Provide detailed, practical guidance that someone could follow to implement the idea.
+    Format your response in clean Markdown with clear sections and bullet points.
+
+    Create a detailed implementation plan for the idea the user describes, with the following sections:
+    1. Executive Summary - A brief overview of the idea and implementation approach
+    2. Project Scope - Define what's included and not included
+    3. Key Features and Components - Detailed breakdown of all major components
+    4. Implementation Timeline - Phases of development with estimated timeframes
+    5. Required Resources - People, technologies, tools, and costs
+    6. Success Metrics - How to measure the implementation's success
+    7. Potential Challenges and Mitigations - Identify risks and how to address them
+    8. Next Steps - Immediate actions to get started
+
+    Format the plan in Markdown with clear headers, bullet points, and sections. Be specific, actionable, and thorough.
+    End the plan with the line {PLAN_END_MARKER} right after the Next Steps section, with nothing after it.
+""")
+
+
+def format_transcript(brainstorm_context):
+    """Render brainstorming messages as "AI: ..." / "User: ..." lines"""
+    return "\n".join(
+        f"{'AI' if msg['role'] == 'assistant' else 'User'}: {msg['content'].strip()}"
+        for msg in brainstorm_context
+    )
+
+
+def idea_block(idea_description, plan_type, image_analysis=None):
+    """The per-idea values shared by all stages, always rendered identically"""
+    lines = [
+        f"Idea Description: {idea_description.strip()}",
+        f"Plan Type: {plan_type}"
+    ]
+    if image_analysis is not None:
+        lines.append(f"Image Analysis: {image_analysis.strip()}")
+    return "\n".join(lines)
+
+
+def build_image_analysis_prompt(idea_description):
+    """Prompt for describing the uploaded drawing with a vision model"""
+    return f"{IMAGE_ANALYSIS_INSTRUCTIONS}\n\nIdea: {idea_description.strip()}"
+
+
+def build_brainstorm_messages(idea_description, plan_type, image_analysis, brainstorm_context,
+                              context_summary=None):
+    """
+    Build the messages for one structured brainstorming turn
+
+    The instructions live in the system message so each turn only appends to the
+    end of the previous turn's prompt. When older turns have been folded into
+    context_summary, brainstorm_context holds only the recent turns.
+
+    Returns:
+        list: Chat messages
+    """
+    opening = idea_block(idea_description, plan_type, image_analysis)
+    if context_summary:
+        opening += f"\n\nSummary Of The Earlier Conversation:\n{context_summary.strip()}"
+    messages = [
+        {"role": "system", "content": f"{BRAINSTORM_SYSTEM}\n\n{BRAINSTORM_TURN_INSTRUCTIONS}"},
+        {"role": "user", "content": opening}
+    ]
+    messages.extend({"role": msg["role"], "content": msg["content"].strip()} for msg in brainstorm_context)
+    return messages
+
+
+def build_summary_prompt(kind, previous_summary, items):
+    """
+    Build the request that folds older brainstorming turns or feedback into a running summary
+
+    Args:
+        kind (str): "conversation" or "feedback"
+        previous_summary (str, optional): Summary of everything folded earlier
+        items (list): Newly folded messages (conversation) or feedback strings
+
+    Returns:
+        tuple: (system_prompt, user_prompt)
+    """
+    if kind == "conversation":
+        new_text = format_transcript(items)
+    else:
+        new_text = "\n".join(f"- {item.strip()}" for item in items)
+    parts = []
+    if previous_summary:
+        parts.append(f"Current Summary:\n{previous_summary.strip()}")
+    parts.append(f"New {kind.capitalize()} To Fold In:\n{new_text}")
+    return SUMMARY_SYSTEM, "\n\n".join(parts)
+
+
+def build_first_turn_messages_with_image(idea_description, plan_type, image_base64):
+    """
+    Build a single multimodal request that analyzes the drawing and opens brainstorming
+
+    The image goes after the idea text so the static system prompt and idea block
+    remain a cacheable prefix.
+
+    Returns:
+        list: Chat messages
+    """
+    return [
+        {"role": "system", "content": f"{BRAINSTORM_SYSTEM}\n\n{BRAINSTORM_TURN_INSTRUCTIONS}\n\n{FIRST_TURN_IMAGE_INSTRUCTIONS}"},
+        {"role": "user", "content": [
+            {"type": "text", "text": idea_block(idea_description, plan_type)},
+            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"}}
+        ]}
+    ]
+
+
+def format_image_analysis(analysis):
+    """Render a structured image analysis as the plain text stored for later stages"""
+    if isinstance(analysis, str):
+        return analysis.strip()
+    if not isinstance(analysis, dict):
+        return ""
+    lines = []
+    if analysis.get("description"):
+        lines.append(str(analysis["description"]).strip())
+    elements = analysis.get("key_elements") or []
+    if isinstance(elements, str):
+        elements = [elements]
+    if elements:
+        lines.append("Key elements:\n" + "\n".join(f"- {str(element).strip()}" for element in elements))
+    if analysis.get("relation_to_idea"):
+        lines.append(f"Relation to the idea: {str(analysis['relation_to_idea']).strip()}")
+    return "\n\n".join(lines)
+
+
+def build_plan_prompt(idea_description, plan_type, image_analysis, brainstorm_context, feedback_history,
+                      brainstorm_facts=None, context_summary=None, feedback_summary=None):
+    """
+    Build the plan generation request
+
+    Facts extracted while brainstorming come before the raw transcript. Feedback goes
+    last because it is the only part that changes between regenerations. Summaries of
+    folded older turns and feedback precede the recent ones they were cut from.
+
+    Returns:
+        tuple: (system_prompt, user_prompt)
+    """
+    parts = [idea_block(idea_description, plan_type, image_analysis or "No image analysis available.")]
+    if brainstorm_facts:
+        parts.append("Key Facts:\n" + "\n".join(f"- {fact.strip()}" for fact in brainstorm_facts))
+    if context_summary:
+        parts.append(f"Summary Of Earlier Brainstorming:\n{context_summary.strip()}")
+    if brainstorm_context:
+        parts.append(f"Additional Context From Brainstorming:\n{format_transcript(brainstorm_context)}")
+    if feedback_summary:
+        parts.append(f"Summary Of Earlier Feedback:\n{feedback_summary.strip()}")
+    if feedback_history:
+        parts.append("Previous Feedback:\n" + "\n".join(f"- {feedback.strip()}" for feedback in feedback_history))
+    return PLAN_SYSTEM, "\n\n".join(parts)
+
+
+def messages_to_prompt(messages):
+    """
+    Flatten chat messages into (system_prompt, prompt) for Ollama's /api/generate
+
+    The layout mirrors the message order, so the static system prompt stays a stable prefix.
+    """
+    system_prompt = "\n\n".join(msg["content"] for msg in messages if msg["role"] == "system")
+    conversation = [msg for msg in messages if msg["role"] != "system"]
+    lines = []
+    for index, msg in enumerate(conversation):
+        if index == 0 and msg["role"] == "user":
+            lines.append(msg["content"])
+        else:
+            lines.append(f"{'AI' if msg['role'] == 'assistant' else 'User'}: {msg['content']}")
+    return system_prompt, "\n\n".join(lines)
+
+
+def to_messages(system_prompt, user_prompt):
+    """Wrap a (system_prompt, user_prompt) pair as chat messages"""
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]